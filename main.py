@@ -10,13 +10,16 @@ import logging
 
 from documentcloud import DocumentCloud
 from documentcloud.addon import AddOn
+from documentcloud.exceptions import APIError
 
 import scrapy
 from scrapy.crawler import CrawlerProcess
 from scrapy.utils.project import get_project_settings
 
 from scraper import settings as scraper_settings
-from scraper.spiders.paca import PACASpider
+from scraper.profiles import PROFILES, download_slots
+from scraper.profiling import RunProfiler
+from scraper.spiders.dreal import DREALSpider
 
 
 class DiscloseDREALPACAScraper(AddOn):
@@ -43,11 +46,9 @@ class DiscloseDREALPACAScraper(AddOn):
             self.send_mail(subject, content)
             sys.exit(1)
 
-    def check_access_level(self):
+    def check_access_level(self, access_level):
         """Check that the access level is valid."""
 
-        access_level = self.access_level
-
         if access_level not in ["public", "organization", "private"]:
             self.set_message(
                 "Incorrect Access level.",
@@ -55,10 +56,8 @@ class DiscloseDREALPACAScraper(AddOn):
             )
             sys.exit(1)
 
-    def get_project_id(self):
-        """Returns the id of the target project."""
-
-        project = self.data["project"]
+    def get_project_id(self, project):
+        """Returns the id of a target project."""
 
         try:
             # if project is an integer, use it as a project ID
@@ -70,6 +69,27 @@ class DiscloseDREALPACAScraper(AddOn):
             project, created = self.client.projects.get_or_create_by_title(project)
             return project.id
 
+    def find_project_id(self, project):
+        """Returns the id of an existing project, without creating it."""
+
+        try:
+            project = int(project)
+        except ValueError:
+            return self.client.projects.get_by_title(project).id
+
+        return self.client.projects.get_by_id(project).id
+
+    def find_projects(self):
+        """Sets the ids of the projects of a dry run, which must already exist."""
+
+        try:
+            self.project = self.find_project_id(self.data["project"])
+            for target in self.targets:
+                target["project"] = self.find_project_id(target["project"])
+        except APIError as e:
+            self.set_message(f"Project not found: {e}")
+            sys.exit(1)
+
     def main(self):
         """Add-on main functionality."""
 
@@ -77,7 +97,12 @@ class DiscloseDREALPACAScraper(AddOn):
 
         self.run_name = self.data.get("run_name", "no name")
         self.access_level = self.data.get("access_level", "private")
-        self.check_access_level()
+        self.check_access_level(self.access_level)
+
+        # Other projects the documents are uploaded to, by the same crawl
+        self.targets = self.data.get("targets") or []
+        for target in self.targets:
+            self.check_access_level(target.setdefault("access_level", "private"))
 
         self.target_year = self.data.get(
             "target_year", datetime.date.today().year
@@ -90,11 +115,43 @@ class DiscloseDREALPACAScraper(AddOn):
 
         self.upload_event_data = self.data.get("upload_event_data")
 
+        self.upload_file_bytes = self.data.get("upload_file_bytes", False)
+
+        self.rebuild_event_data = self.data.get("rebuild_event_data", False)
+
+        self.resync = self.data.get("resync", False)
+
+        self.diff = self.data.get("diff", False)
+
+        self.profile = self.data.get("profile", False)
+        self.profile_memory = self.data.get("profile_memory", False)
+
+        # Regional websites, crawled concurrently
+        self.regions = self.data.get("regions") or ["PACA"]
+        unknown_regions = [name for name in self.regions if name not in PROFILES]
+        if unknown_regions:
+            self.set_message(f"Unknown regional websites: {', '.join(unknown_regions)}")
+            sys.exit(1)
+
+        self.shard_index = self.data.get("shard_index", 0)
+        self.shard_count = self.data.get("shard_count", 1)
+        if not 0 <= self.shard_index < self.shard_count:
+            self.set_message("Incorrect shard index, must be less than the shard count.")
+            sys.exit(1)
+
         self.dry_run = self.data.get("dry_run")
 
-        if not self.dry_run:
+        if self.dry_run and self.resync:
+            # Re-sync dry runs compare with the documents of the project, & change
+            # nothing
+            self.find_projects()
+        elif not self.dry_run:
             try:
-                self.project = self.get_project_id()  # commented for development
+                self.project = self.get_project_id(
+                    self.data["project"]
+                )  # commented for development
+                for target in self.targets:
+                    target["project"] = self.get_project_id(target["project"])
             except Exception as e:
                 raise Exception("Project error").with_traceback(e.__traceback__)
                 sys.exit(1)
@@ -105,21 +162,72 @@ class DiscloseDREALPACAScraper(AddOn):
         else:
             self.project = ""
 
+        # Each target has its own event data
+        names = [f"{self.project}-{self.access_level}"] + [
+            f"{target['project']}-{target['access_level']}" for target in self.targets
+        ]
+        if len(set(names)) < len(names):
+            self.set_message("The same project & access level are targeted twice.")
+            sys.exit(1)
+
         # Load scraper settings and create process
 
         os.environ.setdefault("SCRAPY_SETTINGS_MODULE", scraper_settings.__name__)
-        process = CrawlerProcess(get_project_settings())
+        settings = get_project_settings()
+
+        # Each website has its own download slot
+        settings.set(
+            "DOWNLOAD_SLOTS",
+            {
+                **settings.getdict("DOWNLOAD_SLOTS"),
+                **download_slots(PROFILES[name] for name in self.regions),
+            },
+        )
+
+        process = CrawlerProcess(settings)
+
+        # Launch scraper, one crawl per website (sharing event data)
+
+        for region in self.regions:
+            self.crawl(process, region)
+
+        if self.profile:
+            profiler = RunProfiler(
+                settings, self.time_limit, memory=self.profile_memory
+            )
+            profiler.start(next(iter(process.crawlers)))
+
+        # Run
+
+        self.set_message(
+            f"Scraping DREAL {', '.join(self.regions)} documents {str(self.target_year)} [{self.run_name}]"
+        )
+        process.start()
 
-        # Launch scraper
+        if self.profile:
+            profiler.stop()
+
+            # Uploaded with the run, like event data
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M")
+            for filename in profiler.write(f"profile_DREAL_{timestamp}"):
+                with open(filename, "rb") as file:
+                    self.upload_file(file)
+
+        self.set_message("Scraping complete!")
+
+    def crawl(self, process, profile):
+        """Adds the crawl of a regional website to the process."""
 
         process.crawl(
-            PACASpider,
+            DREALSpider,
+            profile=profile,
             target_year=self.target_year,
             upload_limit=self.upload_limit,
             time_limit=self.time_limit,
             client=self.client,
             target_project=self.project,
             access_level=self.access_level,
+            upload_targets=self.targets,
             dry_run=self.dry_run,
             run_id=self.id,
             run_name=self.run_name,
@@ -128,16 +236,14 @@ class DiscloseDREALPACAScraper(AddOn):
             store_event_data=self.store_event_data,
             upload_file=self.upload_file,
             upload_event_data=self.upload_event_data,
+            upload_file_bytes=self.upload_file_bytes,
+            rebuild_event_data=self.rebuild_event_data,
+            resync=self.resync,
+            diff=self.diff,
+            shard_index=self.shard_index,
+            shard_count=self.shard_count,
         )
 
-        # Run
-
-        self.set_message(
-            f"Scraping DREAL PACA documents {str(self.target_year)} [{self.run_name}]"
-        )
-        process.start()
-        self.set_message("Scraping complete!")
-
 
 if __name__ == "__main__":
     DiscloseDREALPACAScraper().main()
@@ -0,0 +1,103 @@
+"""Dead-letter queue of failed uploads, persisted in event data."""
+
+from datetime import datetime, timedelta
+
+# Key of the dead-letter queue in event data (document keys are URLs)
+DEAD_LETTERS_KEY = "_dead_letters"
+
+
+class DeadLetterQueue:
+    """Failed uploads, kept in event data with everything needed to upload them again.
+
+    Each letter holds the normalized upload payload, so a retry does not need to
+    crawl or normalize the document again. Retries are spaced with an exponential
+    backoff, and letters are abandoned after max_attempts attempts.
+    """
+
+    def __init__(self, event_data, max_attempts, backoff_hours, key=DEAD_LETTERS_KEY):
+        self.event_data = event_data
+        # Each upload target has its own queue (see targets.py)
+        self.key = key
+        self.max_attempts = max_attempts
+        self.backoff_hours = backoff_hours
+
+        # Report of this run
+        self.new = []
+        self.retried = []
+        self.abandoned = []
+
+    @property
+    def letters(self):
+        # Event data can be replaced in place by a merge (see EventDataStore)
+        return self.event_data.setdefault(self.key, {})
+
+    def __contains__(self, url):
+        return url in self.letters
+
+    def __len__(self):
+        return len(self.letters)
+
+    def add(self, url, payload, error):
+        """Records a failed upload attempt."""
+
+        now = datetime.now()
+
+        if url in self.letters:
+            letter = self.letters[url]
+        else:
+            letter = {"payload": payload, "attempts": 0}
+            self.new.append(url)
+
+        letter["attempts"] += 1
+        letter["error"] = str(error)[:500]
+        letter["last_attempt"] = now.isoformat(timespec="seconds")
+        letter["next_attempt"] = (
+            now + timedelta(hours=self.backoff_hours * 2 ** (letter["attempts"] - 1))
+        ).isoformat(timespec="seconds")
+
+        self.letters[url] = letter
+
+        if letter["attempts"] >= self.max_attempts:
+            # Left to the next crawls
+            del self.letters[url]
+            self.abandoned.append((url, letter["error"]))
+
+    def remove(self, url):
+        """Removes a letter after a successful retry."""
+
+        self.letters.pop(url, None)
+        self.retried.append(url)
+
+    def due(self):
+        """Returns the (url, letter) pairs whose next attempt is due."""
+
+        now = datetime.now().isoformat(timespec="seconds")
+
+        return [
+            (url, letter)
+            for url, letter in self.letters.items()
+            if letter["next_attempt"] <= now
+        ]
+
+    def summary(self):
+        """Lines describing the dead-letter queue, for the run email."""
+
+        lines = [
+            f"Retried successfully: {len(self.retried)}",
+            f"New failures: {len(self.new)}",
+            f"Waiting for a retry: {len(self.letters)}",
+        ]
+
+        for url, letter in self.letters.items():
+            lines.append(
+                f"  {url} ({letter['attempts']} attempts, next on {letter['next_attempt']}): {letter['error']}"
+            )
+
+        if self.abandoned:
+            lines.append(
+                f"Abandoned after {self.max_attempts} attempts: {len(self.abandoned)}"
+            )
+            for url, error in self.abandoned:
+                lines.append(f"  {url}: {error}")
+
+        return lines
@@ -192,54 +192,68 @@ def department_from_authority(authority):
     return department
 
 
+# Parentheses with possible department numbers, e.g. (04), (13 et 83), (2A)
+PARENTHESES_RE = re.compile(r"\(([A-B0-9 \-,;/+]+(?: et[A-B0-9 \-,;/]+)?)\)")
+
+DEPARTMENT_NUMBER_RE = re.compile(
+    r"\b([02][1-9]|2[AB]|[1345678][0-9]|9[012345]|97[1-8])\b"
+)
+
+
+def names_pattern(names):
+    """Alternation of escaped names, one group per name (see match.lastindex)."""
+
+    return "|".join(f"({re.escape(name)})" for name in names)
+
+
+# Department names in parentheses, anywhere or (without hyphens) at the end
+DEPARTMENT_NUMBERS = list(DEPARTMENTS.values())
+
+DEPARTMENT_NAME_RE = re.compile(
+    rf"\((?:{names_pattern(DEPARTMENTS)})\)", re.IGNORECASE
+)
+DEPARTMENT_NAME_NO_HYPHENS_RE = re.compile(
+    rf"\((?:{names_pattern(name.replace('-', ' ') for name in DEPARTMENTS)})\)$",
+    re.IGNORECASE,
+)
+
+# Region names, with & without hyphens
+REGION_NAMES = list(REGIONS) + list(REGIONS)
+
+REGION_NAME_RE = re.compile(
+    rf"\brégion (?:{names_pattern(REGIONS)}|{names_pattern(name.replace('-', ' ') for name in REGIONS)})\b",
+    re.IGNORECASE,
+)
+
+
 def departments_from_project_name(project_name):
     """Match departments from project name, via regex"""
 
     departments = []
 
     # Find parentheses with possible matches in project
-    matches_parentheses = re.findall(
-        r"\(([A-B0-9 \-,;//\+]+(?: et[A-B0-9 \-,;//]+)?)\)", project_name
-    )
-    #
+    matches_parentheses = PARENTHESES_RE.findall(project_name)
 
     # Extract departments from matches
     for m in matches_parentheses:
         # Replacing + by space, as it is not considered a word boundary
         m = m.replace("+", " ")
 
-        match_dept_nos = re.findall(
-            r"\b([02][1-9]|2[AB]|[1345678][0-9]|9[012345]|97[1-8])\b", m
-        )
-
-        if match_dept_nos:
-            for d in match_dept_nos:
-                departments.append(d)
+        departments.extend(DEPARTMENT_NUMBER_RE.findall(m))
 
     # By department name in parentheses
     if not departments:
-        for dept in DEPARTMENTS:
-            # escaped_dept = dept = dept.replace("'", "'")
-            dept_no_hyphens = dept.replace("-", " ")
+        for match in DEPARTMENT_NAME_RE.finditer(project_name):
+            departments.append(DEPARTMENT_NUMBERS[match.lastindex - 1])
 
-            if re.search(rf"\({dept}\)", project_name, re.IGNORECASE) or re.search(
-                rf"\({dept_no_hyphens}\)$", project_name, re.IGNORECASE
-            ):
-                departments.append(DEPARTMENTS[dept])
+        match = DEPARTMENT_NAME_NO_HYPHENS_RE.search(project_name)
+        if match:
+            departments.append(DEPARTMENT_NUMBERS[match.lastindex - 1])
 
     # By Region name
     if not departments:
-        for reg in REGIONS:
-            # escaped_region = reg.replace("'", "'")
-            reg_no_hyphens = reg.replace("-", " ")
-
-            if re.search(
-                rf"\brégion {reg}\b", project_name, re.IGNORECASE
-            ) or re.search(
-                rf"\brégion {reg_no_hyphens}\b", project_name, re.IGNORECASE
-            ):
-                for d in REGIONS[reg]:
-                    departments.append(d)
+        for match in REGION_NAME_RE.finditer(project_name):
+            departments.extend(REGIONS[REGION_NAMES[match.lastindex - 1]])
 
     # Remove duplicates & order
     departments = sorted(list(set(departments)))
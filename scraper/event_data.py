@@ -0,0 +1,272 @@
+"""Event data: documents uploaded by the scraper, by file URL.
+
+Keys starting with an underscore hold the scraper's own state (e.g. the
+dead-letter queue) and are not documents.
+"""
+
+import argparse
+import copy
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+def is_document_key(key):
+    """True for the keys of event data that are documents (file URLs)."""
+
+    return not key.startswith("_")
+
+
+def first_value(value):
+    """DocumentCloud stores data values as lists of strings."""
+
+    if isinstance(value, list):
+        return value[0] if value else None
+    return value
+
+
+def search_documents(client, query, per_page, workers):
+    """Returns all the results of a search, fetching the pages in parallel."""
+
+    def fetch_page(page):
+        response = client.get(
+            "documents/search/",
+            params={"q": query, "per_page": per_page, "page": page},
+        )
+        return response.json()
+
+    first_page = fetch_page(1)
+    results = list(first_page["results"])
+
+    pages = math.ceil(first_page["count"] / per_page)
+
+    if pages > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for page in executor.map(fetch_page, range(2, pages + 1)):
+                results.extend(page["results"])
+
+    return results
+
+
+def event_data_entry(document):
+    """Event data entry of an uploaded document, from its DocumentCloud metadata."""
+
+    data = document.get("data", {})
+
+    publication_datetime = first_value(data.get("publication_datetime"))
+    last_modified = datetime.strptime(
+        publication_datetime, "%Y-%m-%d %H:%M:%S UTC"
+    ).isoformat()
+
+    entry = {
+        "last_modified": last_modified,
+        "last_seen": document["created_at"][:19],
+        "target_year": int(first_value(data.get("year"))),
+    }
+
+    # Checked by ProcessingStatusPipeline
+    if document.get("status") not in ["success", "readable"]:
+        entry["document_id"] = document["id"]
+
+    return entry
+
+
+def rebuild_event_data(client, project_id, source_scraper, per_page=100, workers=4):
+    """Rebuilds event data from the documents of a project uploaded by a scraper.
+
+    Documents whose processing failed are left out, so they are uploaded again.
+    """
+
+    documents = search_documents(
+        client,
+        f'+project:{project_id} +data_source_scraper:"{source_scraper}"',
+        per_page,
+        workers,
+    )
+
+    event_data = {}
+
+    for document in documents:
+        data = document.get("data", {})
+
+        # The search is not exact on data values
+        if first_value(data.get("source_scraper")) != source_scraper:
+            continue
+
+        if document.get("status") in ["error", "nofile"]:
+            continue
+
+        key = first_value(data.get("event_data_key"))
+
+        try:
+            entry = event_data_entry(document)
+        except (TypeError, ValueError, KeyError):
+            continue
+
+        # Keep the most recent upload of a file
+        if key and (
+            key not in event_data or entry["last_seen"] > event_data[key]["last_seen"]
+        ):
+            event_data[key] = entry
+
+    return event_data
+
+
+def copy_entries(event_data):
+    """Copy of event data down to its entries, to compare it later with event_data_delta.
+
+    Entries are changed in place (e.g. a lease renewed), not the values they hold,
+    so this is enough, and much cheaper than a deep copy of event data.
+    """
+
+    copied = {}
+
+    for key, value in event_data.items():
+        if isinstance(value, dict) and is_document_key(key):
+            value = dict(value)
+        elif isinstance(value, dict):
+            value = {
+                entry_key: dict(entry) if isinstance(entry, dict) else entry
+                for entry_key, entry in value.items()
+            }
+        copied[key] = value
+
+    return copied
+
+
+def entry_time(entry):
+    """Time of the last change of an entry, to merge event data."""
+
+    if not isinstance(entry, dict):
+        return ""
+    return (
+        entry.get("deleted")
+        or entry.get("last_seen")
+        or entry.get("last_attempt")
+        or entry.get("renewed")
+        or ""
+    )
+
+
+def diff_entries(base, entries, now):
+    """Changed entries, and tombstones for the deleted ones."""
+
+    delta = {key: entry for key, entry in entries.items() if base.get(key) != entry}
+
+    for key in base.keys() - entries.keys():
+        delta[key] = {"deleted": now}
+
+    return delta
+
+
+def event_data_delta(base, event_data):
+    """Changes of event data since base, e.g. during a run.
+
+    Documents are compared one by one, as are the entries of the scraper's state
+    when it is a dict (e.g. the dead-letter queue).
+    """
+
+    now = datetime.now().isoformat(timespec="seconds")
+
+    documents = {key: entry for key, entry in event_data.items() if is_document_key(key)}
+    base_documents = {key: entry for key, entry in base.items() if is_document_key(key)}
+
+    delta = diff_entries(base_documents, documents, now)
+
+    for key, value in event_data.items():
+        if is_document_key(key) or base.get(key) == value:
+            continue
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            delta[key] = diff_entries(base[key], value, now)
+        else:
+            delta[key] = value
+
+    for key in base.keys() - event_data.keys():
+        if not is_document_key(key):
+            delta[key] = None
+
+    return delta
+
+
+def merge_entries(entries, delta):
+    """Merges changed entries, keeping the most recent version of each entry."""
+
+    for key, entry in delta.items():
+        if key not in entries or entry_time(entry) >= entry_time(entries[key]):
+            entries[key] = entry
+
+
+def without_deleted(entries):
+    return {
+        key: entry
+        for key, entry in entries.items()
+        if not (isinstance(entry, dict) and "deleted" in entry)
+    }
+
+
+def merge_event_data(event_data, *deltas, in_place=False):
+    """Merges deltas (see event_data_delta) into event data.
+
+    The merge does not depend on the order of the deltas, except for ties: each
+    entry is resolved by its latest change (last_seen, or time of deletion).
+    Event data is copied, unless in_place (e.g. event data just loaded).
+    """
+
+    merged = event_data if in_place else copy.deepcopy(event_data)
+
+    for delta in deltas:
+        merge_entries(
+            merged, {key: entry for key, entry in delta.items() if is_document_key(key)}
+        )
+
+        for key, value in delta.items():
+            if is_document_key(key):
+                continue
+            if value is None:
+                merged.pop(key, None)
+            elif isinstance(value, dict) and isinstance(merged.get(key), dict):
+                merge_entries(merged[key], value)
+            else:
+                merged[key] = copy.deepcopy(value)
+
+    merged = without_deleted(merged)
+
+    for key, value in merged.items():
+        if not is_document_key(key) and isinstance(value, dict):
+            merged[key] = without_deleted(value)
+
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Merge the event data deltas of sharded runs into event data."
+    )
+    parser.add_argument("event_data", help="Event data JSON file")
+    parser.add_argument("deltas", nargs="+", help="Event data delta JSON files")
+    parser.add_argument("-o", "--output", required=True, help="JSON file to write")
+    args = parser.parse_args()
+
+    with open(args.event_data) as file:
+        event_data = json.load(file)
+
+    deltas = []
+    for path in args.deltas:
+        with open(path) as file:
+            deltas.append(json.load(file))
+
+    merged = merge_event_data(event_data, *deltas)
+
+    with open(args.output, "w") as file:
+        json.dump(merged, file)
+
+    documents = sum(1 for key in merged if is_document_key(key))
+    print(
+        f"Wrote {documents} documents to {args.output} "
+        f"({len(event_data)} keys & {len(deltas)} deltas merged)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Versioned writes of event data, for runs that overlap.
+
+Event data is loaded when a run starts and stored by batches of uploads (every
+EVENT_DATA_SAVE_UPLOADS uploads or EVENT_DATA_SAVE_INTERVAL seconds), and when
+the run ends. When another run stored it in between (its version changed), the
+changes of this run are merged into the stored event data instead of
+overwriting it.
+
+There is no cheaper way to read the version than loading event data, so it is
+loaded once per write, which batching keeps rare. The changes of this run are
+computed from a copy of event data down to its entries (see copy_entries), only
+used when the version changed.
+
+During the crawl, event data is loaded, checked & stored in a thread, one write
+at a time: only the merge & the serialization run on the reactor thread, where
+event data is changed. A run killed between two writes loses the uploads recorded
+since the last one, which are uploaded again by the next run.
+
+The snapshot of the website & the performance history are only changed when a
+run ends. The writes during the run store them as loaded (or as stored by
+another run since), and the last write of the run adds the entries of this run.
+A run killed before its end leaves them as they were.
+"""
+
+import json
+import threading
+import time
+
+from twisted.internet import defer, threads
+
+from .event_data import copy_entries, event_data_delta, merge_entries, merge_event_data
+from .history import HISTORY_KEY
+from .snapshots import SNAPSHOT_KEY
+
+# Key of the version of event data, incremented by each write
+VERSION_KEY = "_version"
+
+# Keys of event data only changed by the last write of a run
+DEFERRED_KEYS = [SNAPSHOT_KEY, HISTORY_KEY]
+
+# The crawls of a process (one per website) share event data, and write it from
+# threads: their writes check the version & store one at a time
+STORE_LOCK = threading.Lock()
+
+
+class EventDataStore:
+    """Stores the event data of a spider, merging the writes of concurrent runs."""
+
+    def __init__(self, spider, save_uploads=1, save_interval=0):
+        self.spider = spider
+        self.version = spider.event_data.get(VERSION_KEY, 0)
+
+        # Taken out of event data (see DEFERRED_KEYS): as stored by the writes
+        # before the last one, and with the changes of this run
+        self.stored_deferred = {
+            key: spider.event_data.pop(key, None) or {} for key in DEFERRED_KEYS
+        }
+        self.deferred = {
+            key: copy_entries(value) for key, value in self.stored_deferred.items()
+        }
+
+        # Event data as last loaded or stored, to compute the changes of this run
+        self.base = copy_entries(spider.event_data)
+
+        # Uploads stored by batches, by one write at a time
+        self.save_uploads = save_uploads
+        self.save_interval = save_interval
+        self.changes = 0
+        self.last_save = time.monotonic()
+        self.lock = defer.DeferredLock()
+
+    def event_data(self):
+        """Event data with the deferred keys, as stored by the last write of the run."""
+
+        return {**self.spider.event_data, **self.deferred}
+
+    def merge_deferred(self, stored, final):
+        """Takes the deferred keys stored by the last write of another run."""
+
+        for key in DEFERRED_KEYS:
+            value = stored.pop(key, None)
+            if not isinstance(value, dict):
+                continue
+
+            if not final:
+                # Stored again by the writes before the last one of this run
+                self.stored_deferred[key] = value
+
+            # In place, as the deferred keys are referenced by the pipelines, with
+            # the entries this run changed since it loaded them
+            merge_entries(self.deferred[key], copy_entries(value))
+
+    def changed(self):
+        """Counts a recorded upload, and stores event data once a batch is due."""
+
+        self.changes += 1
+
+        if (
+            self.changes >= self.save_uploads
+            or time.monotonic() - self.last_save >= self.save_interval
+        ):
+            self.save_in_thread()
+
+    def save_in_thread(self, final=False):
+        """Stores event data after the writes in progress, returns a Deferred.
+
+        A write waiting for its turn stores the changes made until it starts, so
+        another one is not queued.
+        """
+
+        self.changes = 0
+        self.last_save = time.monotonic()
+
+        if self.lock.waiting and not final:
+            return defer.succeed(None)
+
+        d = self.lock.run(self.write, final)
+
+        if not final:
+            d.addErrback(
+                lambda failure: self.spider.logger.warning(
+                    f"Error storing event data: {failure.getErrorMessage()}"
+                )
+            )
+
+        return d
+
+    def write(self, final, stored=None):
+        """Stores event data from a thread, merged again if stored in between."""
+
+        d = threads.deferToThread(self.store, *self.prepare(stored, final))
+        d.addCallback(self.written, final)
+        return d
+
+    def written(self, result, final):
+        stored, base = result
+
+        if stored is not None:
+            return self.write(final, stored)
+
+        self.stored(base)
+
+    def save(self, final=False):
+        """Stores event data, with the changes of the deferred keys if final.
+
+        The last write of the run is final: the writes before it store the
+        deferred keys as loaded or as stored by other runs.
+        """
+
+        stored = None
+
+        while True:
+            stored, base = self.store(*self.prepare(stored, final))
+            if stored is None:
+                break
+
+        self.stored(base)
+
+    def load(self):
+        """Stored event data, to check its version, or None if it fails to load."""
+
+        try:
+            return self.spider.load_event_data()
+        except Exception as e:
+            self.spider.logger.warning(
+                f"Error loading event data to check its version: {e}"
+            )
+            return None
+
+    def store(self, serialized, base, version):
+        """Stores serialized event data, unless stored by another run since version.
+
+        Returns the event data stored since, to merge it, or the copy of event
+        data stored.
+        """
+
+        with STORE_LOCK:
+            # There is no atomic write: the version is checked just before storing
+            stored = self.load()
+
+            if isinstance(stored, dict) and stored.get(VERSION_KEY, 0) != version:
+                return stored, None
+
+            self.spider.store_event_data(json.loads(serialized))
+            return None, base
+
+    def prepare(self, stored, final):
+        """Merges the stored event data if its version changed, & serializes it.
+
+        Returns the serialized event data, the copy of event data it stores, & the
+        version it replaces.
+        """
+
+        spider = self.spider
+        event_data = spider.event_data
+
+        spider.leases.renew()
+
+        version = self.version
+
+        if isinstance(stored, dict) and stored.get(VERSION_KEY, 0) != self.version:
+            spider.leases.resolve(stored)
+            self.merge_deferred(stored, final)
+
+            delta = event_data_delta(self.base, event_data)
+            version = stored.get(VERSION_KEY, 0)
+
+            # The changes of this run are now the changes from the stored event
+            # data, until this write is stored
+            self.base = copy_entries(stored)
+            self.version = version
+
+            # Loaded for this write only, so merged in place
+            merged = merge_event_data(stored, delta, in_place=True)
+
+            # In place, as event data is referenced by the pipelines
+            event_data.clear()
+            event_data.update(merged)
+
+            spider.crawler.stats.inc_value("event_data/merged_writes")
+            spider.logger.info(
+                f"Event data was stored by another run (version {version}), merged"
+            )
+
+        event_data[VERSION_KEY] = version + 1
+
+        if final:
+            self.stored_deferred = self.deferred
+
+        # Serialized here, as event data keeps changing while it is stored
+        serialized = json.dumps({**event_data, **self.stored_deferred})
+
+        return serialized, copy_entries(event_data), version
+
+    def stored(self, base):
+        """Records the version of a write once stored, to check the next one."""
+
+        self.version = base[VERSION_KEY]
+        self.base = base
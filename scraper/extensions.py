@@ -0,0 +1,71 @@
+"""Scrapy extensions of the scraper."""
+
+from datetime import datetime
+
+from scrapy import signals
+
+
+class DeadlineController:
+    """Drains the crawl before the time limit instead of stopping it abruptly.
+
+    TIME_LIMIT_DRAIN minutes before the time limit, the spider starts draining:
+    event data is flushed and DrainMiddleware drops new page requests, while file
+    requests already scheduled & their uploads go on. The spider is closed at the
+    time limit if it has not finished draining.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.drain_minutes = crawler.settings.getfloat("TIME_LIMIT_DRAIN")
+        self.calls = []
+
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def spider_opened(self, spider):
+        from twisted.internet import reactor
+
+        spider.draining = False
+
+        if not spider.time_limit:
+            return
+
+        limit = spider.time_limit * 60
+        drain = min(self.drain_minutes * 60, limit)
+
+        self.calls = [
+            reactor.callLater(limit - drain, self.start_drain, spider),
+            reactor.callLater(limit, self.close, spider),
+        ]
+
+    def start_drain(self, spider):
+        spider.draining = True
+        self.crawler.stats.set_value("deadline/drain_start_time", datetime.now())
+
+        spider.logger.info(
+            f"Approaching time limit ({spider.time_limit} minutes): "
+            "no new pages will be scraped, finishing scheduled files"
+        )
+
+        # Flush event data now, in case the run is killed during the drain
+        if spider.run_id and not spider.dry_run:
+            spider.event_store.save_in_thread()
+
+    def close(self, spider):
+        self.crawler.stats.set_value("deadline/time_limit_reached", True)
+        self.crawler.engine.close_spider(
+            spider, f"Closed due to time limit ({spider.time_limit} minutes)"
+        )
+
+    def spider_closed(self, spider):
+        for call in self.calls:
+            if call.active():
+                call.cancel()
+
+        cut = self.crawler.stats.get_value("deadline/cut_requests", 0)
+        if spider.draining:
+            spider.logger.info(f"Drained before the time limit, {cut} requests cut")
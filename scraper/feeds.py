@@ -0,0 +1,85 @@
+"""Feed exports: partitioned file names & compaction of the NDJSON exports."""
+
+import argparse
+import glob
+import gzip
+import json
+import os
+
+
+def uri_params(params, spider):
+    """Adds the year, run & website parameters to the feed URIs (see FEED_URI_PARAMS).
+
+    The crawls of the websites of a run start in the same second: the website
+    keeps their exports apart.
+    """
+
+    run = spider.start_time.strftime("%Y%m%d_%H%M%S")
+
+    if spider.run_id:
+        run += f"_{spider.run_id}"
+
+    return {
+        **params,
+        "year": spider.target_year,
+        "run": run,
+        "profile": spider.profile.name,
+    }
+
+
+def read_items(paths):
+    """Yields the items of NDJSON exports (.jsonl or .jsonl.gz).
+
+    Files of interrupted runs may end with a truncated line or gzip stream:
+    the items before it are still returned.
+    """
+
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+
+        try:
+            with opener(path, "rt", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+        except EOFError:
+            pass
+
+
+def compact(paths, output):
+    """Compacts NDJSON exports into a single Parquet file. Requires pyarrow."""
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("pyarrow is required to compact the exports to Parquet")
+
+    table = pa.Table.from_pylist(list(read_items(paths)))
+    pq.write_table(table, output, compression="zstd")
+
+    return table.num_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compact NDJSON exports of the scraper into a Parquet file."
+    )
+    parser.add_argument(
+        "directory", help="Directory of the exports, e.g. exports/2024"
+    )
+    parser.add_argument("output", help="Parquet file to write")
+    args = parser.parse_args()
+
+    paths = sorted(
+        glob.glob(os.path.join(args.directory, "**", "*.jsonl*"), recursive=True)
+    )
+    rows = compact(paths, args.output)
+
+    print(f"Wrote {rows} items from {len(paths)} files to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
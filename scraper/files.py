@@ -0,0 +1,64 @@
+"""Downloaded files, whose content is uploaded to DocumentCloud instead of their URL.
+
+Scrapy keeps the body of a response in memory, so each downloaded file is held in
+memory until it is uploaded. Files larger than FILE_MAX_SIZE are not downloaded:
+their download is cancelled and they are uploaded by URL (see DREALSpider).
+"""
+
+import hashlib
+import io
+import os
+
+
+class FileIntegrityError(Exception):
+    """The size of a downloaded file does not match its Content-Length."""
+
+
+class DownloadedFile(io.BytesIO):
+    """Body of a file response, with a name to upload it.
+
+    BytesIO shares the body of the response instead of copying it, as long as it
+    is not written to.
+    """
+
+    def __init__(self, name, body):
+        super().__init__(body)
+        self.name = name
+        self.size = len(body)
+        self.sha256 = hashlib.sha256(body).hexdigest()
+
+
+def downloaded_file(response):
+    """The body of a file response, checked against its Content-Length."""
+
+    body = response.body
+
+    # Files are requested with "Accept-Encoding: identity", so Content-Length is
+    # the length of the file itself
+    content_length = response.headers.get("Content-Length")
+
+    if content_length is not None and int(content_length) != len(body):
+        raise FileIntegrityError(
+            f"Incomplete download of {response.url}: "
+            f"{len(body)} bytes received, {int(content_length)} expected"
+        )
+
+    return DownloadedFile(os.path.basename(response.url.split("?")[0]), body)
+
+
+def upload_downloaded_file(client, file, **kwargs):
+    """Uploads the content of a downloaded file, with the upload of the client.
+
+    The client sends the content in a single request, retried as a whole. A
+    file lost by the storage shows up as a "nofile" processing status (see
+    ProcessingStatusPipeline).
+    """
+
+    # Read from the start by the upload to each target
+    file.seek(0)
+
+    return client.documents.upload(
+        file,
+        original_extension=os.path.splitext(file.name)[1].lower().lstrip("."),
+        **kwargs,
+    )
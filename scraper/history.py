@@ -0,0 +1,267 @@
+"""Performance history of the runs, kept in event data.
+
+Each run appends a compact record of its performance to the history when it
+ends (see DEFERRED_KEYS in event_store.py). Runs
+slower than the median of the previous runs of their scraper are flagged in
+the run email. The history of an event data file is rendered with:
+
+    python -m scraper.history event_data_PACA.json
+"""
+
+import argparse
+import json
+import statistics
+from datetime import datetime
+
+from . import settings
+
+# Key of the history in event data, by run
+HISTORY_KEY = "_history"
+
+# Metrics compared with the previous runs, and whether higher is better
+METRICS = {
+    "pages_per_minute": True,
+    "upload_p50": False,
+    "upload_p95": False,
+    "download_latency": False,
+}
+
+# Previous runs needed to flag a regression
+MIN_BASELINE_RUNS = 3
+
+SPARKS = "▁▂▃▄▅▆▇█"
+
+
+def percentile(values, p):
+    if not values:
+        return None
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run_record(spider, upload_latencies, event_data_bytes):
+    """Performance record of a run, from its stats."""
+
+    stats = spider.crawler.stats
+    streams = spider.department_streams.streams.values()
+
+    duration = (datetime.now() - spider.start_time).total_seconds()
+    pages = sum(stream["list_pages"] + stream["project_pages"] for stream in streams)
+    responses = sum(
+        stream["list_pages"] + stream["project_pages"] + stream["files"]
+        for stream in streams
+    )
+    download_time = sum(stream["download_time"] for stream in streams)
+
+    def rounded(value, digits=2):
+        return round(value, digits) if value is not None else None
+
+    return {
+        "run_id": spider.run_id,
+        "scraper": spider.profile.name,
+        "year": spider.target_year,
+        "shard": f"{spider.shard_index}/{spider.shard_count}",
+        "started": spider.start_time.isoformat(timespec="seconds"),
+        "duration": round(duration),
+        "requests": stats.get_value("downloader/request_count", 0),
+        "pages": pages,
+        "pages_per_minute": rounded(pages / duration * 60, 1) if pages else None,
+        "heads": stats.get_value("downloader/request_method_count/HEAD", 0),
+        "not_modified": stats.get_value("downloader/response_status_count/304", 0),
+        "retries": stats.get_value("retry/count", 0),
+        "download_latency": (
+            rounded(download_time / responses) if responses else None
+        ),
+        "uploads": len(upload_latencies),
+        "upload_p50": rounded(percentile(upload_latencies, 0.5)),
+        "upload_p95": rounded(percentile(upload_latencies, 0.95)),
+        "event_data_bytes": event_data_bytes,
+        "time_limit_hit": bool(spider.draining),
+    }
+
+
+class RunHistory:
+    """Performance records of the runs, by run."""
+
+    def __init__(self, event_data, max_runs):
+        self.event_data = event_data
+        self.max_runs = max_runs
+
+    @property
+    def records(self):
+        # Event data can be replaced in place by a merge (see EventDataStore)
+        return self.event_data.setdefault(HISTORY_KEY, {})
+
+    def append(self, record):
+        """Adds the record of a run, and removes the oldest ones. Returns its key."""
+
+        key = f"{record['started']} {record['scraper']} {record['shard']}"
+
+        # Overlapping runs can start in the same second
+        if record["run_id"]:
+            key += f" {record['run_id']}"
+
+        records = self.records
+        records[key] = record
+
+        for old_key in sorted(records)[: -self.max_runs]:
+            del records[old_key]
+
+        return key
+
+    def regressions(self, key, window, threshold):
+        return regressions(self.records, key, window, threshold)
+
+
+def regressions(records, key, window, threshold):
+    """Metrics of a run worse than the median of the previous runs of its scraper.
+
+    A metric is flagged when it is worse by more than threshold (e.g. 0.25) than
+    the median of the last window runs.
+    """
+
+    record = records[key]
+
+    previous = [
+        records[previous_key]
+        for previous_key in sorted(records)
+        if previous_key < key and records[previous_key]["scraper"] == record["scraper"]
+    ][-window:]
+
+    flags = []
+
+    for metric, higher_is_better in METRICS.items():
+        value = record.get(metric)
+        values = [r[metric] for r in previous if r.get(metric) is not None]
+
+        if value is None or len(values) < MIN_BASELINE_RUNS:
+            continue
+
+        baseline = statistics.median(values)
+        if not baseline:
+            continue
+
+        change = (value - baseline) / baseline
+
+        if (change < -threshold) if higher_is_better else (change > threshold):
+            flags.append(
+                f"{metric}: {value} ({change:+.0%} vs. {baseline} for the last "
+                f"{len(values)} runs)"
+            )
+
+    if record.get("time_limit_hit"):
+        flags.append("time limit hit")
+
+    return flags
+
+
+def sparkline(values):
+    """One character per value, from the lowest to the highest."""
+
+    values = [value for value in values if value is not None]
+    if not values:
+        return ""
+
+    low, high = min(values), max(values)
+
+    def spark(value):
+        if high == low:
+            return SPARKS[0]
+        return SPARKS[int((value - low) / (high - low) * (len(SPARKS) - 1))]
+
+    return "".join(spark(value) for value in values)
+
+
+def report(records, scraper, last, window, threshold):
+    """Lines of the history report: trends, then one line per run."""
+
+    keys = [
+        key
+        for key in sorted(records)
+        if scraper is None or records[key]["scraper"] == scraper
+    ]
+
+    lines = []
+
+    for name in sorted({records[key]["scraper"] for key in keys}):
+        runs = [records[key] for key in keys if records[key]["scraper"] == name]
+        runs = runs[-last:]
+
+        lines.append(f"{name} ({len(runs)} runs)")
+        for metric in ["pages_per_minute", "download_latency", "upload_p95"]:
+            values = [run.get(metric) for run in runs]
+            known = [value for value in values if value is not None]
+            if known:
+                lines.append(
+                    f"  {metric:<17} {sparkline(values)}  "
+                    f"last {known[-1]}, median {statistics.median(known)}"
+                )
+        lines.append("")
+
+    lines.append(
+        f"{'started':<19} {'scraper':<8} {'year':<4} {'min':>5} {'pages':>6} "
+        f"{'p/min':>6} {'HEAD':>5} {'304':>5} {'upl':>5} {'p50 s':>6} {'p95 s':>6} "
+        f"{'data KB':>8}"
+    )
+
+    for key in keys[-last:]:
+        run = records[key]
+
+        def value(metric):
+            return "-" if run.get(metric) is None else run[metric]
+
+        lines.append(
+            f"{run['started']:<19} {run['scraper']:<8} {run['year']:<4} "
+            f"{run['duration'] / 60:>5.0f} {run['pages']:>6} "
+            f"{value('pages_per_minute'):>6} {run['heads']:>5} "
+            f"{run['not_modified']:>5} {run['uploads']:>5} "
+            f"{value('upload_p50'):>6} {value('upload_p95'):>6} "
+            f"{run['event_data_bytes'] / 1024:>8.0f}"
+        )
+
+        for flag in regressions(records, key, window, threshold):
+            lines.append(f"  ! {flag}")
+
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render the performance history of the runs of an event data file."
+    )
+    parser.add_argument("event_data", help="Event data JSON file")
+    parser.add_argument("--scraper", help="Only the runs of a website, e.g. PACA")
+    parser.add_argument("--last", type=int, default=30, help="Number of runs shown")
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=settings.HISTORY_BASELINE_RUNS,
+        help="Previous runs of the baseline",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=settings.HISTORY_REGRESSION_THRESHOLD,
+        help="Change from the baseline flagged as a regression",
+    )
+    args = parser.parse_args()
+
+    with open(args.event_data) as file:
+        event_data = json.load(file)
+
+    records = event_data.get(HISTORY_KEY, {})
+
+    if not records:
+        print("No performance history in this event data")
+        return
+
+    print(
+        "\n".join(
+            report(records, args.scraper, args.last, args.window, args.threshold)
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
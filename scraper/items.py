@@ -1,41 +1,157 @@
 """Models for the scraped items."""
 
-from scrapy.item import Item, Field
+import dataclasses
+from dataclasses import dataclass
+from datetime import datetime
+from pprint import pformat
+from typing import List
 
+from itemadapter import ItemAdapter
+from itemadapter.adapter import DataclassAdapter
 
-class DocumentItem(Item):
-    """A document that will be uploaded to DocumentCloud."""
 
-    title = Field()
-    project = Field()
-    project_id = Field()
+@dataclass(slots=True, init=False, repr=False, eq=False)
+class DocumentItem:
+    """A document that will be uploaded to DocumentCloud.
 
-    source = Field()
-    access = Field()
+    Fields are stored in slots and can be left unset, like the fields of a Scrapy
+    Item. The publication date strings are computed on demand from publication_dt.
+    """
 
-    authority = Field()
+    title: str
+    project: str
+    project_id: str
 
-    category = Field()
-    category_local = Field()
+    source: str
+    access: str
 
-    source_scraper = Field()
-    source_file_url = Field()
-    source_filename = Field()
-    source_page_url = Field()
+    authority: str
 
-    publication_date = Field()
-    publication_time = Field()
-    publication_datetime = Field()
-    publication_datetime_dcformat = Field()
+    category: str
+    category_local: str
 
-    publication_lastmodified = Field()
+    source_scraper: str
+    source_file_url: str
+    source_filename: str
+    source_page_url: str
 
-    full_info = Field()
+    publication_dt: datetime
 
-    year = Field()
+    publication_lastmodified: str
 
-    headers = Field()
+    full_info: str
 
-    department_from_scraper = Field()
-    departments = Field()
-    departments_sources = Field()
+    # Fields of full_info (see parsing.py)
+    petitionnaire: str
+    rubriques: str
+    date_reception: str
+    date_completude: str
+    decision: str
+    recours: str
+    communes: str
+
+    year: int
+
+    headers: dict
+
+    file_size: int
+    file_sha256: str
+
+    document_id: int
+
+    # Documents uploaded to each target (see targets.py), by target name
+    target_documents: dict
+
+    department_from_scraper: str
+    departments: List[str]
+    departments_sources: List[str]
+
+    def __init__(self, **kwargs):
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(f"{self.__class__.__name__} does not support field: {key}")
+        setattr(self, key, value)
+
+    def __repr__(self):
+        return pformat(
+            {key: getattr(self, key) for key in self.__slots__ if hasattr(self, key)}
+        )
+
+    def __contains__(self, key):
+        return hasattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    @property
+    def publication_date(self):
+        return self.publication_dt.strftime("%Y-%m-%d")
+
+    @property
+    def publication_time(self):
+        return self.publication_dt.strftime("%H:%M:%S UTC")
+
+    @property
+    def publication_datetime(self):
+        return self.publication_date + " " + self.publication_time
+
+    @property
+    def publication_datetime_dcformat(self):
+        return self.publication_dt.isoformat(timespec="microseconds") + "Z"
+
+
+# Fields computed from publication_dt
+DERIVED_FIELDS = [
+    "publication_date",
+    "publication_time",
+    "publication_datetime",
+    "publication_datetime_dcformat",
+]
+
+
+class DocumentItemAdapter(DataclassAdapter):
+    """Exposes the computed fields of DocumentItem to ItemAdapter (& feed exports)."""
+
+    def __init__(self, item):
+        super().__init__(item)
+        self._fields_dict = {
+            **self._fields_dict,
+            **{name: dataclasses.field() for name in DERIVED_FIELDS},
+        }
+
+    @classmethod
+    def is_item_class(cls, item_class):
+        return issubclass(item_class, DocumentItem)
+
+    @classmethod
+    def get_field_names_from_class(cls, item_class):
+        return [f.name for f in dataclasses.fields(item_class)] + DERIVED_FIELDS
+
+    def __getitem__(self, field_name):
+        # Unset fields behave like missing keys, as in a Scrapy Item
+        try:
+            return super().__getitem__(field_name)
+        except AttributeError:
+            raise KeyError(field_name)
+
+    def __setitem__(self, field_name, value):
+        if field_name in DERIVED_FIELDS:
+            raise KeyError(f"{field_name} is computed from publication_dt")
+        super().__setitem__(field_name, value)
+
+    def __delitem__(self, field_name):
+        if field_name in DERIVED_FIELDS:
+            raise KeyError(f"{field_name} is computed from publication_dt")
+        super().__delitem__(field_name)
+
+
+ItemAdapter.ADAPTER_CLASSES.appendleft(DocumentItemAdapter)
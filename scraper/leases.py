@@ -0,0 +1,130 @@
+"""Leases on departments, so that overlapping runs split the crawl.
+
+A run takes a lease on each department before crawling it, and renews it every
+time it stores event data. Departments leased by another run are skipped until
+the lease expires (e.g. if the other run crashed). The shards of a sharded crawl
+crawl the same departments, so each shard has its own leases.
+"""
+
+from datetime import datetime, timedelta
+
+# Key of the leases in event data
+LEASES_KEY = "_leases"
+
+
+class DepartmentLeases:
+    """Leases of a run, kept in event data & stored with it."""
+
+    def __init__(
+        self,
+        event_data,
+        run_id,
+        target_year,
+        ttl_minutes,
+        enabled=True,
+        shard_index=0,
+        shard_count=1,
+    ):
+        self.event_data = event_data
+        self.run_id = run_id
+        self.target_year = target_year
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.ttl = timedelta(minutes=ttl_minutes)
+        self.enabled = enabled
+
+        # Departments leased by this run, by lease key
+        self.held = {}
+        self.renewed = datetime.now()
+
+        # Departments whose lease was taken by another run
+        self.lost = set()
+        self.skipped = set()
+
+    @property
+    def leases(self):
+        # Event data can be replaced in place by a merge (see EventDataStore)
+        return self.event_data.setdefault(LEASES_KEY, {})
+
+    def key(self, dept):
+        key = f"{self.target_year}/{dept.split(' - ')[0]}"
+
+        if self.shard_count > 1:
+            key += f"/{self.shard_index}of{self.shard_count}"
+
+        return key
+
+    def other_lease(self, key, now):
+        """Returns the unexpired lease of another run, if there is one."""
+
+        lease = self.leases.get(key)
+
+        if lease and lease["run_id"] != self.run_id and lease["expires"] > now:
+            return lease
+
+        return None
+
+    def acquire(self, dept):
+        """Takes the lease of a department. Returns False if another run holds it."""
+
+        if not self.enabled:
+            return True
+
+        now = datetime.now()
+        key = self.key(dept)
+
+        if self.other_lease(key, now.isoformat(timespec="seconds")):
+            self.skipped.add(dept)
+            return False
+
+        self.held[key] = dept
+        self.leases[key] = {
+            "run_id": self.run_id,
+            "acquired": now.isoformat(timespec="seconds"),
+            "renewed": now.isoformat(timespec="seconds"),
+            "expires": (now + self.ttl).isoformat(timespec="seconds"),
+        }
+        return True
+
+    def renewal_due(self):
+        """True if the leases should be renewed (& stored) to keep them."""
+
+        return bool(self.held) and datetime.now() - self.renewed > self.ttl / 2
+
+    def renew(self):
+        now = datetime.now()
+        self.renewed = now
+
+        for key in self.held:
+            lease = self.leases.get(key)
+            if lease and lease["run_id"] == self.run_id:
+                lease["renewed"] = now.isoformat(timespec="seconds")
+                lease["expires"] = (now + self.ttl).isoformat(timespec="seconds")
+
+    def resolve(self, stored_event_data):
+        """Gives up the leases taken at the same time by a run that acquired them first."""
+
+        now = datetime.now().isoformat(timespec="seconds")
+        stored_leases = stored_event_data.get(LEASES_KEY) or {}
+
+        for key, dept in list(self.held.items()):
+            stored = stored_leases.get(key)
+            ours = self.leases.get(key)
+
+            if (
+                stored
+                and ours
+                and stored["run_id"] != self.run_id
+                and stored["expires"] > now
+                and stored["acquired"] <= ours["acquired"]
+            ):
+                del self.leases[key]
+                del self.held[key]
+                self.lost.add(dept)
+
+    def release(self):
+        for key in self.held:
+            lease = self.leases.get(key)
+            if lease and lease["run_id"] == self.run_id:
+                del self.leases[key]
+        self.held = {}
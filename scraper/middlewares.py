@@ -0,0 +1,24 @@
+"""Downloader middlewares of the scraper."""
+
+from scrapy.exceptions import IgnoreRequest
+
+
+class DrainMiddleware:
+    """Drops page requests once the spider drains before the time limit (see DeadlineController)."""
+
+    def process_request(self, request, spider):
+        if getattr(spider, "draining", False) and not request.meta.get("file_request"):
+            spider.crawler.stats.inc_value("deadline/cut_requests")
+            raise IgnoreRequest("Draining before the time limit")
+
+
+class LeaseMiddleware:
+    """Drops the requests of departments whose lease was taken by another run (see leases.py)."""
+
+    def process_request(self, request, spider):
+        leases = getattr(spider, "leases", None)
+        dept = request.cb_kwargs.get("dept")
+
+        if leases and dept in leases.lost:
+            spider.crawler.stats.inc_value("leases/cut_requests")
+            raise IgnoreRequest(f"{dept} is crawled by another run")
@@ -0,0 +1,129 @@
+"""Normalization of project names & document titles.
+
+Project-level normalization only depends on the project page, so it is computed
+once per page by the pipelines. Title normalization is done for every document.
+"""
+
+import hashlib
+import re
+
+# Name of the project (ID)
+PROJECT_RE = re.compile(r"([A-Za-z0-9]+)_? *(?::|-) *(.*)")
+
+# Municipalities starting with the department number, e.g. 05 - GAP. Only the
+# prefix is matched by a regex, the spaces & the hyphen can be matched one way
+NUMBER_FIRST_RE = re.compile(r"(\d{2})\s*(?:-\s*)?(?=\S)")
+NUMBER_SUFFIX_RE = re.compile(r"\(\d{2}\)$")
+NUMBER_END_RE = re.compile(r"\d\d\)$")
+
+SPACE_BEFORE_PARENTHESIS_RE = re.compile(r"(\S)\(")
+SPACE_IN_PARENTHESIS_RE = re.compile(r"(\s)\)")
+
+# Titles with "Ap" for "Arrêté préfectoral"
+TITLE_AP_RE = re.compile(r"(F0\w{8,10}(?:(?:-\d| \d))?) Ap\b")
+
+
+def beautify_full_info(full_info):
+    """Replaces non-breaking spaces & typographic apostrophes."""
+
+    return full_info.replace(" ", " ").replace("’", "'").replace("  ", " ")
+
+
+def beautify_project(project, communes, department_from_scraper):
+    """Beautify & harmonize a project name, adding its municipalities (communes field)."""
+
+    project = project.strip()
+    project = project.replace(" ", " ").replace("’", "'")
+    project = project.rstrip(".,")
+
+    # Reformating
+    # Name of the project (ID)
+    project_match = PROJECT_RE.match(project)
+    project_id, project_name = project_match.groups()
+
+    # Remove quotation marks
+    if project_name.startswith('"') and project_name.endswith('"'):
+        project_name = project_name.strip('"')
+
+    project = f"{project_name.strip()} ({project_id.strip().upper()})"
+    project = project[0].upper() + project[1:]
+
+    if communes:
+        municipalities = beautify_full_info(communes).replace(" ; ", ", ").strip()
+
+        # Missing space before opening parenthesis
+        # Gap(05) -> Gap (05)
+        municipalities = SPACE_BEFORE_PARENTHESIS_RE.sub(r"\1 (", municipalities)
+        # Missing space before closing parenthesis
+        # Gap(05) -> Gap (05)
+        municipalities = SPACE_IN_PARENTHESIS_RE.sub(r")", municipalities)
+
+        # Different template
+        # 05 GAP -> Gap (05)
+        number_first = NUMBER_FIRST_RE.match(municipalities)
+        if number_first:
+            name = municipalities[number_first.end() :]
+
+            # 05 Gap (05) -> Gap (05)
+            number_suffix = NUMBER_SUFFIX_RE.search(name)
+            if number_suffix and name[: number_suffix.start()].strip():
+                name = name[: number_suffix.start()].rstrip()
+
+            if "\n" not in name:
+                municipalities = f"{name} ({number_first.group(1)})"
+
+        # Add department number if missing
+        if not NUMBER_END_RE.search(municipalities):
+            municipalities += f" ({department_from_scraper})"
+
+        project = project + " - " + municipalities
+
+    return project.strip()
+
+
+def beautify_title(title):
+    """Beautify & harmonize a document title."""
+
+    title = title.strip()
+    title = title.replace("  ", " ").replace("’", "'")
+    title = title.rstrip(".,")
+
+    title = title.replace("  ", " ")
+
+    # Format title
+    # F093XXXXX Doc name
+    split_title = title.split(" ")
+
+    if len(split_title) > 1:
+
+        if split_title[0].lower().startswith("f09"):
+
+            # Project id in uppercase
+            split_title[0] = split_title[0].upper()
+
+            # Capitalize next word of title
+            split_title[1] = split_title[1][:1].upper() + split_title[1][1:]
+
+        else:
+            split_title[0] = split_title[0][:1].upper() + split_title[0][1:]
+
+        title = " ".join(split_title)
+
+    else:
+        if title.strip().lower().startswith("f09"):
+            title = title.upper().strip()
+        else:
+            title = title[:1].upper() + title[1:]
+
+    # Replace "Ap" by "Arrêté préfectoral"
+    title = TITLE_AP_RE.sub(r"\1 Arrêté préfectoral", title)
+
+    return title
+
+
+def project_id(source_page_url, project):
+    """Identifier of a project: hash of its page URL & normalized name."""
+
+    string_to_hash = source_page_url + " " + project
+
+    return hashlib.sha256(string_to_hash.encode()).hexdigest()
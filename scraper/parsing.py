@@ -0,0 +1,108 @@
+"""Parsing of project pages.
+
+The information text lists the fields of a project ("Pétitionnaire :",
+"Décision :"...) one after the other. It is parsed in a single pass, which
+extracts the value of each field & puts the labels at the start of a line for
+full_info. The value of a field ends at the next label or at the end of its
+line: free text can follow the last field of a line (e.g. "Commune(s) du
+projet : Gap (05)" then a description of the project).
+"""
+
+import re
+
+from parsel import Selector
+
+# Labels of the information text, and the item fields of their values
+FIELDS = {
+    "Pétitionnaire": "petitionnaire",
+    "Rubrique(s) concernée(s)": "rubriques",
+    "Date de réception": "date_reception",
+    "Dossier reçu le": "date_reception",
+    "Dossier complet le": "date_completude",
+    "Décision": "decision",
+    "Recours gracieux du": "recours",
+    "Commune(s) du projet": "communes",
+}
+
+INFO_FIELDS = sorted(set(FIELDS.values()))
+
+# Labels starting a new line in full_info, as written in the pages
+LINE_LABELS = frozenset(
+    [
+        "Rubrique(s) concernée(s) :",
+        "Pétitionnaire :",
+        "Date de réception :",
+        "Dossier complet le :",
+        "Décision :",
+        "Dossier reçu le :",
+        "Recours gracieux du :",
+    ]
+)
+
+# Labels & their field names, split out of the information text
+LABEL_RE = re.compile(
+    "((" + "|".join(re.escape(label) for label in FIELDS) + ")[ \xa0]*:)"
+)
+
+
+def field_value(text):
+    """Value of a field, from the end of its label to the end of its line."""
+
+    return text.split("\n", 1)[0].strip()
+
+
+def parse_full_info(info):
+    """Returns the full_info text of a project page, and the values of its fields."""
+
+    # Text, then label, field name & text for each label
+    parts = LABEL_RE.split(info)
+    fields = {}
+
+    for i in range(1, len(parts), 3):
+        label, name, text = parts[i : i + 3]
+
+        if label in LINE_LABELS:
+            parts[i] = "\n" + label
+        parts[i + 1] = ""
+
+        field = FIELDS[name]
+        if field not in fields:
+            value = field_value(text)
+            if value:
+                fields[field] = value
+
+    return "".join(parts), fields
+
+
+def extract_project_page(html, profile):
+    """Extracts the project, its information & its file links from a project page.
+
+    Pages without files are extracted too, for the snapshot of the website. The
+    result is small and picklable, so it can be extracted in a process pool (see
+    PROJECT_PAGE_PROCESSES).
+    """
+
+    selector = Selector(text=html)
+
+    file_links = [
+        (link.css("::text").get().strip(), link.attrib["href"])
+        for link in selector.css(profile.file_links)
+    ]
+
+    project = selector.css(profile.project_title).get()
+
+    raw_info = selector.css(profile.project_info).css("*::text").extract()
+
+    info = "".join([x.lstrip() for x in raw_info if x.strip()]).strip()
+
+    if not info:
+        info = selector.css(profile.project_lead).css("*::text").extract()
+        if info:
+            info = info[0].strip()
+
+    if not info:
+        info = ""
+
+    info, info_fields = parse_full_info(info)
+
+    return project, info, info_fields, file_links
@@ -1,19 +1,38 @@
 # Item Pipelines
 
 import datetime
-import re
+import functools
 import os
+import time
 from urllib.parse import urlparse
 import logging
 import json
-import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
+from scrapy import signals
 from scrapy.exceptions import DropItem
+from twisted.internet import threads
 from itemadapter import ItemAdapter
-from documentcloud.constants import SUPPORTED_EXTENSIONS
-
+from documentcloud.constants import BULK_LIMIT, SUPPORTED_EXTENSIONS
+
+from .dead_letters import DeadLetterQueue
+from .event_store import EventDataStore
+from .event_data import (
+    copy_entries,
+    event_data_delta,
+    first_value,
+    is_document_key,
+    rebuild_event_data,
+    search_documents,
+)
+from .files import upload_downloaded_file
+from .history import RunHistory, run_record
+from .leases import DepartmentLeases
 from .log import SilentDropItem
 from .departments import department_from_authority, departments_from_project_name
+from .normalize import beautify_full_info, beautify_project, beautify_title, project_id
+from .parsing import INFO_FIELDS
+from .snapshots import SiteSnapshot
 
 
 class ParseDatePipeline:
@@ -24,20 +43,11 @@ class ParseDatePipeline:
 
         # Publication date
 
-        publication_dt = datetime.datetime.strptime(
+        # The other publication_* fields are computed from publication_dt
+        item["publication_dt"] = datetime.datetime.strptime(
             item["publication_lastmodified"], "%a, %d %b %Y %H:%M:%S %Z"
         )
 
-        item["publication_date"] = publication_dt.strftime("%Y-%m-%d")
-        item["publication_time"] = publication_dt.strftime("%H:%M:%S UTC")
-        item["publication_datetime"] = (
-            item["publication_date"] + " " + item["publication_time"]
-        )
-
-        item["publication_datetime_dcformat"] = (
-            publication_dt.isoformat(timespec="microseconds") + "Z"
-        )
-
         return item
 
 
@@ -64,107 +74,64 @@ class SourceFilenamePipeline:
         return item
 
 
-class BeautifyPipeline:
-    def process_item(self, item, spider):
-        """Beautify & harmonize project names & document titles."""
-
-        # Full info
-        # Beautified to simplify regex to extract municipalities in project name below
-
-        item["full_info"] = (
-            item["full_info"].replace(" ", " ").replace("’", "'").replace("  ", " ")
-        )
+def cached(function, spider):
+    """Bounded LRU cache for project-level work, shared by all files of a project page."""
 
-        # Project
+    return functools.lru_cache(maxsize=spider.settings.getint("PROJECT_CACHE_SIZE"))(
+        function
+    )
 
-        item["project"] = item["project"].strip()
-        item["project"] = item["project"].replace(" ", " ").replace("’", "'")
-        item["project"] = item["project"].rstrip(".,")
 
-        # Reformating
-        # Name of the project (ID)
-        project_match = re.match(r"([A-Za-z0-9]+)_? *(?::|-) *(.*)", item["project"])
-        project_id, project_name = project_match.groups()
+def cache_stats(name, cached_function, spider):
+    """Saves the hits & misses of a cache in the stats."""
 
-        # Remove quotation marks
-        if project_name.startswith('"') and project_name.endswith('"'):
-            project_name = project_name.strip('"')
+    info = cached_function.cache_info()
+    calls = info.hits + info.misses
 
-        item["project"] = f"{project_name.strip()} ({project_id.strip().upper()})"
-        item["project"] = item["project"][0].upper() + item["project"][1:]
-
-        municipalities = re.search(
-            r"Commune\(s\) du projet : ?(.*)\n", item["full_info"]
+    spider.crawler.stats.set_value(f"{name}/cache_hits", info.hits)
+    spider.crawler.stats.set_value(f"{name}/cache_misses", info.misses)
+    if calls:
+        spider.crawler.stats.set_value(
+            f"{name}/cache_hit_rate", round(info.hits / calls, 3)
         )
 
-        if municipalities:
-            municipalities = municipalities.group(1).replace(" ; ", ", ").strip()
-
-            # Missing space before opening parenthesis
-            # Gap(05) -> Gap (05)
-            municipalities = re.sub(r"(\S)\(", r"\1 (", municipalities)
-            # Missing space before closing parenthesis
-            # Gap(05) -> Gap (05)
-            municipalities = re.sub(r"(\s)\)", r")", municipalities)
-
-            # Different template
-            # 05 GAP -> Gap (05)
-            municipalities = re.sub(
-                r"^(\d{2})\s*[-]?\s*(.+?)(?:\s*\(\d{2}\))?$",
-                r"\2 (\1)",
-                municipalities,
-            )
-
-            # Add department number if missing
-            if not re.search(r"\d\d\)$", municipalities):
-                municipalities += f" ({item['department_from_scraper']})"
-
-            item["project"] = item["project"] + " - " + municipalities
-
-        item["project"] = item["project"].strip()
-
-        # Title
-
-        item["title"] = item["title"].strip()
-        item["title"] = item["title"].replace("  ", " ").replace("’", "'")
-        item["title"] = item["title"].rstrip(".,")
-
-        item["title"] = item["title"].replace("  ", " ")
-
-        # Format title
-        # F093XXXXX Doc name
-        split_title = item["title"].split(" ")
 
-        if len(split_title) > 1:
-
-            if split_title[0].lower().startswith("f09"):
+class BeautifyPipeline:
+    """Beautify & harmonize project names & document titles."""
 
-                # Project id in uppercase
-                split_title[0] = split_title[0].upper()
+    def open_spider(self, spider):
+        self.beautify_project_page = cached(self._beautify_project_page, spider)
 
-                # Capitalize next word of title
-                split_title[1] = split_title[1][0].upper() + split_title[1][1:]
+    @staticmethod
+    def _beautify_project_page(
+        source_page_url, project, full_info, communes, department_from_scraper
+    ):
+        full_info = beautify_full_info(full_info)
+        project = beautify_project(project, communes, department_from_scraper)
+        return project, full_info
 
-            else:
-                split_title[0] = split_title[0][0].upper() + split_title[0][1:]
+    def process_item(self, item, spider):
 
-            item["title"] = " ".join(split_title)
+        # Same for every file of a project page
+        item["project"], item["full_info"] = self.beautify_project_page(
+            item["source_page_url"],
+            item["project"],
+            item["full_info"],
+            item.get("communes"),
+            item["department_from_scraper"],
+        )
 
-        else:
-            if item["title"].strip().lower().startswith("f09"):
-                item["title"] = item["title"].upper().strip()
-            else:
-                item["title"] = item["title"][0].upper() + item["title"][1:]
+        item["title"] = beautify_title(item["title"])
 
-        # Replace "Ap" by "Arrêté préfectoral"
-        item["title"] = re.sub(
-            r"(F0\w{8,10}(?:(?:-\d| \d))?) Ap\b",
-            r"\1 Arrêté préfectoral",
-            item["title"],
-        )
+        for field in INFO_FIELDS:
+            if item.get(field):
+                item[field] = beautify_full_info(item[field])
 
         return item
 
+    def close_spider(self, spider):
+        cache_stats("beautify", self.beautify_project_page, spider)
+
 
 class UnsupportedFiletypePipeline:
 
@@ -181,15 +148,30 @@ class UnsupportedFiletypePipeline:
 
 
 class UploadLimitPipeline:
-    """Sends the signal to close the spider once the upload limit is attained."""
+    """Sends the signal to close the spider once the upload limit is attained.
+
+    Only uploaded items count: the spider releases the upload slot of a failed
+    upload, and schedules another file instead (see DREALSpider.reserve_upload).
+    """
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls()
+        # Items that went through every pipeline, uploaded
+        crawler.signals.connect(pipeline.item_scraped, signal=signals.item_scraped)
+        return pipeline
 
     def open_spider(self, spider):
         self.number_of_docs = 0
 
-    def process_item(self, item, spider):
+    def item_scraped(self, item, spider):
         self.number_of_docs += 1
 
-        if spider.upload_limit == 0 or self.number_of_docs <= spider.upload_limit:
+        if spider.upload_limit and self.number_of_docs >= spider.upload_limit:
+            spider.upload_limit_attained = True
+
+    def process_item(self, item, spider):
+        if spider.upload_limit == 0 or self.number_of_docs < spider.upload_limit:
             return item
         else:
             spider.upload_limit_attained = True
@@ -198,9 +180,18 @@ class UploadLimitPipeline:
 
 class TagDepartmentsPipeline:
 
+    def open_spider(self, spider):
+        self.project_departments = cached(self._project_departments, spider)
+
+    @staticmethod
+    def _project_departments(source_page_url, project):
+        return tuple(departments_from_project_name(project))
+
     def process_item(self, item, spider):
 
-        item["departments"] = [item["department_from_scraper"]]
+        department_from_scraper = item["department_from_scraper"]
+
+        item["departments"] = [department_from_scraper]
         item["departments_sources"] = ["scraper"]
 
         authority_department = department_from_authority(item["authority"])
@@ -211,7 +202,10 @@ class TagDepartmentsPipeline:
 
         else:
 
-            project_departments = departments_from_project_name(item["project"])
+            # Same for every file of a project page
+            project_departments = list(
+                self.project_departments(item["source_page_url"], item["project"])
+            )
 
             if project_departments and project_departments != item["departments"]:
                 item["departments_sources"].append("regex")
@@ -222,21 +216,215 @@ class TagDepartmentsPipeline:
 
         return item
 
+    def close_spider(self, spider):
+        cache_stats("departments", self.project_departments, spider)
+
 
 class ProjectIDPipeline:
 
+    def open_spider(self, spider):
+        self.project_id = cached(project_id, spider)
+
     def process_item(self, item, spider):
 
-        project_name = item["project"]
-        source_page_url = item["source_page_url"]
-        string_to_hash = source_page_url + " " + project_name
+        item["project_id"] = self.project_id(item["source_page_url"], item["project"])
+
+        return item
 
-        hash_object = hashlib.sha256(string_to_hash.encode())
-        hex_dig = hash_object.hexdigest()
+    def close_spider(self, spider):
+        cache_stats("project_id", self.project_id, spider)
 
-        item["project_id"] = hex_dig
 
-        return item
+# Keys of document_data only set when parsed, removed by a re-sync once they no
+# longer are
+OPTIONAL_DATA_KEYS = [*INFO_FIELDS, "departments", "departments_sources"]
+
+
+def document_data(item):
+    """The data uploaded with a document (DocumentCloud's data field)."""
+
+    data = {
+        "authority": item["authority"],
+        "category": item["category"],
+        "category_local": item["category_local"],
+        "source_scraper": item["source_scraper"],
+        "source_file_url": item["source_file_url"],
+        "event_data_key": item["source_file_url"],
+        "source_page_url": item["source_page_url"],
+        "source_filename": item["source_filename"],
+        "publication_date": item["publication_date"],
+        "publication_time": item["publication_time"],
+        "publication_datetime": item["publication_datetime"],
+        "year": str(item["year"]),
+        "project_id": item["project_id"],
+    }
+
+    # Parsed from full_info
+    for field in INFO_FIELDS:
+        if item.get(field):
+            data[field] = item[field]
+
+    adapter = ItemAdapter(item)
+    if adapter.get("departments") and adapter.get("departments_sources"):
+        data["departments"] = item["departments"]
+        data["departments_sources"] = item["departments_sources"]
+
+    return data
+
+
+class ResyncPipeline:
+    """Re-syncs the metadata of uploaded documents with the current normalization.
+
+    In re-sync mode, the items of uploaded files are collected instead of being
+    uploaded. When the spider closes, they are compared with the documents on
+    DocumentCloud, and only the changed fields are sent, with bulk updates: data
+    keys no longer parsed are removed. In dry runs, the differences are only reported.
+    """
+
+    def open_spider(self, spider):
+        self.expected = {}
+        spider.resync_report = []
+
+    def process_item(self, item, spider):
+        if not spider.resync:
+            return item
+
+        self.expected[item["source_file_url"]] = {
+            "title": item["title"],
+            "description": item["project"],
+            "data": document_data(item),
+        }
+
+        raise SilentDropItem("Collected for re-sync")
+
+    def changes(self, document, expected):
+        """Fields of a document that differ from the expected ones."""
+
+        changes = {}
+
+        for field in ["title", "description"]:
+            if document.get(field) != expected[field]:
+                changes[field] = expected[field]
+
+        # DocumentCloud stores data values as lists of strings
+        current_data = document.get("data", {})
+        expected_data = {
+            key: value if isinstance(value, list) else [str(value)]
+            for key, value in expected["data"].items()
+        }
+
+        # Keys set by others are kept
+        kept_data = {
+            key: value
+            for key, value in current_data.items()
+            if key in expected_data or key not in OPTIONAL_DATA_KEYS
+        }
+        data = {**kept_data, **expected_data}
+
+        if data != current_data:
+            changes["data"] = data
+
+        return changes
+
+    def diff_lines(self, url, document, changes):
+        lines = [f"{url} (document {document['id']})"]
+
+        for field, value in changes.items():
+            if field == "data":
+                old_data = document.get("data", {})
+
+                # Removed keys too
+                for key in {**old_data, **value}:
+                    old_value, data_value = old_data.get(key), value.get(key)
+                    if old_value != data_value:
+                        lines.append(f"  data.{key}: {old_value} -> {data_value}")
+            else:
+                lines.append(f"  {field}: {document.get(field)} -> {value}")
+
+        return lines
+
+    def update(self, spider, updates):
+        """Sends the updates with bulk requests, in parallel."""
+
+        batches = [
+            updates[i : i + BULK_LIMIT] for i in range(0, len(updates), BULK_LIMIT)
+        ]
+
+        def send(batch):
+            spider.client.patch("documents/", json=batch)
+            return len(batch)
+
+        updated = 0
+        with ThreadPoolExecutor(
+            max_workers=spider.settings.getint("RESYNC_CONCURRENCY")
+        ) as executor:
+            for count in executor.map(send, batches):
+                updated += count
+
+        return updated
+
+    def close_spider(self, spider):
+        if not spider.resync:
+            return
+
+        spider.resync_report = []
+
+        for target in spider.targets:
+            if len(spider.targets) > 1:
+                spider.resync_report += [f"Target {target.name}", ""]
+
+            spider.resync_report += self.resync_target(spider, target)
+
+        # Full diff report
+        now = datetime.datetime.now()
+        filename = f"resync_report_{spider.profile.file_prefix}_{now.strftime('%Y%m%d_%H%M')}.txt"
+        with open(filename, "w+") as report_file:
+            report_file.write("\n".join(spider.resync_report))
+        with open(filename, "rb") as report_file:
+            spider.upload_file(report_file)
+
+    def resync_target(self, spider, target):
+        """Re-syncs the documents of the project of a target. Returns the report lines."""
+
+        documents = search_documents(
+            spider.client,
+            f'+project:{target.project} +data_source_scraper:"{spider.source_scraper}"',
+            per_page=spider.settings.getint("EVENT_DATA_REBUILD_PAGE_SIZE"),
+            workers=spider.settings.getint("EVENT_DATA_REBUILD_WORKERS"),
+        )
+
+        documents_by_url = {}
+        for document in documents:
+            key = first_value(document.get("data", {}).get("event_data_key"))
+            if key:
+                documents_by_url[key] = document
+
+        updates = []
+        report = []
+
+        for url, expected in self.expected.items():
+            document = documents_by_url.get(url)
+            if not document:
+                continue
+
+            changes = self.changes(document, expected)
+            if changes:
+                updates.append({"id": document["id"], **changes})
+                report.extend(self.diff_lines(url, document, changes))
+
+        spider.logger.info(
+            f"Re-sync of {target.name}: {len(updates)} of {len(self.expected)} documents changed"
+        )
+
+        if updates and not spider.dry_run:
+            updated = self.update(spider, updates)
+            spider.logger.info(f"Re-sync of {target.name}: updated {updated} documents")
+
+        return [
+            f"{len(updates)} of {len(self.expected)} documents "
+            + ("would be updated (dry run)" if spider.dry_run else "updated"),
+            "",
+        ] + report
 
 
 class UploadPipeline:
@@ -246,20 +434,38 @@ class UploadPipeline:
         documentcloud_logger = logging.getLogger("documentcloud")
         documentcloud_logger.setLevel(logging.WARNING)
 
-        if not spider.dry_run:
+        # Seconds taken by each upload, for the performance history
+        self.upload_latencies = []
+
+        # Re-sync dry runs compare with the documents uploaded to DocumentCloud, so
+        # they load (or rebuild) its event data too, without storing it
+        if not spider.dry_run or spider.resync:
             try:
                 spider.logger.info("Loading event data from DocumentCloud...")
                 spider.event_data = spider.load_event_data()
             except Exception as e:
-                raise Exception("Error loading event data").with_traceback(
-                    e.__traceback__
-                )
-                sys.exit(1)
+                spider.logger.warning(f"Error loading event data: {e}")
+                spider.event_data = None
+
+            if not isinstance(spider.event_data, dict):
+                spider.event_data = None
+
+            # Lost or corrupted event data is rebuilt from the uploaded documents
+            if spider.rebuild_event_data or not spider.event_data:
+                self.rebuild_event_data(spider)
+
+            # As well as the event data of new targets
+            for target in spider.targets[1:]:
+                if (
+                    spider.rebuild_event_data
+                    or target.documents_key not in spider.event_data
+                ):
+                    self.rebuild_target_event_data(spider, target)
         else:
             # Load from json if present
             try:
                 spider.logger.info("Loading event data from local JSON file...")
-                with open("event_data.json", "r") as file:
+                with open(spider.profile.event_data_filename, "r") as file:
                     data = json.load(file)
 
                     spider.event_data = data
@@ -274,71 +480,300 @@ class UploadPipeline:
             spider.logger.info("No event data was loaded.")
             spider.event_data = {}
 
-    def process_item(self, item, spider):
+        for target in spider.targets:
+            target.dead_letters = DeadLetterQueue(
+                spider.event_data,
+                max_attempts=spider.settings.getint("DEAD_LETTER_MAX_ATTEMPTS"),
+                backoff_hours=spider.settings.getfloat("DEAD_LETTER_BACKOFF_HOURS"),
+                key=target.dead_letters_key,
+            )
+
+        # To write the changes of this run (see event_data_delta)
+        spider.event_data_base = copy_entries(spider.event_data)
+
+        # Only runs that store event data can share the crawl with other runs
+        spider.leases = DepartmentLeases(
+            spider.event_data,
+            spider.run_id,
+            spider.target_year,
+            ttl_minutes=spider.settings.getint("DEPARTMENT_LEASE_TTL"),
+            enabled=bool(
+                spider.run_id
+                and not spider.dry_run
+                and not spider.resync
+                and not spider.diff
+            ),
+            shard_index=spider.shard_index,
+            shard_count=spider.shard_count,
+        )
+        spider.event_store = EventDataStore(
+            spider,
+            save_uploads=spider.settings.getint("EVENT_DATA_SAVE_UPLOADS"),
+            save_interval=spider.settings.getint("EVENT_DATA_SAVE_INTERVAL"),
+        )
+
+        spider.snapshot = SiteSnapshot(
+            spider.event_store.deferred,
+            spider.target_year,
+            lambda url: spider.is_own_file(url) and spider.in_shard(url),
+            max_years=spider.settings.getint("SNAPSHOT_YEARS"),
+        )
+
+        # Failed uploads are retried before crawling
+        if not spider.dry_run and not spider.resync and not spider.diff:
+            self.retry_dead_letters(spider)
+
+    def rebuild_event_data(self, spider):
+        """Rebuilds event data from the documents of the target project."""
+
+        spider.logger.info("Rebuilding event data from DocumentCloud documents...")
+
+        try:
+            event_data = rebuild_event_data(
+                spider.client,
+                spider.target_project,
+                spider.source_scraper,
+                per_page=spider.settings.getint("EVENT_DATA_REBUILD_PAGE_SIZE"),
+                workers=spider.settings.getint("EVENT_DATA_REBUILD_WORKERS"),
+            )
+        except Exception as e:
+            raise Exception("Error rebuilding event data").with_traceback(
+                e.__traceback__
+            )
+
+        spider.logger.info(f"Rebuilt event data ({len(event_data)} documents)")
+
+        # Keep the scraper's own state (dead-letter queue...)
+        for key, value in (spider.event_data or {}).items():
+            if not is_document_key(key):
+                event_data[key] = value
+
+        spider.event_data = event_data
+
+    def rebuild_target_event_data(self, spider, target):
+        """Rebuilds the event data of a target from the documents of its project."""
 
-        data = {
-            "authority": item["authority"],
-            "category": item["category"],
-            "category_local": item["category_local"],
-            "source_scraper": item["source_scraper"],
-            "source_file_url": item["source_file_url"],
-            "event_data_key": item["source_file_url"],
-            "source_page_url": item["source_page_url"],
-            "source_filename": item["source_filename"],
-            "publication_date": item["publication_date"],
-            "publication_time": item["publication_time"],
-            "publication_datetime": item["publication_datetime"],
-            "year": str(item["year"]),
-            "project_id": item["project_id"],
+        spider.logger.info(f"Rebuilding event data of target {target.name}...")
+
+        try:
+            spider.event_data[target.documents_key] = rebuild_event_data(
+                spider.client,
+                target.project,
+                spider.source_scraper,
+                per_page=spider.settings.getint("EVENT_DATA_REBUILD_PAGE_SIZE"),
+                workers=spider.settings.getint("EVENT_DATA_REBUILD_WORKERS"),
+            )
+        except Exception as e:
+            raise Exception("Error rebuilding event data").with_traceback(
+                e.__traceback__
+            )
+
+    def payload(self, spider, target, item, data):
+        """Everything needed to upload a document to a target again if the upload fails."""
+
+        return {
+            "upload": dict(
+                project=target.project,
+                title=item["title"],
+                description=item["project"],
+                publish_at=item["publication_datetime_dcformat"],
+                source=item["source"],
+                language="fra",
+                access=target.access,
+                data=data,
+            ),
+            "last_modified": item["publication_dt"].isoformat(),
+            "target_year": spider.target_year,
         }
 
+    def process_item(self, item, spider):
+
+        url = item["source_file_url"]
         adapter = ItemAdapter(item)
-        if adapter.get("departments") and adapter.get("departments_sources"):
-            data["departments"] = item["departments"]
-            data["departments_sources"] = item["departments_sources"]
+
+        targets = [
+            target
+            for target in spider.targets
+            if target.accepts(item["department_from_scraper"], adapter.get("category"))
+            and target.needs(spider.event_data, url)
+        ]
+
+        if not targets:
+            raise SilentDropItem("Uploaded to every target")
+
+        data = document_data(item)
+        payloads = [
+            (target, self.payload(spider, target, item, data)) for target in targets
+        ]
+
+        # Content of the file, if it was downloaded by the spider
+        file = spider.file_buffers.pop(url, None)
+
+        # Uploaded out of the reactor thread, event data is changed in it
+        d = threads.deferToThread(self.upload_to_targets, spider, url, payloads, file)
+        d.addCallback(self.record_uploads, spider, item, url)
+        return d
+
+    def upload_to_targets(self, spider, url, payloads, file):
+        """Uploads a file to its targets. Returns the document or the error of each upload."""
+
+        results = []
 
         try:
-            if not spider.dry_run:
-                spider.client.documents.upload(
-                    item["source_file_url"],
-                    project=spider.target_project,
-                    title=item["title"],
-                    description=item["project"],
-                    publish_at=item["publication_datetime_dcformat"],
-                    source=item["source"],
-                    language="fra",
-                    access=item["access"],
-                    data=data,
-                )
-                spider.logger.info(
-                    f"Uploaded {item['source_file_url']} to DocumentCloud"
-                )
-        except Exception as e:
-            raise Exception("Upload error").with_traceback(e.__traceback__)
-        else:  # No upload error, add to event_data
+            for target, payload in payloads:
+                try:
+                    document = self.upload_document(spider, url, payload, file)
+                except Exception as e:
+                    results.append((target, payload, None, e))
+                else:
+                    results.append((target, payload, document, None))
+        finally:
+            if file:
+                file.close()
+
+        return results
+
+    def record_uploads(self, results, spider, item, url):
+        """Records the uploads of an item in event data, and the failed ones to retry them."""
 
-            last_modified = datetime.datetime.strptime(
-                item["publication_lastmodified"], "%a, %d %b %Y %H:%M:%S %Z"
-            ).isoformat()
-            now = datetime.datetime.now().isoformat(timespec="seconds")
+        item["target_documents"] = {}
+        errors = []
 
-            spider.event_data[item["source_file_url"]] = {
-                "last_modified": last_modified,
-                "last_seen": now,
-                "target_year": spider.target_year,
-            }
+        for target, payload, document, error in results:
+            if error:
+                target.dead_letters.add(url, payload, error)
+                errors.append(error)
+                continue
 
-            # # Save event data after each upload
-            if spider.run_id and not spider.dry_run:  # only from the web interface
-                spider.store_event_data(spider.event_data)
+            if document:
+                item["target_documents"][target.name] = document.id
+
+            self.record_upload(spider, target, url, payload, document)
+
+        self.save_event_data(spider)
+
+        # Document of the first target
+        if item["target_documents"]:
+            item["document_id"] = next(iter(item["target_documents"].values()))
+
+        if len(errors) == len(results):
+            raise DropItem(
+                f"Upload error, will be retried on the next run: {errors[0]}"
+            )
+
+        for e in errors:
+            spider.logger.warning(
+                f"Upload of {url} to a target failed, will be retried on the next run: {e}"
+            )
 
         return item
 
+    def upload_document(self, spider, url, payload, file=None):
+        """Uploads a document to DocumentCloud. Returns None in dry runs."""
+
+        if spider.dry_run:
+            return None
+
+        start = time.monotonic()
+
+        if file:
+            document = upload_downloaded_file(spider.client, file, **payload["upload"])
+        else:
+            document = spider.client.documents.upload(url, **payload["upload"])
+
+        self.upload_latencies.append(time.monotonic() - start)
+
+        spider.logger.info(f"Uploaded {url} to DocumentCloud")
+
+        return document
+
+    def record_upload(self, spider, target, url, payload, document):
+        """Adds an uploaded document to the event data of its target."""
+
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+
+        entry = {
+            "last_modified": payload["last_modified"],
+            "last_seen": now,
+            "target_year": payload["target_year"],
+        }
+
+        # Removed by ProcessingStatusPipeline once the document is processed
+        if document:
+            entry["document_id"] = document.id
+
+        target.documents(spider.event_data)[url] = entry
+
+    def save_event_data(self, spider):
+        """Saves event data by batches of uploads."""
+
+        if spider.run_id and not spider.dry_run:  # only from the web interface
+            spider.event_store.changed()
+
+    def retry_dead_letters(self, spider):
+        """Uploads again the documents whose upload failed on previous runs."""
+
+        for target in spider.targets:
+            # Sharded runs retry the documents of their projects, each site its files
+            due = [
+                (url, letter)
+                for url, letter in target.dead_letters.due()
+                if spider.is_own_file(url)
+                and spider.in_shard(
+                    letter["payload"]["upload"]["data"]["source_page_url"]
+                )
+            ]
+
+            if due:
+                spider.logger.info(
+                    f"Retrying {len(due)} failed uploads to {target.name}..."
+                )
+
+            for url, letter in due:
+                try:
+                    document = self.upload_document(spider, url, letter["payload"])
+                except Exception as e:
+                    target.dead_letters.add(url, letter["payload"], e)
+                    spider.logger.warning(f"Upload of {url} failed again: {e}")
+                else:
+                    target.dead_letters.remove(url)
+                    self.record_upload(spider, target, url, letter["payload"], document)
+                    self.save_event_data(spider)
+
     def close_spider(self, spider):
         """Store event data when the spider closes."""
 
+        # Files of items dropped before the upload
+        for file in spider.file_buffers.values():
+            file.close()
+        spider.file_buffers.clear()
+
+        for kind, changes in spider.snapshot.diff().items():
+            spider.crawler.stats.set_value(f"snapshot/{kind}", len(changes))
+
+        # Diff runs only report the changes of the website
+        if spider.diff:
+            self.write_diff_report(spider)
+            return
+
+        spider.snapshot.store()
+
+        self.record_run(spider)
+
+        if not spider.dry_run and spider.run_id:
+            spider.leases.release()
+
+            # After the writes in progress
+            d = spider.event_store.save_in_thread(final=True)
+            d.addCallback(lambda _: self.event_data_stored(spider))
+            return d
+
+        self.event_data_stored(spider)
+
+    def event_data_stored(self, spider):
+        """Uploads or saves event data once stored, at the end of the run."""
+
         if not spider.dry_run and spider.run_id:
-            spider.store_event_data(spider.event_data)
             spider.logger.info(
                 f"Uploaded event data ({len(spider.event_data)} documents)"
             )
@@ -348,26 +783,275 @@ class UploadPipeline:
                 # Upload the event_data to the DocumentCloud interface
                 now = datetime.datetime.now()
                 timestamp = now.strftime("%Y%m%d_%H%M")
-                filename = f"event_data_DREAL_PACA_{timestamp}.json"
+                filename = f"event_data_{spider.profile.file_prefix}_{timestamp}.json"
 
                 with open(filename, "w+") as event_data_file:
-                    json.dump(spider.event_data, event_data_file)
+                    json.dump(spider.event_store.event_data(), event_data_file)
                     spider.upload_file(event_data_file)
                 spider.logger.info(
                     f"Uploaded event data to the Documentcloud interface."
                 )
 
-        if not spider.run_id:
-            with open("event_data.json", "w") as file:
-                json.dump(spider.event_data, file)
+        # Unless loaded from DocumentCloud by a re-sync dry run
+        if not spider.run_id and not (spider.dry_run and spider.resync):
+            with open(spider.profile.event_data_filename, "w") as file:
+                json.dump(spider.event_store.event_data(), file)
                 spider.logger.info(
-                    f"Saved file event_data.json ({len(spider.event_data)} documents)"
+                    f"Saved file {spider.profile.event_data_filename} "
+                    f"({len(spider.event_data)} documents)"
                 )
 
+        if spider.shard_count > 1:
+            self.write_delta(spider)
+
+    def record_run(self, spider):
+        """Appends the performance of the run to the history, & flags its regressions."""
+
+        settings = spider.settings
+
+        history = RunHistory(
+            spider.event_store.deferred, settings.getint("HISTORY_MAX_RUNS")
+        )
+        key = history.append(
+            run_record(
+                spider, self.upload_latencies, len(json.dumps(spider.event_data))
+            )
+        )
+
+        spider.regressions = history.regressions(
+            key,
+            settings.getint("HISTORY_BASELINE_RUNS"),
+            settings.getfloat("HISTORY_REGRESSION_THRESHOLD"),
+        )
+
+        for regression in spider.regressions:
+            spider.logger.warning(f"Performance regression: {regression}")
+
+    def write_diff_report(self, spider):
+        """Writes & uploads the changes of the website since the previous snapshot."""
+
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M")
+        filename = (
+            f"site_diff_{spider.profile.file_prefix}_{spider.target_year}_{timestamp}.txt"
+        )
+
+        with open(filename, "w+") as report_file:
+            report_file.write("\n".join(spider.snapshot.summary()))
+        with open(filename, "rb") as report_file:
+            spider.upload_file(report_file)
+
+        spider.logger.info(f"Saved the changes of the website to {filename}")
+
+    def write_delta(self, spider):
+        """Writes & uploads the changes of event data of a shard, to merge them."""
+
+        delta = event_data_delta(
+            spider.event_data_base, spider.event_store.event_data()
+        )
+
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M")
+        filename = (
+            f"event_data_delta_{spider.profile.file_prefix}_{spider.target_year}_"
+            f"{spider.shard_index}of{spider.shard_count}_{timestamp}.json"
+        )
+
+        with open(filename, "w+") as delta_file:
+            json.dump(delta, delta_file)
+            if not spider.dry_run:
+                spider.upload_file(delta_file)
+
+        spider.logger.info(f"Saved event data delta {filename} ({len(delta)} changes)")
+
+
+class ProcessingStatusPipeline:
+    """Checks that uploaded documents are successfully processed by DocumentCloud.
+
+    Documents are polled in batches while the crawl goes on, with an exponential
+    backoff while they are still being processed. Documents whose processing failed
+    are removed from event data, so they are uploaded again on the next run.
+    Documents still processing when the spider closes keep their document_id in
+    event data and are checked on the next run.
+    """
+
+    failed_statuses = ["error", "nofile"]
+    processed_statuses = ["success", "readable"]
+
+    def open_spider(self, spider):
+        self.closed = False
+        self.polling = False
+        self.next_poll = None
+
+        self.initial_delay = spider.settings.getint("PROCESSING_POLL_DELAY")
+        self.max_delay = spider.settings.getint("PROCESSING_POLL_MAX_DELAY")
+        self.delay = self.initial_delay
+
+        self.targets = {target.name: target for target in spider.targets}
+
+        # document id -> (target, source_file_url)
+        self.pending = {}
+        for target in spider.targets:
+            for url, entry in target.documents(spider.event_data).items():
+                if (
+                    is_document_key(url)
+                    and isinstance(entry, dict)
+                    and entry.get("document_id")
+                ):
+                    self.pending[entry["document_id"]] = (target, url)
+
+        spider.processing_failures = []
+
+        if self.pending:
+            spider.logger.info(
+                f"{len(self.pending)} documents from previous runs are still processing"
+            )
+
+        if not spider.dry_run:
+            self.schedule_poll(spider)
+
+    def process_item(self, item, spider):
+
+        adapter = ItemAdapter(item)
+        if adapter.get("target_documents"):
+            for name, document_id in item["target_documents"].items():
+                self.pending[document_id] = (
+                    self.targets[name],
+                    item["source_file_url"],
+                )
+
+            # New documents are checked soon, whatever the current backoff
+            if self.delay > self.initial_delay:
+                self.delay = self.initial_delay
+                self.schedule_poll(spider)
+
+        return item
+
+    def schedule_poll(self, spider):
+        from twisted.internet import reactor
+
+        if self.next_poll and self.next_poll.active():
+            self.next_poll.cancel()
+
+        self.next_poll = reactor.callLater(self.delay, self.poll, spider)
+
+    def poll(self, spider):
+        """Fetches the status of pending documents in a thread, without blocking the crawl."""
+
+        if self.closed or self.polling:
+            return
+
+        if not self.pending:
+            self.schedule_poll(spider)
+            return
+
+        self.polling = True
+
+        d = threads.deferToThread(self.fetch_statuses, list(self.pending), spider)
+        d.addCallback(self.handle_statuses, spider)
+        d.addErrback(
+            lambda failure: spider.logger.warning(
+                f"Error checking documents status: {failure.getErrorMessage()}"
+            )
+        )
+        d.addBoth(self.poll_done, spider)
+
+    def poll_done(self, _, spider):
+        self.polling = False
+
+        if not self.closed:
+            self.schedule_poll(spider)
+
+    def fetch_statuses(self, document_ids, spider):
+        """Returns the status of documents, with one list request per batch of 100."""
+
+        statuses = {}
+
+        for i in range(0, len(document_ids), 100):
+            batch = document_ids[i : i + 100]
+            response = spider.client.get(
+                "documents/",
+                params={
+                    "id__in": ",".join(str(d) for d in batch),
+                    "per_page": 100,
+                },
+            )
+            for document in response.json()["results"]:
+                statuses[document["id"]] = document["status"]
+
+        return statuses
+
+    def handle_statuses(self, statuses, spider):
+        if self.closed:
+            return
+
+        done = 0
+
+        for document_id, status in statuses.items():
+            if document_id not in self.pending:
+                continue
+
+            if status in self.processed_statuses:
+                target, url = self.pending.pop(document_id)
+                done += 1
+
+                entry = target.documents(spider.event_data).get(url)
+                if entry:
+                    entry.pop("document_id", None)
+
+                spider.crawler.stats.inc_value("processing/success")
+
+            elif status in self.failed_statuses:
+                target, url = self.pending.pop(document_id)
+                done += 1
+
+                # Uploaded again on the next run
+                target.documents(spider.event_data).pop(url, None)
+
+                spider.processing_failures.append(
+                    {"document_id": document_id, "status": status, "url": url}
+                )
+                spider.logger.warning(
+                    f"Processing of document {document_id} failed ({status}): {url}"
+                )
+                spider.crawler.stats.inc_value("processing/error")
+
+        # Exponential backoff while nothing changes
+        if done or not self.pending:
+            self.delay = self.initial_delay
+        else:
+            self.delay = min(self.delay * 2, self.max_delay)
+
+    def close_spider(self, spider):
+        """Checks pending documents one last time, before event data is stored."""
+
+        if self.next_poll and self.next_poll.active():
+            self.next_poll.cancel()
+
+        if not spider.dry_run and self.pending:
+            try:
+                statuses = self.fetch_statuses(list(self.pending), spider)
+            except Exception as e:
+                spider.logger.warning(f"Error checking documents status: {e}")
+            else:
+                self.handle_statuses(statuses, spider)
+
+        self.closed = True
+
+        if self.pending:
+            spider.logger.info(
+                f"{len(self.pending)} documents still processing, they will be checked on the next run"
+            )
+
 
 class MailPipeline:
     """Send scraping run report."""
 
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls()
+        # Sent once every pipeline is closed, so their reports are complete
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
     def open_spider(self, spider):
         self.scraped_items = []
 
@@ -377,7 +1061,7 @@ class MailPipeline:
 
         return item
 
-    def close_spider(self, spider):
+    def spider_closed(self, spider):
 
         def print_item(item, error=False):
             item_string = f"""
@@ -393,16 +1077,70 @@ class MailPipeline:
 
             return item_string
 
-        subject = f"DREAL PACA Scraper {str(spider.target_year)} (New: {len(self.scraped_items)}) [{spider.run_name}]"
+        subject = f"{spider.name} {str(spider.target_year)} (New: {len(self.scraped_items)}) [{spider.run_name}]"
 
-        start_content = f"DREAL PACA Scraper Addon Run {spider.run_id}"
+        start_content = f"{spider.name} Addon Run {spider.run_id}"
 
         scraped_items_content = (
             f"SCRAPED ITEMS ({len(self.scraped_items)})\n\n"
             + "\n\n".join([print_item(item) for item in self.scraped_items])
         )
 
-        content = "\n\n".join([start_content, scraped_items_content])
+        sections = [start_content, scraped_items_content]
+
+        sections.append("SITE CHANGES\n\n" + "\n".join(spider.snapshot.summary()))
+
+        if spider.resync:
+            sections.append("METADATA RE-SYNC\n\n" + "\n".join(spider.resync_report))
+
+        for target in spider.targets:
+            dead_letters = target.dead_letters
+            if dead_letters or dead_letters.new or dead_letters.retried:
+                title = "FAILED UPLOADS"
+                if len(spider.targets) > 1:
+                    title += f" ({target.name})"
+                sections.append(f"{title}\n\n" + "\n".join(dead_letters.summary()))
+
+        revalidation = spider.revalidation
+        if revalidation and (revalidation.modified or revalidation.errors):
+            sections.append(
+                "REPLACED FILES\n\n" + "\n".join(revalidation.summary())
+            )
+
+        leases = spider.leases
+        if leases.skipped or leases.lost:
+            sections.append(
+                "DEPARTMENTS CRAWLED BY ANOTHER RUN\n\n"
+                + "\n".join(sorted(leases.skipped | leases.lost))
+            )
+
+        if spider.draining:
+            cut = spider.crawler.stats.get_value("deadline/cut_requests", 0)
+            sections.append(
+                f"TIME LIMIT\n\nThe run was drained before its time limit "
+                f"({spider.time_limit} minutes), {cut} page requests were cut."
+            )
+
+        regressions = getattr(spider, "regressions", [])
+        if regressions:
+            sections.append(
+                "PERFORMANCE REGRESSIONS (see python -m scraper.history)\n\n"
+                + "\n".join(regressions)
+            )
+
+        processing_failures = getattr(spider, "processing_failures", [])
+        if processing_failures:
+            sections.append(
+                f"PROCESSING ERRORS ({len(processing_failures)}) - will be uploaded again on the next run\n\n"
+                + "\n".join(
+                    [
+                        f"{failure['document_id']} ({failure['status']}): {failure['url']}"
+                        for failure in processing_failures
+                    ]
+                )
+            )
+
+        content = "\n\n".join(sections)
 
         if not spider.dry_run:
             spider.send_mail(subject, content)
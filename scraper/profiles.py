@@ -0,0 +1,96 @@
+"""Site profiles: what differs between the websites of the DREAL.
+
+The websites of the DREAL share the same template, so a profile mostly holds
+the start URL & the authority of a region. The selectors default to those of
+the template and can be overridden for a website that differs.
+"""
+
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+from .departments import REGIONS
+
+
+@dataclass(frozen=True)
+class SiteProfile:
+    """A regional website of the DREAL, crawled by DREALSpider."""
+
+    # Short name, e.g. PACA (in the scraper name & the uploaded files)
+    name: str
+
+    # Key of REGIONS
+    region: str
+
+    start_url: str
+    authority: str
+    category_local: str = "Décisions suite à examen au cas par cas des projets"
+
+    # Politeness of the website, DOWNLOAD_DELAY & CONCURRENT_REQUESTS_PER_DOMAIN
+    # if not set
+    download_delay: float = None
+    concurrency: int = None
+
+    # Selectors of the pages
+    year_links: str = "#contenu div.fr-collapse div>a"
+    year_pattern: str = r"Dossiers (20\d\d)"
+    department_links: str = "#contenu a.fr-tile__link"
+    project_links: str = "#contenu .fr-card__link"
+    next_page_link: str = (
+        "#contenu .fr-pagination__list .fr-pagination__link--next[href]"
+    )
+    file_links: str = "#contenu div.fr-downloads-group a.fr-download__link"
+    project_title: str = "h1.titre-article::text"
+    project_info: str = ".texte-article"
+    project_lead: str = ".fr-text--lead"
+
+    @property
+    def source(self):
+        return urlparse(self.start_url).netloc
+
+    @property
+    def departments(self):
+        return REGIONS[self.region]
+
+    @property
+    def scraper_name(self):
+        return f"DREAL {self.name} Scraper"
+
+    @property
+    def file_prefix(self):
+        return f"DREAL_{self.name}"
+
+    @property
+    def event_data_filename(self):
+        # Event data of the runs outside DocumentCloud, one file per website
+        return f"event_data_{self.name}.json"
+
+
+PROFILES = {
+    profile.name: profile
+    for profile in [
+        SiteProfile(
+            name="PACA",
+            region="Provence-Alpes-Côte d'Azur",
+            start_url="https://www.paca.developpement-durable.gouv.fr/acces-direct-aux-avis-et-aux-decisions-suite-a-r2853.html",
+            authority="Préfecture de région Provence-Alpes-Côte d'Azur",
+        ),
+    ]
+}
+
+
+def download_slots(profiles):
+    """DOWNLOAD_SLOTS setting, with the politeness of each website."""
+
+    slots = {}
+
+    for profile in profiles:
+        slot = {}
+        if profile.download_delay is not None:
+            slot["delay"] = profile.download_delay
+        if profile.concurrency is not None:
+            slot["concurrency"] = profile.concurrency
+        if slot:
+            # Slots are keyed by host name (without the port)
+            slots[urlparse(profile.start_url).hostname] = slot
+
+    return slots
@@ -0,0 +1,222 @@
+"""Profiling of a run, enabled with the profile add-on input.
+
+The run is profiled with pyinstrument (a sampling profiler), and the lag of the
+reactor is recorded. The memory allocated by each pipeline is recorded too with
+the profile_memory input: tracemalloc slows down every allocation, so it is not
+started with the profile alone.
+"""
+
+import inspect
+import time
+import tracemalloc
+
+from pyinstrument import Profiler
+from pyinstrument.renderers import HTMLRenderer, SpeedscopeRenderer
+from scrapy import signals
+from scrapy.utils.misc import load_object
+
+
+class ReactorLag:
+    """Measures how late the reactor runs a call scheduled every interval seconds."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lags = []
+        self.expected = None
+        self.loop = None
+
+    def start(self):
+        from twisted.internet import task
+
+        self.loop = task.LoopingCall(self.tick)
+        self.loop.start(self.interval)
+
+    def tick(self):
+        now = time.monotonic()
+        if self.expected is not None:
+            self.lags.append(max(0.0, now - self.expected))
+        self.expected = now + self.interval
+
+    def stop(self):
+        if self.loop and self.loop.running:
+            self.loop.stop()
+
+    def summary(self):
+        if not self.lags:
+            return ["No reactor lag measured"]
+
+        lags = sorted(self.lags)
+
+        def percentile(p):
+            return lags[min(len(lags) - 1, int(len(lags) * p))]
+
+        return [
+            f"Measures: {len(lags)} (every {self.interval}s)",
+            f"Mean: {sum(lags) / len(lags) * 1000:.1f} ms",
+            f"p50: {percentile(0.5) * 1000:.1f} ms",
+            f"p95: {percentile(0.95) * 1000:.1f} ms",
+            f"p99: {percentile(0.99) * 1000:.1f} ms",
+            f"Max: {lags[-1] * 1000:.1f} ms",
+            f"Over 100 ms: {sum(1 for lag in lags if lag > 0.1)}",
+        ]
+
+
+def pipeline_lines(settings):
+    """Returns (name, filename, first line, last line) for each enabled pipeline."""
+
+    lines = []
+
+    for path in settings.getwithbase("ITEM_PIPELINES"):
+        pipeline = load_object(path)
+        source, first_line = inspect.getsourcelines(pipeline)
+        lines.append(
+            (
+                pipeline.__name__,
+                inspect.getsourcefile(pipeline),
+                first_line,
+                first_line + len(source) - 1,
+            )
+        )
+
+    return lines
+
+
+def sampling_interval(settings, time_limit=None):
+    """Seconds between samples, raised so a run of time_limit minutes has at most
+    PROFILE_MAX_SAMPLES samples."""
+
+    interval = settings.getfloat("PROFILE_INTERVAL")
+
+    if time_limit:
+        max_samples = settings.getint("PROFILE_MAX_SAMPLES")
+        interval = max(interval, time_limit * 60 / max_samples)
+
+    return interval
+
+
+class RunProfiler:
+    """Profiles a crawler process, from its start until the reactor stops.
+
+    The memory is traced only if memory is True.
+    """
+
+    def __init__(self, settings, time_limit=None, memory=False):
+        self.settings = settings
+        self.top = settings.getint("PROFILE_TOP")
+        self.memory = memory
+        self.memory_frames = settings.getint("PROFILE_MEMORY_FRAMES")
+        self.interval = sampling_interval(settings, time_limit)
+
+        self.profiler = Profiler(interval=self.interval)
+
+        self.lag = ReactorLag(settings.getfloat("PROFILE_LAG_INTERVAL"))
+
+        self.snapshot = None
+        self.peak_memory = None
+
+    def start(self, crawler):
+        """Starts profiling. Call after the crawl is created, so the reactor is installed."""
+
+        if self.memory:
+            crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+
+            # Frames to find the pipeline that allocated memory (PROFILE_MEMORY_FRAMES)
+            tracemalloc.start(self.memory_frames)
+
+        self.lag.start()
+        self.profiler.start()
+
+    def spider_closed(self, spider):
+        # Pipelines are closed, but their data is still referenced
+        self.snapshot = tracemalloc.take_snapshot().filter_traces(
+            [
+                # Memory of the profilers themselves
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "*/pyinstrument/*"),
+            ]
+        )
+        self.peak_memory = tracemalloc.get_traced_memory()[1]
+
+    def stop(self):
+        self.profiler.stop()
+        self.lag.stop()
+
+        if self.memory:
+            if self.snapshot is None:
+                self.spider_closed(None)
+            tracemalloc.stop()
+
+    def pipeline_allocations(self):
+        """Memory allocated by each pipeline & still used at the end of the crawl."""
+
+        pipelines = pipeline_lines(self.settings)
+        allocations = {name: [0, 0] for name, _, _, _ in pipelines}
+
+        for stat in self.snapshot.statistics("traceback"):
+            # Innermost pipeline frame
+            for frame in reversed(stat.traceback):
+                pipeline = next(
+                    (
+                        name
+                        for name, filename, first_line, last_line in pipelines
+                        if frame.filename == filename
+                        and first_line <= frame.lineno <= last_line
+                    ),
+                    None,
+                )
+                if pipeline:
+                    allocations[pipeline][0] += stat.size
+                    allocations[pipeline][1] += stat.count
+                    break
+
+        return sorted(allocations.items(), key=lambda a: a[1][0], reverse=True)
+
+    def report(self):
+        """Lines of the reactor lag & memory report."""
+
+        lines = ["REACTOR LAG", ""] + self.lag.summary()
+
+        if not self.memory:
+            return lines
+
+        lines += [
+            "",
+            "MEMORY",
+            "",
+            f"Peak traced memory: {self.peak_memory / 1024 / 1024:.1f} MiB",
+            "",
+            "By pipeline (allocated & still used at the end of the crawl, "
+            f"{self.memory_frames} frames per allocation):",
+        ]
+
+        for name, (size, count) in self.pipeline_allocations():
+            lines.append(f"  {name}: {size / 1024:.1f} KiB in {count} blocks")
+
+        lines += ["", f"Top {self.top} lines:"]
+
+        for stat in self.snapshot.statistics("lineno")[: self.top]:
+            lines.append(f"  {stat}")
+
+        return lines
+
+    def write(self, prefix):
+        """Writes the profile & the report. Returns the filenames."""
+
+        filenames = []
+
+        # Interactive HTML, and JSON for https://www.speedscope.app (flame graph)
+        for extension, renderer in [
+            ("html", HTMLRenderer()),
+            ("speedscope.json", SpeedscopeRenderer()),
+        ]:
+            filename = f"{prefix}.{extension}"
+            with open(filename, "w") as file:
+                file.write(self.profiler.output(renderer=renderer))
+            filenames.append(filename)
+
+        filename = f"{prefix}_report.txt"
+        with open(filename, "w") as file:
+            file.write("\n".join(self.report()))
+        filenames.append(filename)
+
+        return filenames
@@ -0,0 +1,118 @@
+"""Revalidation of uploaded files, which can be replaced in place on the website."""
+
+from datetime import datetime
+
+from .event_data import is_document_key
+
+
+class Revalidation:
+    """Rotating sample of uploaded files, checked with conditional requests.
+
+    Each run checks at most budget files of the target year, those checked the
+    longest ago first. Files whose Last-Modified advanced are removed from event
+    data, so the crawl fetches & uploads them again. So are the files without a
+    validator to compare (no Last-Modified in the response or in event data).
+    """
+
+    def __init__(self, event_data, target_year, budget, in_shard=None):
+        self.event_data = event_data
+        self.target_year = target_year
+        self.budget = budget
+        # Sharded runs check their own files (by file URL)
+        self.in_shard = in_shard or (lambda url: True)
+
+        # Report of this run
+        self.not_modified = []
+        self.modified = []
+        self.errors = []
+
+    def sample(self):
+        """Returns the (url, last_modified) pairs of the files to check in this run.
+
+        last_modified is None for the entries without it.
+        """
+
+        if self.budget <= 0:
+            return []
+
+        entries = [
+            (url, entry)
+            for url, entry in self.event_data.items()
+            if is_document_key(url)
+            and entry.get("target_year") == self.target_year
+            and self.in_shard(url)
+        ]
+
+        entries.sort(key=lambda e: e[1].get("last_checked") or e[1]["last_seen"])
+
+        return [
+            (
+                url,
+                datetime.fromisoformat(entry["last_modified"])
+                if entry.get("last_modified")
+                else None,
+            )
+            for url, entry in entries[: self.budget]
+        ]
+
+    def check(self, url, status, last_modified=None):
+        """Records the result of a check: status & Last-Modified of the response.
+
+        Returns True if the file must be fetched again.
+        """
+
+        entry = self.event_data.get(url)
+        if entry is None:
+            return False
+
+        now = datetime.now().isoformat(timespec="seconds")
+
+        if status != 304:
+            previous = entry.get("last_modified")
+
+            # Replaced, or nothing to tell that it was not
+            if (
+                last_modified is None
+                or previous is None
+                or last_modified > datetime.fromisoformat(previous)
+            ):
+                # Uploaded again by the crawl
+                del self.event_data[url]
+                self.modified.append((url, previous, last_modified))
+                return True
+
+        entry["last_seen"] = now
+        entry["last_checked"] = now
+        self.not_modified.append(url)
+        return False
+
+    def error(self, url, error):
+        """Records a failed check. The file is checked again after the others."""
+
+        entry = self.event_data.get(url)
+        if entry is not None:
+            entry["last_checked"] = datetime.now().isoformat(timespec="seconds")
+        self.errors.append((url, error))
+
+    def summary(self):
+        """Lines describing the revalidation, for the run email."""
+
+        lines = [
+            f"Checked: {len(self.not_modified) + len(self.modified) + len(self.errors)} (budget: {self.budget})",
+            f"Not modified: {len(self.not_modified)}",
+            f"Fetched again (replaced, or no Last-Modified): {len(self.modified)}",
+        ]
+
+        for url, previous, last_modified in self.modified:
+            last_modified = last_modified.isoformat() if last_modified else "unknown"
+            lines.append(
+                f"  {url} (last modified {previous} -> {last_modified}), "
+                "the previous version stays in DocumentCloud"
+            )
+
+        if self.errors:
+            lines.append(f"Errors: {len(self.errors)}")
+            for url, error in self.errors:
+                lines.append(f"  {url}: {error}")
+
+        return lines
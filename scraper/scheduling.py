@@ -0,0 +1,101 @@
+"""Fair scheduling of the crawl between departments."""
+
+from datetime import datetime
+
+
+class DepartmentStreams:
+    """Crawls each department as an independent stream of requests.
+
+    The n-th request of a department gets the priority -n, so Scrapy's priority
+    queue serves the n-th request of every department before the (n+1)-th request
+    of any of them (round-robin). All the streams still go through the same
+    download slot, so they share the DOWNLOAD_DELAY & AutoThrottle budget.
+    """
+
+    def __init__(self, stats=None, enabled=True):
+        self.stats = stats
+        self.enabled = enabled
+        self.streams = {}
+
+    def stream(self, dept):
+        """Returns the progress record of a department, creating it if needed."""
+
+        if dept not in self.streams:
+            self.streams[dept] = {
+                "scheduled": 0,
+                "list_pages": 0,
+                "project_pages": 0,
+                "files": 0,
+                "download_time": 0.0,
+                "first_response": None,
+                "last_response": None,
+            }
+
+        return self.streams[dept]
+
+    def priority(self, dept):
+        """Priority of the next request scheduled for a department."""
+
+        stream = self.stream(dept)
+        stream["scheduled"] += 1
+
+        if not self.enabled:
+            return 0
+
+        return -stream["scheduled"]
+
+    def record(self, dept, kind, response):
+        """Records a response received for a department ("list_pages", "project_pages" or "files")."""
+
+        stream = self.stream(dept)
+        stream[kind] += 1
+
+        now = datetime.now()
+        if stream["first_response"] is None:
+            stream["first_response"] = now
+        stream["last_response"] = now
+
+        stream["download_time"] += response.meta.get("download_latency", 0.0)
+
+        if self.stats:
+            self.stats.inc_value(f"departments/{dept}/{kind}")
+
+    def elapsed(self, dept):
+        """Wall-clock time between the first and the last response of a department, in seconds."""
+
+        stream = self.stream(dept)
+
+        if stream["first_response"] is None:
+            return 0.0
+
+        return (stream["last_response"] - stream["first_response"]).total_seconds()
+
+    def summary(self):
+        """Returns one line of progress per department."""
+
+        lines = []
+
+        for dept in sorted(self.streams):
+            stream = self.streams[dept]
+            lines.append(
+                f"{dept}: {stream['list_pages']} list pages, "
+                f"{stream['project_pages']} project pages, "
+                f"{stream['files']} files, "
+                f"{self.elapsed(dept):.0f}s elapsed "
+                f"({stream['download_time']:.0f}s downloading)"
+            )
+
+        return lines
+
+    def close(self):
+        """Saves the time spent on each department in the stats."""
+
+        if self.stats:
+            for dept, stream in self.streams.items():
+                self.stats.set_value(
+                    f"departments/{dept}/elapsed_seconds", round(self.elapsed(dept))
+                )
+                self.stats.set_value(
+                    f"departments/{dept}/download_seconds",
+                    round(stream["download_time"]),
+                )
@@ -56,15 +56,16 @@ COOKIES_ENABLED = False
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-# DOWNLOADER_MIDDLEWARES = {
-#    "scraper.middlewares.ScraperDownloaderMiddleware": 543,
-# }
+DOWNLOADER_MIDDLEWARES = {
+    "scraper.middlewares.DrainMiddleware": 50,
+    "scraper.middlewares.LeaseMiddleware": 60,
+}
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-# EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-# }
+EXTENSIONS = {
+    "scraper.extensions.DeadlineController": 500,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
@@ -76,9 +77,12 @@ ITEM_PIPELINES = {
     "scraper.pipelines.UnsupportedFiletypePipeline": 500,
     "scraper.pipelines.TagDepartmentsPipeline": 550,
     "scraper.pipelines.ProjectIDPipeline": 570,
+    "scraper.pipelines.ResyncPipeline": 590,
     "scraper.pipelines.UploadLimitPipeline": 600,
     "scraper.pipelines.UploadPipeline": 700,
     "scraper.pipelines.MailPipeline": 800,
+    # Closed before UploadPipeline stores event data (close_spider runs in reverse order)
+    "scraper.pipelines.ProcessingStatusPipeline": 850,
 }
 
 # Enable and configure the AutoThrottle extension (disabled by default)
@@ -121,5 +125,120 @@ DEPTH_STATS_VERBOSE = False
 LOG_LEVEL = "INFO"
 FEEDS = {
     #     # "data.json": {"format": "json", "encoding": "utf8", "indent": 4, "overwrite": True},
-    "data.csv": {"format": "csv", "encoding": "utf8", "overwrite": True},
+    # One directory per year, one set of files per run & website, closed every
+    # batch_item_count items
+    "exports/%(year)s/%(run)s-%(profile)s-%(batch_id)04d.jsonl.gz": {
+        "format": "jsonlines",
+        "encoding": "utf8",
+        "batch_item_count": 100,
+        "postprocessing": ["scrapy.extensions.postprocessing.GzipPlugin"],
+        # Stable schema (full_info is left out, missing fields are exported as null)
+        "item_export_kwargs": {"export_empty_fields": True},
+        "fields": [
+            "title",
+            "project",
+            "project_id",
+            "source",
+            "access",
+            "authority",
+            "category",
+            "category_local",
+            "source_scraper",
+            "source_file_url",
+            "source_filename",
+            "source_page_url",
+            "publication_date",
+            "publication_time",
+            "publication_datetime",
+            "publication_lastmodified",
+            "year",
+            "petitionnaire",
+            "rubriques",
+            "date_reception",
+            "date_completude",
+            "decision",
+            "recours",
+            "communes",
+            "department_from_scraper",
+            "departments",
+            "departments_sources",
+            "file_size",
+            "file_sha256",
+            "document_id",
+        ],
+    },
 }
+FEED_URI_PARAMS = "scraper.feeds.uri_params"
+
+# Crawl the departments as independent streams, served in round-robin
+DEPARTMENT_ROUND_ROBIN = True
+
+# Files downloaded to upload their content (upload_file_bytes) are kept in memory
+# until uploaded: larger files are uploaded by URL instead
+FILE_MAX_SIZE = 50 * 1024 * 1024
+
+# Polling of the processing status of uploaded documents (seconds)
+PROCESSING_POLL_DELAY = 60
+PROCESSING_POLL_MAX_DELAY = 900
+
+# Number of project pages whose normalization is cached by the pipelines
+PROJECT_CACHE_SIZE = 256
+
+# Minutes before the time limit when no new pages are scheduled, can be a fraction
+# (scheduled files are still downloaded & uploaded until the time limit)
+TIME_LIMIT_DRAIN = 10
+
+# Failed uploads are retried on the next runs, after 1h, 2h, 4h...
+DEAD_LETTER_MAX_ATTEMPTS = 5
+DEAD_LETTER_BACKOFF_HOURS = 1
+
+# Rebuild of event data from DocumentCloud: search page size & parallel page fetches
+EVENT_DATA_REBUILD_PAGE_SIZE = 100
+EVENT_DATA_REBUILD_WORKERS = 4
+
+# Number of parallel bulk updates when re-syncing metadata
+RESYNC_CONCURRENCY = 4
+
+# Event data is stored every this many uploads, or after this many seconds since
+# it was last stored, instead of after each upload: uploads recorded since are
+# lost, & uploaded again, if the run is killed
+EVENT_DATA_SAVE_UPLOADS = 10
+EVENT_DATA_SAVE_INTERVAL = 60
+
+# Departments are leased by a run for this many minutes, renewed each time event
+# data is stored, so overlapping runs do not crawl the same departments
+DEPARTMENT_LEASE_TTL = 60
+
+# Uploaded files checked for in-place replacements on each run (0 to disable)
+REVALIDATION_BUDGET = 20
+
+# Project pages extracted in a pool of processes, out of the reactor thread
+# (0 to extract them in the reactor thread)
+PROJECT_PAGE_PROCESSES = 0
+
+# Profiling (profile add-on input): sampling interval & reactor lag measures
+# (seconds), number of lines in the reports
+PROFILE_INTERVAL = 0.01
+PROFILE_LAG_INTERVAL = 0.1
+PROFILE_TOP = 25
+
+# Samples of a run with a time limit: the sampling interval is raised for long
+# runs, to bound the size & the overhead of the profile
+PROFILE_MAX_SAMPLES = 100000
+
+# Frames recorded by tracemalloc for each allocation (profile_memory add-on
+# input). With 1, memory is counted
+# by the lines that allocated it, and for a pipeline only if allocated in its
+# own code. More frames find the pipeline of allocations in called code, at a
+# higher cost on each allocation
+PROFILE_MEMORY_FRAMES = 1
+
+# Years of projects kept in the snapshot of the website (see snapshots.py), up to
+# the target year of the run
+SNAPSHOT_YEARS = 2
+
+# Performance history of the runs, kept in event data (see history.py): number of
+# runs kept, previous runs of the baseline & change flagged as a regression
+HISTORY_MAX_RUNS = 500
+HISTORY_BASELINE_RUNS = 10
+HISTORY_REGRESSION_THRESHOLD = 0.25
@@ -0,0 +1,16 @@
+"""Sharding of a crawl across several runs.
+
+Each run gets a shard index & a shard count, and only crawls the projects whose
+page URL hashes to its shard. Its changes to event data are written as a delta,
+merged into the canonical event data with python -m scraper.event_data.
+"""
+
+import hashlib
+
+
+def shard_of(url, shard_count):
+    """Shard of a URL, the same on every run & machine."""
+
+    digest = hashlib.sha256(url.encode()).digest()
+
+    return int.from_bytes(digest[:8], "big") % shard_count
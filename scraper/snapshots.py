@@ -0,0 +1,205 @@
+"""Snapshots of a website: the projects of each year & department, and their files.
+
+Each run records the project pages it crawls in event data, and compares them
+with the snapshot left by the previous runs: added & removed projects, added,
+removed & renamed files, and pages whose content changed. Only the projects of
+the last years are kept (SNAPSHOT_YEARS).
+"""
+
+import hashlib
+import json
+from datetime import datetime
+
+# Key of the snapshot in event data, by project page URL
+SNAPSHOT_KEY = "_snapshot"
+
+
+def page_hash(project, info, files):
+    """Short hash of the content extracted from a project page."""
+
+    content = json.dumps([project, info, files], ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+
+class SiteSnapshot:
+    """Projects of a year, as crawled by this run & by the previous ones.
+
+    A project missing from the website is only reported as removed if the list
+    of its department was crawled to its last page: a run can be cut before
+    (time limit, upload limit, department crawled by another run...).
+    """
+
+    def __init__(self, event_data, target_year, owns=None, max_years=None):
+        self.event_data = event_data
+        self.target_year = target_year
+        self.max_years = max_years
+
+        # Sharded runs & websites sharing event data compare their own projects
+        owns = owns or (lambda url: True)
+
+        self.previous = {
+            url: entry
+            for url, entry in event_data.get(SNAPSHOT_KEY, {}).items()
+            if entry.get("year") == target_year and owns(url)
+        }
+
+        # Snapshot of this run
+        self.current = {}
+        self.listed = set()
+        self.complete_departments = set()
+
+    @property
+    def projects(self):
+        # Event data can be replaced in place by a merge (see EventDataStore)
+        return self.event_data.setdefault(SNAPSHOT_KEY, {})
+
+    def list_project(self, url):
+        """Records a project link of a list page."""
+
+        self.listed.add(url)
+
+    def department_complete(self, dept):
+        """Records that the last list page of a department was crawled."""
+
+        self.complete_departments.add(dept)
+
+    def record(self, url, dept, project, info, files):
+        """Records a project page, with its (file URL, link text) pairs."""
+
+        self.current[url] = {
+            "year": self.target_year,
+            "department": dept,
+            "title": project,
+            "hash": page_hash(project, info, files),
+            "files": [list(file) for file in files],
+            "last_seen": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def removed_projects(self):
+        return [
+            url
+            for url, entry in self.previous.items()
+            if entry["department"] in self.complete_departments
+            and url not in self.listed
+            and url not in self.current
+        ]
+
+    def diff(self):
+        """Changes since the previous snapshot, as lists by kind of change."""
+
+        diff = {
+            "added_projects": [],
+            "removed_projects": [],
+            "renamed_projects": [],
+            "changed_pages": [],
+            "added_files": [],
+            "removed_files": [],
+            "renamed_files": [],
+        }
+
+        for url, entry in self.current.items():
+            previous = self.previous.get(url)
+
+            if previous is None:
+                diff["added_projects"].append((url, entry["title"], len(entry["files"])))
+                continue
+
+            if entry["hash"] == previous["hash"]:
+                continue
+
+            if entry["title"] != previous["title"]:
+                diff["renamed_projects"].append((url, previous["title"], entry["title"]))
+
+            files = dict(entry["files"])
+            previous_files = dict(previous["files"])
+
+            for file_url, text in files.items():
+                if file_url not in previous_files:
+                    diff["added_files"].append((url, file_url, text))
+                elif text != previous_files[file_url]:
+                    diff["renamed_files"].append(
+                        (url, file_url, previous_files[file_url], text)
+                    )
+
+            for file_url, text in previous_files.items():
+                if file_url not in files:
+                    diff["removed_files"].append((url, file_url, text))
+
+            if entry["title"] == previous["title"] and files == previous_files:
+                # e.g. a decision or an appeal added to the project information
+                diff["changed_pages"].append(url)
+
+        for url in self.removed_projects():
+            diff["removed_projects"].append((url, self.previous[url]["title"]))
+
+        return diff
+
+    def summary(self):
+        """Lines describing the changes of the website, for the run email & the diff report."""
+
+        if not self.previous:
+            return [f"First snapshot of the website: {len(self.current)} projects"]
+
+        diff = self.diff()
+
+        lines = [
+            f"Projects crawled: {len(self.current)} (previous snapshot: {len(self.previous)})",
+            f"Departments crawled to their last page: {len(self.complete_departments)}",
+        ]
+
+        def section(title, changes, line):
+            lines.append(f"{title}: {len(changes)}")
+            for change in changes:
+                lines.append(f"  {line(*change)}")
+
+        section(
+            "Added projects",
+            diff["added_projects"],
+            lambda url, title, files: f"{title} ({files} files): {url}",
+        )
+        section(
+            "Removed projects",
+            diff["removed_projects"],
+            lambda url, title: f"{title}: {url}",
+        )
+        section(
+            "Renamed projects",
+            diff["renamed_projects"],
+            lambda url, previous, title: f"{previous} -> {title}: {url}",
+        )
+        section("Changed pages", [(url,) for url in diff["changed_pages"]], str)
+        section(
+            "Added files",
+            diff["added_files"],
+            lambda url, file_url, text: f"{text}: {file_url}",
+        )
+        section(
+            "Removed files",
+            diff["removed_files"],
+            lambda url, file_url, text: f"{text}: {file_url}",
+        )
+        section(
+            "Renamed files",
+            diff["renamed_files"],
+            lambda url, file_url, previous, text: f"{previous} -> {text}: {file_url}",
+        )
+
+        return lines
+
+    def store(self):
+        """Writes the snapshot of this run in event data, without the old years."""
+
+        projects = self.projects
+
+        for url in self.removed_projects():
+            projects.pop(url, None)
+
+        projects.update(self.current)
+
+        if self.max_years:
+            oldest_year = int(self.target_year) - self.max_years + 1
+
+            for url in [
+                url for url, entry in projects.items() if int(entry["year"]) < oldest_year
+            ]:
+                del projects[url]
@@ -0,0 +1,603 @@
+import asyncio
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+import sys
+from datetime import datetime
+from urllib.parse import urlparse
+
+import scrapy
+from scrapy import signals
+from scrapy.exceptions import CloseSpider, DontCloseSpider
+from twisted.internet.defer import CancelledError
+from documentcloud.constants import SUPPORTED_EXTENSIONS
+
+from ..files import FileIntegrityError, downloaded_file
+from ..items import DocumentItem
+from ..parsing import extract_project_page
+from ..profiles import PROFILES
+from ..revalidation import Revalidation
+from ..scheduling import DepartmentStreams
+from ..sharding import shard_of
+from ..targets import UploadTarget
+
+
+class DREALSpider(scrapy.Spider):
+    """Scraper of a regional website of the DREAL, described by a site profile."""
+
+    name = "DREAL Scraper"
+
+    # SiteProfile, or the name of a profile of PROFILES
+    profile = None
+
+    upload_limit_attained = False
+
+    start_time = datetime.now()
+
+    # Set by DeadlineController before the time limit
+    draining = False
+
+    upload_file_bytes = False
+
+    rebuild_event_data = False
+
+    # Re-sync the metadata of uploaded documents instead of uploading new ones
+    resync = False
+
+    # Report the changes of the website (see snapshots.py), without uploading
+    diff = False
+
+    # Other projects the documents are uploaded to, as items of the targets input
+    # (see targets.py)
+    upload_targets = []
+
+    # Crawl of the projects of one shard (see sharding.py)
+    shard_index = 0
+    shard_count = 1
+
+    file_buffers = {}
+
+    # Upload slots reserved by scheduled files (see reserve_upload)
+    reserved_uploads = 0
+
+    # Requests put aside while the upload limit is committed
+    parked_requests = []
+
+    # Set in start_requests, once event data is loaded
+    revalidation = None
+
+    # Extraction of project pages out of the reactor thread (PROJECT_PAGE_PROCESSES)
+    extraction_pool = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        if isinstance(self.profile, str):
+            self.profile = PROFILES[self.profile]
+
+        self.name = self.profile.scraper_name
+
+        if not self.start_urls:
+            self.start_urls = [self.profile.start_url]
+
+        self.year_pattern = re.compile(self.profile.year_pattern)
+
+        # The target_project & access_level inputs are the first target
+        self.targets = [
+            UploadTarget(self.target_project, self.access_level, primary=True)
+        ] + [UploadTarget.from_input(target) for target in self.upload_targets]
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.department_streams = DepartmentStreams(
+            crawler.stats, enabled=crawler.settings.getbool("DEPARTMENT_ROUND_ROBIN")
+        )
+        spider.file_buffers = {}
+        spider.start_time = datetime.now()
+        spider.parked_requests = []
+
+        processes = crawler.settings.getint("PROJECT_PAGE_PROCESSES")
+        if processes:
+            spider.extraction_pool = ProcessPoolExecutor(
+                max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+            )
+
+        crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(spider.release_upload, signal=signals.item_dropped)
+        crawler.signals.connect(spider.release_upload, signal=signals.item_error)
+        crawler.signals.connect(spider.close_file_buffer, signal=signals.item_dropped)
+        crawler.signals.connect(spider.close_file_buffer, signal=signals.item_error)
+        crawler.signals.connect(spider.request_dropped, signal=signals.request_dropped)
+
+        return spider
+
+    @property
+    def source_scraper(self):
+        if not hasattr(self, "_source_scraper"):
+            self._source_scraper = sys.intern(
+                f"{self.profile.scraper_name} {self.target_year}"
+            )
+        return self._source_scraper
+
+    def is_own_file(self, url):
+        """True for the files of the website of the profile (event data is shared)."""
+
+        return urlparse(url).netloc == self.profile.source
+
+    def in_shard(self, url):
+        """True if the URL belongs to the shard of this run."""
+
+        if self.shard_count <= 1:
+            return True
+
+        return shard_of(url, self.shard_count) == self.shard_index
+
+    def check_upload_limit(self):
+        """Closes the spider if the upload limit is attained."""
+        if self.upload_limit_attained:
+            raise CloseSpider("Closed due to max documents limit.")
+
+    def upload_limit_committed(self):
+        """True if every upload slot is reserved by a scheduled file."""
+
+        return bool(self.upload_limit) and self.reserved_uploads >= self.upload_limit
+
+    def reserve_upload(self):
+        """Reserves an upload slot for a file, before scheduling it. Returns False if there is none left."""
+
+        if self.upload_limit_committed():
+            return False
+
+        self.reserved_uploads += 1
+        return True
+
+    def release_upload(self, *args, **kwargs):
+        """Releases the slot of a file that will not be uploaded (dropped item, error...)."""
+
+        if self.reserved_uploads > 0:
+            self.reserved_uploads -= 1
+
+    def close_file_buffer(self, item, *args, **kwargs):
+        """Closes the downloaded file of an item that will not be uploaded."""
+
+        file = self.file_buffers.pop(item.get("source_file_url"), None)
+
+        if file:
+            file.close()
+
+    def schedule(self, request):
+        """Returns the request to schedule, or parks it if the upload limit is committed.
+
+        Parked requests are scheduled again if slots are released (see spider_idle).
+        """
+
+        if self.upload_limit_committed():
+            self.parked_requests.append(request)
+            self.crawler.stats.inc_value("upload_limit/parked_requests")
+            return None
+
+        if request.meta.get("file_request"):
+            self.reserve_upload()
+
+        return request
+
+    def spider_idle(self):
+        """Schedules parked requests if upload slots were released."""
+
+        if not self.parked_requests or self.upload_limit_committed():
+            return
+
+        parked_requests = self.parked_requests
+        self.parked_requests = []
+
+        # Files first, as they are closer to an upload
+        parked_requests.sort(key=lambda r: not r.meta.get("file_request"))
+
+        for request in parked_requests:
+            request = self.schedule(request)
+            if request:
+                self.crawler.engine.crawl(request)
+
+        raise DontCloseSpider
+
+    def request_dropped(self, request, spider):
+        """Files filtered by the scheduler (duplicates) release their slot."""
+
+        if request.meta.get("file_request"):
+            self.release_upload()
+
+    def file_request_meta(self, method):
+        meta = {"file_request": True}
+
+        # Files kept in memory until uploaded, up to FILE_MAX_SIZE
+        if method == "GET":
+            meta["download_maxsize"] = self.settings.getint("FILE_MAX_SIZE")
+
+        return meta
+
+    def file_request_failed(self, failure):
+        request = failure.request
+
+        # Download cancelled by FILE_MAX_SIZE: the file is uploaded by URL, in
+        # its upload slot
+        if request.method == "GET" and failure.check(CancelledError):
+            self.crawler.stats.inc_value("files/too_large_to_download")
+            return request.replace(
+                method="HEAD", headers={}, meta=self.file_request_meta("HEAD")
+            )
+
+        self.release_upload()
+        self.logger.warning(
+            f"Error downloading {request.url}: {failure.getErrorMessage()}"
+        )
+
+    def start_requests(self):
+        yield from super().start_requests()
+
+        # Event data is loaded by UploadPipeline when the spider opens
+        if self.resync or self.diff:
+            return
+
+        self.revalidation = Revalidation(
+            self.event_data,
+            self.target_year,
+            self.settings.getint("REVALIDATION_BUDGET"),
+            lambda url: self.is_own_file(url) and self.in_shard(url),
+        )
+
+        for url, last_modified in self.revalidation.sample():
+            # Conditional if the last modification of the file is known
+            headers = {}
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified.strftime(
+                    "%a, %d %b %Y %H:%M:%S GMT"
+                )
+
+            yield scrapy.Request(
+                url,
+                method="HEAD",
+                headers=headers,
+                callback=self.parse_revalidation,
+                errback=self.revalidation_failed,
+                meta={"handle_httpstatus_list": [304]},
+                dont_filter=True,
+            )
+
+    def parse_revalidation(self, response):
+        """Checks whether an uploaded file was replaced on the website."""
+
+        stats = self.crawler.stats
+        last_modified = None
+
+        if response.status != 304:
+            header = response.headers.get("Last-Modified")
+            if header:
+                last_modified = datetime.strptime(
+                    header.decode("utf-8"), "%a, %d %b %Y %H:%M:%S %Z"
+                )
+
+        if self.revalidation.check(response.url, response.status, last_modified):
+            # Uploaded again to every target
+            for target in self.targets:
+                target.documents(self.event_data).pop(response.url, None)
+
+            stats.inc_value("revalidation/modified")
+            self.logger.info(f"File fetched again from the website: {response.url}")
+        else:
+            stats.inc_value("revalidation/not_modified")
+
+    def revalidation_failed(self, failure):
+        self.crawler.stats.inc_value("revalidation/errors")
+        self.revalidation.error(failure.request.url, failure.getErrorMessage())
+        self.logger.warning(
+            f"Error revalidating {failure.request.url}: {failure.getErrorMessage()}"
+        )
+
+    def parse(self, response):
+        """Parse the starting page"""
+
+        years_links = response.css(self.profile.year_links)
+
+        for link in years_links:
+
+            # Get link text and url
+            link_text = link.css("::text").get()
+            link_url = link.attrib["href"]
+
+            # Extract year
+            year_match = self.year_pattern.search(link_text)
+            year = int(year_match.group(1))
+
+            if year == self.target_year:
+
+                self.logger.info(f"Parsing year {year} ({link_url})")
+
+                yield response.follow(link_url, callback=self.parse_departments_list)
+
+    def parse_departments_list(self, response):
+        """Parse the departments selection page of a year."""
+
+        self.check_upload_limit()
+
+        dept_links = response.css(self.profile.department_links)
+
+        for link in dept_links:
+            link_text = link.css("::text").get()
+            link_url = link.attrib["href"]
+
+            # self.logger.info(f"Seen: {link_text} ({link_url})")
+
+            if link_text.split(" - ")[0] not in self.profile.departments:
+                self.logger.warning(
+                    f"{link_text} is not a department of {self.profile.region}"
+                )
+
+            # Departments crawled by an overlapping run are skipped
+            if not self.leases.acquire(link_text):
+                self.crawler.stats.inc_value("leases/skipped_departments")
+                self.logger.info(f"Skipping {link_text}, crawled by another run")
+                continue
+
+            request = self.schedule(
+                response.follow(
+                    link_url,
+                    callback=self.parse_projects_list,
+                    cb_kwargs=dict(dept=link_text, page=1),
+                    priority=self.department_streams.priority(link_text),
+                )
+            )
+            if request:
+                yield request
+
+        # Other runs see the leases once stored
+        if self.leases.held:
+            self.event_store.save_in_thread()
+
+    def parse_projects_list(self, response, dept, page):
+        """Parse projects list for a year & department."""
+
+        self.check_upload_limit()
+
+        self.logger.info(f"Scraping {dept.split(' - ')[1]}, page {page}")
+
+        if self.leases.renewal_due():
+            self.event_store.save_in_thread()
+
+        self.department_streams.record(dept, "list_pages", response)
+
+        # yield project pages
+
+        projects_links = response.css(self.profile.project_links)
+
+        for link in projects_links:
+            link_text = link.css("::text").get()
+            link_url = link.attrib["href"]
+
+            # print(f"Seen: {link_text} at {link_url}")
+            if not self.in_shard(response.urljoin(link_url)):
+                self.crawler.stats.inc_value("shards/skipped_projects")
+                continue
+
+            self.snapshot.list_project(response.urljoin(link_url))
+
+            request = self.schedule(
+                response.follow(
+                    link_url,
+                    callback=self.parse_project_page,
+                    cb_kwargs=dict(dept=dept),
+                    priority=self.department_streams.priority(dept),
+                )
+            )
+            if request:
+                yield request
+
+        # next page
+
+        next_page_link = response.css(self.profile.next_page_link)
+
+        if next_page_link:
+
+            next_page_url = next_page_link.attrib["href"]
+
+            request = self.schedule(
+                response.follow(
+                    next_page_url,
+                    callback=self.parse_projects_list,
+                    cb_kwargs=dict(dept=dept, page=page + 1),
+                    priority=self.department_streams.priority(dept),
+                )
+            )
+            if request:
+                yield request
+        else:
+            self.snapshot.department_complete(dept)
+
+    async def parse_project_page(self, response, dept):
+        """Parse the page of a project."""
+
+        self.check_upload_limit()
+
+        self.department_streams.record(dept, "project_pages", response)
+
+        project, info, info_fields, file_links = await self.extract_project_page(
+            response
+        )
+
+        # Pages without files too, so removed files are found
+        self.snapshot.record(
+            response.request.url,
+            dept,
+            project,
+            info,
+            [
+                (response.urljoin(link_url), link_text)
+                for link_text, link_url in file_links
+            ],
+        )
+
+        if self.diff:
+            return
+
+        # Process files
+
+        for link_text, link_url in file_links:
+
+            full_link_url = response.urljoin(link_url)
+
+            if self.resync:
+                # Uploaded files are normalized again, without requesting them
+                if self.uploaded_entry(full_link_url):
+                    yield self.uploaded_item(
+                        self.document_item(
+                            response, link_text, project, info, info_fields, dept
+                        ),
+                        full_link_url,
+                    )
+                continue
+
+            if self.is_new_file(full_link_url, dept):
+
+                doc_item = self.document_item(
+                    response, link_text, project, info, info_fields, dept
+                )
+
+                method = self.file_request_method(full_link_url)
+
+                request = self.schedule(
+                    response.follow(
+                        link_url,
+                        method=method,
+                        headers=(
+                            {"Accept-Encoding": "identity"}
+                            if method == "GET"
+                            else None
+                        ),
+                        callback=self.parse_document_headers,
+                        errback=self.file_request_failed,
+                        cb_kwargs=dict(doc_item=doc_item, dept=dept),
+                        meta=self.file_request_meta(method),
+                        priority=self.department_streams.priority(dept),
+                    )
+                )
+                if request:
+                    yield request
+            else:
+                self.logger.debug(f"File already scraped: {full_link_url}")
+
+    async def extract_project_page(self, response):
+        """Extracts a project page, in the process pool if there is one."""
+
+        if self.extraction_pool is None:
+            return extract_project_page(response.text, self.profile)
+
+        self.crawler.stats.inc_value("extraction/process_pool_pages")
+
+        return await asyncio.wrap_future(
+            self.extraction_pool.submit(
+                extract_project_page, response.text, self.profile
+            )
+        )
+
+    def document_item(self, response, link_text, project, info, info_fields, dept):
+        """Item of a file of a project page."""
+
+        return DocumentItem(
+            **info_fields,
+            title=link_text,
+            source_page_url=response.request.url,
+            project=project,
+            year=self.target_year,
+            authority=self.profile.authority,
+            category_local=self.profile.category_local,
+            source_scraper=self.source_scraper,
+            full_info=info,
+            source=self.profile.source,
+            access=self.access_level,
+            department_from_scraper=sys.intern(dept.split(" - ")[0]),
+        )
+
+    def uploaded_item(self, doc_item, file_url):
+        """Completes the item of an uploaded file with its event data, instead of its headers."""
+
+        doc_item["source_file_url"] = file_url
+
+        last_modified = datetime.fromisoformat(
+            self.uploaded_entry(file_url)["last_modified"]
+        )
+        doc_item["publication_lastmodified"] = last_modified.strftime(
+            "%a, %d %b %Y %H:%M:%S GMT"
+        )
+
+        return doc_item
+
+    def uploaded_entry(self, file_url):
+        """Event data entry of an uploaded file, from the first target it was uploaded to."""
+
+        for target in self.targets:
+            entry = target.documents(self.event_data).get(file_url)
+            if entry:
+                return entry
+
+        return None
+
+    def is_new_file(self, file_url, dept):
+        """False for files uploaded to every target of their department, or waiting for a retry."""
+
+        department = dept.split(" - ")[0]
+
+        return any(
+            target.needs(self.event_data, file_url)
+            for target in self.targets
+            if target.may_accept(department)
+        )
+
+    def file_request_method(self, file_url):
+        """Files are downloaded (GET) when their content is uploaded, otherwise only their headers are fetched (HEAD)."""
+
+        if self.upload_file_bytes:
+            file_extension = os.path.splitext(urlparse(file_url).path)[1].lower()
+
+            # Unsupported files are dropped by the pipelines, no need to download them
+            if file_extension in SUPPORTED_EXTENSIONS:
+                return "GET"
+
+        return "HEAD"
+
+    def parse_document_headers(self, response, doc_item, dept):
+
+        self.check_upload_limit()
+
+        self.department_streams.record(dept, "files", response)
+
+        doc_item["source_file_url"] = response.request.url
+
+        if response.request.method == "GET":
+            try:
+                file = downloaded_file(response)
+            except FileIntegrityError as e:
+                self.logger.warning(str(e))
+                self.release_upload()
+                return
+
+            self.file_buffers[doc_item["source_file_url"]] = file
+            doc_item["file_size"] = file.size
+            doc_item["file_sha256"] = file.sha256
+
+        doc_item["publication_lastmodified"] = response.headers.get(
+            "Last-Modified"
+        ).decode("utf-8")
+
+        yield doc_item
+
+    def closed(self, reason):
+        """Logs the progress & time spent on each department."""
+
+        self.department_streams.close()
+
+        if self.extraction_pool is not None:
+            self.extraction_pool.shutdown(cancel_futures=True)
+
+        for line in self.department_streams.summary():
+            self.logger.info(f"Department {line}")
@@ -0,0 +1,81 @@
+"""Upload targets: the DocumentCloud projects the documents of a run are uploaded to.
+
+The website is crawled once, and each new file is uploaded to every target that
+accepts it. Each target keeps its uploaded documents & its failed uploads in its
+own namespace of event data. The first target (the project input of the add-on)
+keeps the top level of event data, so its event data is unchanged.
+"""
+
+from .dead_letters import DEAD_LETTERS_KEY
+
+
+class UploadTarget:
+    """A project & access level, with optional filters of the uploaded documents."""
+
+    def __init__(
+        self, project, access, departments=None, categories=None, primary=False
+    ):
+        self.project = project
+        self.access = access
+
+        # Department numbers & categories accepted, all if empty
+        self.departments = set(departments or [])
+        self.categories = set(categories or [])
+
+        self.primary = primary
+
+        # Set by UploadPipeline when the spider opens
+        self.dead_letters = None
+
+    @classmethod
+    def from_input(cls, target):
+        """Target from an item of the targets input of the add-on."""
+
+        return cls(
+            target["project"],
+            target.get("access_level", "private"),
+            target.get("departments"),
+            target.get("categories"),
+        )
+
+    @property
+    def name(self):
+        return f"{self.project}-{self.access}"
+
+    @property
+    def documents_key(self):
+        return None if self.primary else f"_documents/{self.name}"
+
+    @property
+    def dead_letters_key(self):
+        return DEAD_LETTERS_KEY if self.primary else f"{DEAD_LETTERS_KEY}/{self.name}"
+
+    def documents(self, event_data):
+        """Documents uploaded to the target, by file URL."""
+
+        if self.primary:
+            return event_data
+
+        # Not kept: event data can be replaced in place by a merge (see EventDataStore)
+        return event_data.setdefault(self.documents_key, {})
+
+    def may_accept(self, department):
+        """False for the files filtered out before they are requested, by department.
+
+        Their category is only known once their item is processed (see accepts).
+        """
+
+        return not self.departments or department in self.departments
+
+    def accepts(self, department, category):
+        """False for the documents filtered out, including those without a category."""
+
+        if not self.may_accept(department):
+            return False
+
+        return not self.categories or category in self.categories
+
+    def needs(self, event_data, url):
+        """True if a file is neither uploaded to the target nor waiting for a retry."""
+
+        return url not in self.documents(event_data) and url not in self.dead_letters
@@ -0,0 +1,85 @@
+"""Throughput measures & recorded baselines of the performance tests.
+
+Throughputs are measured relative to the throughput of a reference workload
+(see reference_throughput), measured in the same run, so that the baselines in
+tests/baselines do not depend on the speed of the machine. A measure fails when
+it is below its baseline by more than TOLERANCE.
+
+Baselines are only written on request: run the tests with RECORD_BASELINES=1 to
+record them. A measure without a baseline fails.
+"""
+
+import functools
+import json
+import os
+import time
+
+import pytest
+
+BASELINES_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+TOLERANCE = float(os.environ.get("BASELINE_TOLERANCE", 0.5))
+
+REFERENCE_TEXT = " ".join(f"Commune{i} (0{i % 10})" for i in range(200))
+
+
+def throughput(function, calls, min_time=0.2):
+    """Calls per second of function, called with each args tuple of calls."""
+
+    count = 0
+    start = time.perf_counter()
+
+    while True:
+        for args in calls:
+            function(*args)
+        count += len(calls)
+
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return count / elapsed
+
+
+def reference(text):
+    """String & regex work, like the functions measured."""
+
+    words = sorted(word.strip("()").lower() for word in text.split())
+    return " ".join(word.title() for word in words if word)
+
+
+@functools.lru_cache()
+def reference_throughput():
+    """Calls per second of the reference workload, measured once per run."""
+
+    return throughput(reference, [(REFERENCE_TEXT,)], min_time=0.5)
+
+
+def check_baseline(filename, name, value):
+    """Fails if value (calls per second) regressed from its recorded baseline."""
+
+    relative = value / reference_throughput()
+
+    path = os.path.join(BASELINES_DIR, filename)
+
+    baselines = {}
+    if os.path.exists(path):
+        with open(path) as file:
+            baselines = json.load(file)
+
+    if os.environ.get("RECORD_BASELINES"):
+        baselines[name] = float(f"{relative:.3g}")
+        with open(path, "w") as file:
+            json.dump(baselines, file, indent=2, sort_keys=True)
+            file.write("\n")
+        return
+
+    if name not in baselines:
+        pytest.fail(
+            f"No baseline of {name} in {filename}, record it with RECORD_BASELINES=1"
+        )
+
+    minimum = baselines[name] * (1 - TOLERANCE)
+
+    assert relative >= minimum, (
+        f"{name}: {relative:.3g} times the reference throughput, below its baseline "
+        f"of {baselines[name]} (minimum {minimum:.3g})"
+    )
@@ -0,0 +1,117 @@
+"""Benchmark of the extraction of project pages inline & in a process pool.
+
+    python -m tests.benchmarks.extraction [--processes 2] [--pages 200]
+
+Inline, the reactor thread is blocked for the whole extraction of a page. In the
+pool (PROJECT_PAGE_PROCESSES), it only submits the page and gets the result
+back: the CPU time of its process per page is compared with the inline time,
+along with the throughput & the latency of a page sent alone to the pool.
+"""
+
+import argparse
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from scraper.parsing import extract_project_page
+from scraper.profiles import PROFILES
+
+from ..pages import load_large_page, load_pages
+
+
+def inline(pages, profile):
+    """Milliseconds per page, all in the calling thread."""
+
+    start = time.perf_counter()
+    for html in pages:
+        extract_project_page(html, profile)
+    return (time.perf_counter() - start) / len(pages) * 1000
+
+
+def pooled(pool, pages, profile):
+    """Milliseconds per page: wall time, and CPU time of the calling process.
+
+    The CPU time of the process includes the threads of the pool pickling the
+    pages, which share the GIL with the reactor thread.
+    """
+
+    start = time.perf_counter()
+    start_cpu = time.process_time()
+
+    futures = [pool.submit(extract_project_page, html, profile) for html in pages]
+    for future in futures:
+        future.result()
+
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - start_cpu
+    return wall / len(pages) * 1000, cpu / len(pages) * 1000
+
+
+def latency(pool, html, profile, repeat=20):
+    """Milliseconds from the submission of a page alone to its result."""
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        pool.submit(extract_project_page, html, profile).result()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--processes", type=int, default=2, help="Processes of the pool"
+    )
+    parser.add_argument("--pages", type=int, default=200, help="Pages of each kind")
+    args = parser.parse_args()
+
+    profile = PROFILES["PACA"]
+    typical = list(load_pages().values())
+    large = load_large_page()
+
+    corpora = {
+        f"typical pages ({len(typical)})": [
+            typical[i % len(typical)] for i in range(args.pages)
+        ],
+        f"large page ({len(large) // 1000} KB)": [large] * (args.pages // 10),
+    }
+
+    start = time.perf_counter()
+    pool = ProcessPoolExecutor(
+        max_workers=args.processes, mp_context=multiprocessing.get_context("spawn")
+    )
+    # Starts the processes & imports the parser in each of them
+    for future in [
+        pool.submit(extract_project_page, typical[0], profile)
+        for _ in range(args.processes)
+    ]:
+        future.result()
+
+    print(
+        f"Pool of {args.processes} processes started in "
+        f"{time.perf_counter() - start:.2f} s\n"
+    )
+
+    print(
+        f"{'':<24} {'inline ms':>10} {'pool ms':>8} {'pool CPU ms':>12} "
+        f"{'latency ms':>11}"
+    )
+
+    with pool:
+        for name, pages in corpora.items():
+            inline_ms = inline(pages, profile)
+            pool_ms, pool_cpu_ms = pooled(pool, pages, profile)
+            latency_ms = latency(pool, pages[0], profile)
+
+            print(
+                f"{name:<24} {inline_ms:>10.2f} {pool_ms:>8.2f} {pool_cpu_ms:>12.2f} "
+                f"{latency_ms:>11.2f}"
+            )
+
+    print(
+        "\ninline: reactor thread blocked per page; pool: wall time per page; "
+        "pool CPU: CPU time of the process of the reactor per page"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Memory of the items of a run, before & after the slotted DocumentItem.
+
+    python -m tests.benchmarks.items [--items 10000]
+
+Items are built as by the spider & the pipelines, and their memory is measured
+with tracemalloc.
+"""
+
+import argparse
+import sys
+import tracemalloc
+from datetime import datetime
+
+from scraper.items import DocumentItem
+from scraper.profiles import PROFILES
+
+from .. import previous
+
+PROFILE = PROFILES["PACA"]
+
+FULL_INFO = (
+    "\\nPétitionnaire : SAS Solaire Provence Commune(s) du projet : Gap (05)"
+    "\\nRubrique(s) concernée(s) : 30a\\nDate de réception : 12/02/2024"
+    "\\nDécision : soumis à étude d'impact"
+)
+
+
+def document_item(item_class, i):
+    """A fully populated item of a file, 10 files per project page."""
+
+    page = i // 10
+    publication_dt = datetime(2024, 4, 30, 8, 0, i % 60)
+
+    item = item_class(
+        title=f"F09324P{page:04d} Arrêté préfectoral décision {i % 10}",
+        source_page_url=f"https://{PROFILE.source}/projet-{page}.html",
+        project=f"Parc photovoltaïque (F09324P{page:04d}) - Gap (05)",
+        year=2024,
+        full_info=FULL_INFO,
+        petitionnaire="SAS Solaire Provence",
+        rubriques="30a",
+        date_reception="12/02/2024",
+        decision="soumis à étude d'impact",
+        communes="Gap (05)",
+        access="private",
+        department_from_scraper=sys.intern("05"),
+    )
+
+    if isinstance(item, DocumentItem):
+        # Constants of the profile, shared by every item
+        item["authority"] = PROFILE.authority
+        item["category_local"] = PROFILE.category_local
+        item["source"] = PROFILE.source
+        item["source_scraper"] = sys.intern(f"{PROFILE.scraper_name} 2024")
+        item["publication_dt"] = publication_dt
+    else:
+        item["authority"] = "Préfecture de région Provence-Alpes-Côte d'Azur"
+        item["category_local"] = "Décisions suite à examen au cas par cas des projets"
+        item["source"] = "www.paca.developpement-durable.gouv.fr"
+        item["source_scraper"] = f"DREAL PACA Scraper {2024}"
+        item["publication_date"] = publication_dt.strftime("%Y-%m-%d")
+        item["publication_time"] = publication_dt.strftime("%H:%M:%S UTC")
+        item["publication_datetime"] = (
+            item["publication_date"] + " " + item["publication_time"]
+        )
+        item["publication_datetime_dcformat"] = (
+            publication_dt.isoformat(timespec="microseconds") + "Z"
+        )
+
+    item["source_file_url"] = f"https://{PROFILE.source}/IMG/pdf/f09324p{i:06d}.pdf"
+    item["source_filename"] = f"f09324p{i:06d}.pdf"
+    item["publication_lastmodified"] = "Tue, 30 Apr 2024 08:00:00 GMT"
+    item["category"] = "Cas par cas"
+    item["departments"] = ["05"]
+    item["departments_sources"] = ["scraper"]
+    item["project_id"] = f"{page:064x}"
+
+    return item
+
+
+def bytes_per_item(item_class, count):
+    """Memory allocated for count items, per item."""
+
+    tracemalloc.start()
+    try:
+        items = [document_item(item_class, i) for i in range(count)]
+        size, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    del items
+    return size / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=10000, help="Items built")
+    args = parser.parse_args()
+
+    before = bytes_per_item(previous.DocumentItem, args.items)
+    after = bytes_per_item(DocumentItem, args.items)
+
+    print(f"Scrapy Item (before):         {before:>7.0f} bytes/item")
+    print(f"Slotted DocumentItem (after): {after:>7.0f} bytes/item")
+    print(f"{after / before:.0%} of the memory")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Benchmark of the parsing of project pages against the previous implementation.
+
+    python -m tests.benchmarks.parsing [--repeat 100] [--pages DIRECTORY]
+
+On the fixture corpus (see tests/pages.py), or on the project pages saved from
+a website in DIRECTORY.
+"""
+
+import argparse
+import timeit
+
+from scraper.parsing import extract_project_page, parse_full_info
+from scraper.profiles import PROFILES
+
+from .. import previous
+from ..pages import load_pages
+
+
+def previous_fields(info):
+    full_info = previous.full_info(info)
+    return full_info, previous.communes(full_info)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=100, help="Runs of each page")
+    parser.add_argument("--pages", help="Directory of saved project pages (.html)")
+    args = parser.parse_args()
+
+    profile = PROFILES["PACA"]
+    pages = load_pages(args.pages)
+
+    infos = [
+        result[1]
+        for result in map(lambda html: extract_project_page(html, profile), pages.values())
+        if result
+    ]
+
+    def per_call(function, calls):
+        seconds = min(
+            timeit.repeat(
+                lambda: [function(*args) for args in calls], number=args.repeat, repeat=3
+            )
+        )
+        return seconds / args.repeat / len(calls) * 1e6
+
+    benchmarks = [
+        (
+            f"project pages ({len(pages)})",
+            previous.extract_project_page,
+            extract_project_page,
+            [(html, profile) for html in pages.values()],
+        ),
+        (
+            f"information texts ({len(infos)})",
+            previous_fields,
+            parse_full_info,
+            [(info,) for info in infos],
+        ),
+    ]
+
+    print(f"{'':<24} {'previous µs':>12} {'current µs':>11} {'speedup':>8}")
+
+    for name, previous_function, function, calls in benchmarks:
+        before = per_call(previous_function, calls)
+        after = per_call(function, calls)
+        print(f"{name:<24} {before:>12.1f} {after:>11.1f} {before / after:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Two overlapping runs of the spider on a local website, sharing event data.
+
+Run in its own process by test_event_store.py, as the Twisted reactor can only
+be started once:
+
+    python -m tests.concurrent_runs DIRECTORY [--sharded]
+
+The runs split the departments with leases, or each crawls a shard of the
+projects of every department (--sharded). Prints the event data stored, the
+writes & the uploads of each run as JSON.
+"""
+
+import json
+import os
+import sys
+
+from .local_site import crawl_settings, local_profile, serve, spider_kwargs
+from .stand_ins import StandInClient, StandInStore
+
+
+def main():
+    directory = sys.argv[1]
+    sharded = "--sharded" in sys.argv[2:]
+    server, base_url, files = serve(directory)
+
+    os.chdir(directory)
+    settings = crawl_settings()
+
+    from scrapy import signals
+    from scrapy.crawler import CrawlerProcess
+
+    from scraper.spiders.dreal import DREALSpider
+
+    profile = local_profile(base_url)
+
+    store = StandInStore()
+    clients = {}
+    stats = {}
+
+    def spider_closed(spider):
+        stats[spider.run_id] = {
+            key: value
+            for key, value in spider.crawler.stats.get_stats().items()
+            if key.startswith(("leases/", "event_data/"))
+        }
+
+    process = CrawlerProcess(settings)
+
+    for shard_index, run_id in enumerate(["A", "B"]):
+        clients[run_id] = StandInClient()
+        crawler = process.create_crawler(DREALSpider)
+        crawler.signals.connect(spider_closed, signal=signals.spider_closed)
+        process.crawl(
+            crawler,
+            **spider_kwargs(
+                profile,
+                store,
+                run_id,
+                clients[run_id],
+                shard_index=shard_index if sharded else 0,
+                shard_count=2 if sharded else 1,
+            ),
+        )
+
+    process.start()
+    server.shutdown()
+
+    print(
+        json.dumps(
+            {
+                "files": [f"{base_url}/{path}" for path in files],
+                "event_data": store.load(),
+                "writes": store.writes,
+                "uploads": {run_id: client.uploads for run_id, client in clients.items()},
+                "stats": stats,
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Run of the spider that reaches its time limit, outside DocumentCloud.
+
+Run in its own process by test_deadline.py, as the Twisted reactor can only be
+started once:
+
+    python -m tests.deadline_run DIRECTORY UPLOAD_DELAY
+
+Pages are downloaded slowly enough for the drain to start before the end of the
+crawl, and each upload takes UPLOAD_DELAY seconds. Prints the close reason, the
+deadline stats, the pages & files that reached the downloader before & after the
+start of the drain, the uploads & the uploads in flight when the spider closed,
+as JSON.
+"""
+
+import json
+import os
+import sys
+from datetime import datetime
+
+from .local_site import crawl_settings, local_profile, serve, spider_kwargs
+from .stand_ins import StandInClient, StandInStore
+
+TIME_LIMIT = 0.1
+
+DRAIN = 0.075
+
+
+def main():
+    directory, upload_delay = sys.argv[1], float(sys.argv[2])
+    server, base_url, files = serve(directory)
+
+    os.chdir(directory)
+    settings = crawl_settings()
+    settings.set("DOWNLOAD_DELAY", 0.1)
+    settings.set("TIME_LIMIT_DRAIN", DRAIN)
+
+    from scrapy import signals
+    from scrapy.crawler import CrawlerProcess
+
+    from scraper.spiders.dreal import DREALSpider
+
+    client = StandInClient(upload_delay=upload_delay)
+    store = StandInStore()
+
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(DREALSpider)
+
+    reached = []
+    closed = {}
+
+    def request_reached_downloader(request, spider):
+        reached.append((datetime.now(), bool(request.meta.get("file_request"))))
+
+    def spider_closed(spider, reason):
+        closed["reason"] = reason
+        closed["uploads_in_flight"] = client.uploads_in_progress
+
+    crawler.signals.connect(
+        request_reached_downloader, signal=signals.request_reached_downloader
+    )
+    crawler.signals.connect(spider_closed, signal=signals.spider_closed)
+
+    process.crawl(
+        crawler,
+        **spider_kwargs(
+            local_profile(base_url), store, "A", client, time_limit=TIME_LIMIT
+        ),
+    )
+    process.start()
+    server.shutdown()
+
+    stats = crawler.stats.get_stats()
+    drain_start = stats.get("deadline/drain_start_time")
+
+    def count(after, file_request):
+        return sum(
+            1
+            for time, is_file in reached
+            if is_file == file_request and drain_start and (time > drain_start) == after
+        )
+
+    print(
+        json.dumps(
+            {
+                "files": len(files),
+                "closed": closed,
+                "drain_started": drain_start is not None,
+                "cut_requests": stats.get("deadline/cut_requests", 0),
+                "time_limit_reached": stats.get("deadline/time_limit_reached", False),
+                "pages_before_drain": count(False, False),
+                "pages_after_drain": count(True, False),
+                "files_before_drain": count(False, True),
+                "files_after_drain": count(True, True),
+                "uploads": len(client.uploads),
+                "uploaded_items": stats.get("item_scraped_count", 0),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Local website for runs of the spider: generated pages & files, served over HTTP.
+
+Used by the scripts of the tests that run spiders in their own process, as the
+Twisted reactor can only be started once.
+"""
+
+import dataclasses
+import functools
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+# Code, name & number of list pages of each department
+DEPARTMENTS = [
+    ("04", "Alpes-de-Haute-Provence", 1),
+    ("13", "Bouches-du-Rhône", 3),
+    ("83", "Var", 1),
+]
+
+PROJECTS_PER_PAGE = 2
+FILES_PER_PROJECT = 2
+
+
+def page(body):
+    return (
+        '<html><head><meta charset="utf-8"></head><body>'
+        f'<div id="contenu">{body}</div></body></html>'
+    )
+
+
+def write_site(directory):
+    """Writes the pages & files of the website. Returns the paths of the files."""
+
+    def write(path, content):
+        path = os.path.join(directory, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(content if isinstance(content, bytes) else content.encode())
+
+    files = []
+
+    write(
+        "start.html",
+        page(
+            '<div class="fr-collapse"><div><a href="/2024.html">Dossiers 2024</a></div></div>'
+        ),
+    )
+    write(
+        "2024.html",
+        page(
+            "".join(
+                f'<a class="fr-tile__link" href="/{code}_1.html">{code} - {name}</a>'
+                for code, name, pages in DEPARTMENTS
+            )
+        ),
+    )
+
+    for code, name, pages in DEPARTMENTS:
+        for number in range(1, pages + 1):
+            projects = [f"{code}_{number}_{i}" for i in range(PROJECTS_PER_PAGE)]
+
+            next_page = (
+                '<ul class="fr-pagination__list"><a class="fr-pagination__link--next" '
+                f'href="/{code}_{number + 1}.html">Suivante</a></ul>'
+                if number < pages
+                else ""
+            )
+            write(
+                f"{code}_{number}.html",
+                page(
+                    "".join(
+                        f'<a class="fr-card__link" href="/{project}.html">Projet</a>'
+                        for project in projects
+                    )
+                    + next_page
+                ),
+            )
+
+            for project in projects:
+                project_id = f"F09{project.replace('_', '')}"
+                links = ""
+
+                for i in range(FILES_PER_PROJECT):
+                    path = f"f/{project_id}{i}_ap.pdf"
+                    write(path, b"%PDF-1.4 " + path.encode() * 50)
+                    files.append(path)
+                    links += (
+                        '<div class="fr-downloads-group"><a class="fr-download__link" '
+                        f'href="/{path}">{project_id}{i} Ap décision</a></div>'
+                    )
+
+                write(
+                    f"{project}.html",
+                    page(
+                        f'<h1 class="titre-article">{project_id} : Parc ({code})</h1>'
+                        '<div class="texte-article"><p>Pétitionnaire\xa0: SARL X</p>'
+                        "<p>Commune(s) du projet\xa0: Gap(05)</p>"
+                        "<p>Décision\xa0: soumis</p></div>" + links
+                    ),
+                )
+
+    return files
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(directory):
+    """Writes & serves the website. Returns the server, its URL & the file paths."""
+
+    site = os.path.join(directory, "site")
+    files = write_site(site)
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(QuietHandler, directory=site)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server, f"http://127.0.0.1:{server.server_port}", files
+
+
+def crawl_settings():
+    """Project settings, without delays, revalidation & feed exports."""
+
+    os.environ["SCRAPY_SETTINGS_MODULE"] = "scraper.settings"
+
+    from scrapy.utils.project import get_project_settings
+
+    settings = get_project_settings()
+    settings.set("DOWNLOAD_DELAY", 0)
+    settings.set("AUTOTHROTTLE_ENABLED", False)
+    settings.set("LOG_LEVEL", "WARNING")
+    settings.set("REVALIDATION_BUDGET", 0)
+    settings.set("FEEDS", {})
+
+    return settings
+
+
+def local_profile(base_url, name="PACA"):
+    """Profile of a website, crawled from the local website."""
+
+    from scraper.profiles import PROFILES
+
+    return dataclasses.replace(PROFILES[name], start_url=f"{base_url}/start.html")
+
+
+def spider_kwargs(profile, store, run_id, client, **kwargs):
+    """Arguments of a spider, as passed by main.py."""
+
+    return {
+        "profile": profile,
+        "target_year": 2024,
+        "upload_limit": 0,
+        "time_limit": 0,
+        "client": client,
+        "target_project": "",
+        "access_level": "private",
+        "dry_run": False,
+        "run_id": run_id,
+        "run_name": run_id,
+        "send_mail": lambda subject, content: None,
+        "load_event_data": store.load,
+        "store_event_data": store.store(run_id),
+        "upload_file": lambda file: None,
+        "upload_event_data": False,
+        **kwargs,
+    }
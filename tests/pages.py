@@ -0,0 +1,53 @@
+"""Fixture corpus of project pages, from the template of the DREAL websites.
+
+The pages are written from the markup of the template (header, side menu,
+article & download groups) with the variants of the information text the
+parser handles: they are not captured from the websites, which could not be
+reached when the corpus was built. Saved pages of a website can be benchmarked
+with python -m tests.benchmarks.parsing --pages DIRECTORY.
+"""
+
+import json
+import os
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+PAGES_DIR = os.path.join(FIXTURES_DIR, "project_pages")
+
+LARGE_PAGE = os.path.join(FIXTURES_DIR, "large_project_page.html")
+
+with open(PAGES_DIR + ".json", encoding="utf-8") as file:
+    EXPECTED = json.load(file)
+
+
+def load_pages(directory=None):
+    """HTML of the project pages, by name, or of the .html files of a directory."""
+
+    if directory:
+        return load_saved_pages(directory)
+
+    pages = {}
+
+    for name in sorted(EXPECTED):
+        with open(os.path.join(PAGES_DIR, f"{name}.html"), encoding="utf-8") as file:
+            pages[name] = file.read()
+
+    return pages
+
+
+def load_saved_pages(directory):
+    pages = {}
+
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".html"):
+            with open(os.path.join(directory, filename), encoding="utf-8") as file:
+                pages[filename[: -len(".html")]] = file.read()
+
+    return pages
+
+
+def load_large_page():
+    """HTML of a project page of 450 KB, with 60 files & a long side menu."""
+
+    with open(LARGE_PAGE, encoding="utf-8") as file:
+        return file.read()
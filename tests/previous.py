@@ -0,0 +1,120 @@
+"""Previous implementations, compared with the current ones by the tests & the
+benchmarks."""
+
+import re
+
+from parsel import Selector
+from scrapy.item import Field, Item
+
+INFO_LINESTART = [
+    "Rubrique(s) concernée(s) :",
+    "Pétitionnaire :",
+    "Date de réception :",
+    "Dossier complet le :",
+    "Décision :",
+    "Dossier reçu le :",
+    "Recours gracieux du :",
+]
+
+
+def full_info(info):
+    """full_info before parse_full_info: one replace per label."""
+
+    for e in INFO_LINESTART:
+        info = info.replace(e, "\n" + e)
+
+    return info
+
+
+def communes(full_info):
+    """Municipalities of a project before parse_full_info, None if not found."""
+
+    municipalities = re.search(r"Commune\(s\) du projet : ?(.*)\n", full_info)
+
+    return municipalities.group(1) if municipalities else None
+
+
+def extract_project_page(html, profile):
+    """Project page parsing of the spider before extract_project_page."""
+
+    selector = Selector(text=html)
+
+    file_links = selector.css(profile.file_links)
+
+    if not file_links:
+        return None
+
+    project = selector.css(profile.project_title).get()
+
+    raw_info = selector.css(profile.project_info).css("*::text").extract()
+
+    info = "".join([x.lstrip() for x in raw_info if x.strip()]).strip()
+
+    if not info:
+        info = selector.css(profile.project_lead).css("*::text").extract()
+        if info:
+            info = info[0].strip()
+
+    if not info:
+        info = ""
+
+    info = full_info(info)
+
+    files = [
+        (link.css("::text").get().strip(), link.attrib["href"]) for link in file_links
+    ]
+
+    return project, info, communes(info), files
+
+
+class DocumentItem(Item):
+    """Scrapy Item before the slotted DocumentItem, with the fields of today."""
+
+    title = Field()
+    project = Field()
+    project_id = Field()
+
+    source = Field()
+    access = Field()
+
+    authority = Field()
+
+    category = Field()
+    category_local = Field()
+
+    source_scraper = Field()
+    source_file_url = Field()
+    source_filename = Field()
+    source_page_url = Field()
+
+    publication_date = Field()
+    publication_time = Field()
+    publication_datetime = Field()
+    publication_datetime_dcformat = Field()
+
+    publication_lastmodified = Field()
+
+    full_info = Field()
+
+    petitionnaire = Field()
+    rubriques = Field()
+    date_reception = Field()
+    date_completude = Field()
+    decision = Field()
+    recours = Field()
+    communes = Field()
+
+    year = Field()
+
+    headers = Field()
+
+    file_size = Field()
+    file_sha256 = Field()
+
+    document_id = Field()
+
+    target_documents = Field()
+
+    department_from_scraper = Field()
+    departments = Field()
+    departments_sources = Field()
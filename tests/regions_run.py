@@ -0,0 +1,83 @@
+"""Two regional websites crawled by the same process, outside DocumentCloud.
+
+Run in its own process by test_feeds.py, as the Twisted reactor can only be
+started once:
+
+    python -m tests.regions_run DIRECTORY
+
+The second website is a copy of the PACA profile named OTHER, as PACA is the
+only profile of the scraper. Prints the files of each website, the file URLs
+of the feed exports & of local event data, by file name, as JSON.
+"""
+
+import dataclasses
+import glob
+import gzip
+import json
+import os
+import sys
+
+from .local_site import crawl_settings, local_profile, serve, spider_kwargs
+from .stand_ins import StandInClient, StandInStore
+
+
+def main():
+    directory = sys.argv[1]
+
+    sites = {
+        name: serve(os.path.join(directory, name.lower()))
+        for name in ["PACA", "OTHER"]
+    }
+
+    os.chdir(directory)
+    settings = crawl_settings()
+
+    from scrapy.crawler import CrawlerProcess
+
+    from scraper.settings import FEEDS
+    from scraper.spiders.dreal import DREALSpider
+
+    settings.set("FEEDS", FEEDS)
+
+    process = CrawlerProcess(settings)
+
+    for name, (server, base_url, files) in sites.items():
+        profile = dataclasses.replace(local_profile(base_url), name=name)
+        process.crawl(
+            DREALSpider,
+            **spider_kwargs(profile, StandInStore(), None, StandInClient()),
+        )
+
+    process.start()
+
+    for server, base_url, files in sites.values():
+        server.shutdown()
+
+    exports = {}
+    for path in sorted(glob.glob("exports/*/*.jsonl.gz")):
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            exports[os.path.basename(path)] = [
+                json.loads(line)["source_file_url"] for line in file
+            ]
+
+    event_data = {}
+    for path in sorted(glob.glob("event_data_*.json")):
+        with open(path) as file:
+            event_data[path] = [key for key in json.load(file) if not key.startswith("_")]
+
+    print(
+        json.dumps(
+            {
+                "files": {
+                    name: [f"{base_url}/{path}" for path in files]
+                    for name, (server, base_url, files) in sites.items()
+                },
+                "exports": exports,
+                "event_data": event_data,
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
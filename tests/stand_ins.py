@@ -0,0 +1,103 @@
+"""Local stand-ins of DocumentCloud: event data store & API client."""
+
+import itertools
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+
+class StandInStore:
+    """Event data of an add-on, loaded & stored as JSON like DocumentCloud does."""
+
+    def __init__(self, event_data=None):
+        self.data = json.dumps(event_data) if event_data is not None else None
+        self.writes = []
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            return json.loads(self.data) if self.data is not None else None
+
+    def store(self, run_id):
+        """store_event_data function of a run."""
+
+        def store_event_data(event_data):
+            with self.lock:
+                self.data = json.dumps(event_data)
+                self.writes.append((run_id, event_data.get("_version")))
+
+        return store_event_data
+
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class StandInClient:
+    """Uploads documents & answers searches from a list of documents.
+
+    The first failing_uploads uploads fail, each upload takes upload_delay
+    seconds. The processing status of a document
+    is the next of its statuses (the last one stays), success if it has none.
+    """
+
+    def __init__(self, documents=None, failing_uploads=0, statuses=None, upload_delay=0):
+        self.search_documents = documents or []
+        self.searches = []
+        self.statuses = {id: list(values) for id, values in (statuses or {}).items()}
+        self.status_requests = []
+        self.uploads = []
+        self.failed_uploads = []
+        self.patches = []
+        self.failing_uploads = failing_uploads
+        self.upload_delay = upload_delay
+        self.uploads_in_progress = 0
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.documents = SimpleNamespace(upload=self.upload)
+
+    def upload(self, url, **kwargs):
+        if len(self.failed_uploads) < self.failing_uploads:
+            self.failed_uploads.append(url)
+            raise ConnectionError("Stand-in upload error")
+
+        with self.lock:
+            self.uploads_in_progress += 1
+        time.sleep(self.upload_delay)
+        with self.lock:
+            self.uploads_in_progress -= 1
+
+        self.uploads.append(url)
+        return SimpleNamespace(id=next(self.ids))
+
+    def get(self, path, params=None):
+        if path == "documents/search/":
+            self.searches.append(params)
+            page, per_page = params["page"], params["per_page"]
+            return Response(
+                {
+                    "count": len(self.search_documents),
+                    "results": self.search_documents[
+                        (page - 1) * per_page : page * per_page
+                    ],
+                }
+            )
+
+        # Processing status of the uploaded documents
+        ids = [int(id) for id in params["id__in"].split(",")]
+        self.status_requests.append(ids)
+        return Response(
+            {"results": [{"id": id, "status": self.status(id)} for id in ids]}
+        )
+
+    def status(self, id):
+        statuses = self.statuses.get(id) or ["success"]
+        return statuses.pop(0) if len(statuses) > 1 else statuses[0]
+
+    def patch(self, path, json=None):
+        self.patches.append((path, json))
@@ -0,0 +1,134 @@
+"""Failed uploads: queued in event data, retried when the next run opens."""
+
+from datetime import datetime, timedelta
+
+import pytest
+from scrapy.exceptions import DropItem
+from scrapy.utils.test import get_crawler
+
+from scraper import settings as scraper_settings
+from scraper.dead_letters import DEAD_LETTERS_KEY
+from scraper.pipelines import UploadPipeline
+from scraper.profiles import PROFILES
+from scraper.spiders.dreal import DREALSpider
+
+from .local_site import spider_kwargs
+from .stand_ins import StandInClient, StandInStore
+
+URL = "https://www.paca.developpement-durable.gouv.fr/IMG/pdf/f09324p0012_ap.pdf"
+
+PAGE = "https://www.paca.developpement-durable.gouv.fr/f09324p0012-a1.html"
+
+PAYLOAD = {
+    "upload": {
+        "project": 1,
+        "title": "Ap",
+        "access": "private",
+        "data": {"source_page_url": PAGE},
+    },
+    "last_modified": "2024-04-30T08:00:00",
+    "target_year": 2024,
+}
+
+
+def open_spider(store, client):
+    """Spider of a run, opened by UploadPipeline."""
+
+    # Project settings, with the reactor of the test process
+    settings = {
+        name: getattr(scraper_settings, name)
+        for name in dir(scraper_settings)
+        if name.isupper() and name != "TWISTED_REACTOR"
+    }
+    # Written by the last write of the test only
+    settings["EVENT_DATA_SAVE_UPLOADS"] = 1000
+    settings["EVENT_DATA_SAVE_INTERVAL"] = 3600
+
+    spider = DREALSpider.from_crawler(
+        get_crawler(DREALSpider, settings),
+        **spider_kwargs(PROFILES["PACA"], store, "A", client, target_project=1),
+    )
+
+    pipeline = UploadPipeline()
+    pipeline.open_spider(spider)
+
+    return pipeline, spider
+
+
+def letter(next_attempt):
+    return {
+        "payload": PAYLOAD,
+        "attempts": 1,
+        "error": "Stand-in upload error",
+        "last_attempt": "2024-04-30T08:00:00",
+        "next_attempt": next_attempt.isoformat(timespec="seconds"),
+    }
+
+
+def test_failed_upload_is_queued():
+    store = StandInStore({})
+    pipeline, spider = open_spider(store, StandInClient(failing_uploads=1))
+    [target] = spider.targets
+
+    results = pipeline.upload_to_targets(spider, URL, [(target, PAYLOAD)], None)
+    with pytest.raises(DropItem):
+        pipeline.record_uploads(results, spider, {}, URL)
+
+    assert URL in target.dead_letters
+    assert not target.needs(spider.event_data, URL)
+
+    spider.event_store.save(final=True)
+
+    [(url, queued)] = store.load()[DEAD_LETTERS_KEY].items()
+    assert url == URL
+    assert queued["payload"] == PAYLOAD
+    assert queued["attempts"] == 1
+    assert queued["error"] == "Stand-in upload error"
+
+
+def test_due_letter_retried_when_the_spider_opens():
+    store = StandInStore(
+        {DEAD_LETTERS_KEY: {URL: letter(datetime.now() - timedelta(hours=1))}}
+    )
+    client = StandInClient()
+
+    pipeline, spider = open_spider(store, client)
+    [target] = spider.targets
+
+    # Uploaded with its payload, before crawling
+    assert client.uploads == [URL]
+    assert URL not in target.dead_letters
+    assert target.dead_letters.retried == [URL]
+    assert spider.event_data[URL]["document_id"] == 1
+
+    spider.event_store.save(final=True)
+
+    stored = store.load()
+    assert stored[DEAD_LETTERS_KEY] == {}
+    assert stored[URL]["last_modified"] == PAYLOAD["last_modified"]
+
+
+def test_letter_waits_for_its_next_attempt():
+    store = StandInStore(
+        {DEAD_LETTERS_KEY: {URL: letter(datetime.now() + timedelta(hours=1))}}
+    )
+    client = StandInClient()
+
+    pipeline, spider = open_spider(store, client)
+
+    assert client.uploads == []
+    assert URL in spider.targets[0].dead_letters
+
+
+def test_failed_retry_stays_queued():
+    store = StandInStore(
+        {DEAD_LETTERS_KEY: {URL: letter(datetime.now() - timedelta(hours=1))}}
+    )
+    client = StandInClient(failing_uploads=1)
+
+    pipeline, spider = open_spider(store, client)
+    [target] = spider.targets
+
+    assert client.failed_uploads == [URL]
+    assert target.dead_letters.letters[URL]["attempts"] == 2
+    assert URL not in spider.event_data
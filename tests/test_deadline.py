@@ -0,0 +1,83 @@
+"""Drain & close of the spider before its time limit."""
+
+import json
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import Request
+from scrapy.utils.test import get_crawler
+
+from scraper.middlewares import DrainMiddleware
+from scraper.spiders.dreal import DREALSpider
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+URL = "https://www.paca.developpement-durable.gouv.fr/f09324p0012-a1.html"
+
+
+def spider(draining):
+    return SimpleNamespace(
+        draining=draining, crawler=get_crawler(DREALSpider, {"LOG_LEVEL": "WARNING"})
+    )
+
+
+def test_pages_dropped_while_draining():
+    dreal = spider(draining=True)
+    middleware = DrainMiddleware()
+
+    with pytest.raises(IgnoreRequest):
+        middleware.process_request(Request(URL), dreal)
+
+    # Files already scheduled are still downloaded & uploaded
+    file_request = Request(URL, meta={"file_request": True})
+    assert middleware.process_request(file_request, dreal) is None
+
+    assert dreal.crawler.stats.get_value("deadline/cut_requests") == 1
+
+
+def test_pages_downloaded_before_the_drain():
+    dreal = spider(draining=False)
+
+    assert DrainMiddleware().process_request(Request(URL), dreal) is None
+
+
+def run(directory, upload_delay):
+    result = subprocess.run(
+        [sys.executable, "-m", "tests.deadline_run", str(directory), str(upload_delay)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    assert result.returncode == 0, result.stderr
+
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize(
+    "upload_delay, reason",
+    [(0.5, "finished"), (4, "Closed due to time limit (0.1 minutes)")],
+    ids=["drained", "time-limit"],
+)
+def test_drain_before_the_time_limit(tmp_path, upload_delay, reason):
+    output = run(tmp_path, upload_delay)
+
+    assert output["drain_started"]
+    assert output["closed"]["reason"] == reason
+    assert output["time_limit_reached"] == (reason != "finished")
+
+    # No new pages once draining, so part of the website is left for the next run
+    assert output["pages_after_drain"] == 0
+    assert output["cut_requests"] > 0
+    assert output["uploads"] < output["files"]
+
+    # Files scheduled before the drain are still downloaded
+    assert output["files_after_drain"] > 0
+
+    # Uploads in flight finish before the spider closes
+    assert output["closed"]["uploads_in_flight"] == 0
+    assert output["uploads"] == output["uploaded_items"]
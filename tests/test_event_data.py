@@ -0,0 +1,107 @@
+"""Event data: rebuild from the uploaded documents, changes & merges."""
+
+from scraper.event_data import event_data_delta, merge_event_data, rebuild_event_data
+
+from .stand_ins import StandInClient
+
+SCRAPER = "DREAL PACA Scraper 2024"
+
+
+def document(id, key, created_at="2024-05-01T10:00:00.123Z", status="success", **data):
+    return {
+        "id": id,
+        "status": status,
+        "created_at": created_at,
+        "data": {
+            "source_scraper": [SCRAPER],
+            "event_data_key": [key],
+            "publication_datetime": ["2024-04-30 08:00:00 UTC"],
+            "year": ["2024"],
+            **data,
+        },
+    }
+
+
+def test_rebuild_event_data_pages():
+    documents = [document(i, f"https://example.org/f/{i}.pdf") for i in range(23)]
+    client = StandInClient(documents)
+
+    event_data = rebuild_event_data(client, 1, SCRAPER, per_page=5, workers=3)
+
+    assert len(event_data) == 23
+    assert sorted(search["page"] for search in client.searches) == [1, 2, 3, 4, 5]
+    assert client.searches[0]["q"] == f'+project:1 +data_source_scraper:"{SCRAPER}"'
+
+    assert event_data["https://example.org/f/0.pdf"] == {
+        "last_modified": "2024-04-30T08:00:00",
+        "last_seen": "2024-05-01T10:00:00",
+        "target_year": 2024,
+    }
+
+
+def test_rebuild_event_data_documents_kept():
+    client = StandInClient(
+        [
+            document(1, "https://example.org/f/1.pdf"),
+            # The search is not exact on data values
+            document(2, "https://example.org/f/2.pdf", source_scraper=["DREAL PACA Scraper"]),
+            document(3, "https://example.org/f/3.pdf", status="error"),
+            document(4, "https://example.org/f/4.pdf", status="nofile"),
+            # Uploaded again: the latest upload is kept
+            document(5, "https://example.org/f/5.pdf", created_at="2024-05-03T10:00:00Z"),
+            document(6, "https://example.org/f/5.pdf", created_at="2024-05-04T10:00:00Z"),
+            document(7, "https://example.org/f/5.pdf", created_at="2024-05-02T10:00:00Z"),
+            # Still processing: checked by ProcessingStatusPipeline
+            document(8, "https://example.org/f/8.pdf", status="pending"),
+            # Incomplete data
+            document(9, "https://example.org/f/9.pdf", year=[]),
+            document(10, None),
+        ]
+    )
+
+    event_data = rebuild_event_data(client, 1, SCRAPER)
+
+    assert sorted(event_data) == [
+        "https://example.org/f/1.pdf",
+        "https://example.org/f/5.pdf",
+        "https://example.org/f/8.pdf",
+    ]
+    assert event_data["https://example.org/f/5.pdf"]["last_seen"] == "2024-05-04T10:00:00"
+    assert event_data["https://example.org/f/8.pdf"]["document_id"] == 8
+    assert "document_id" not in event_data["https://example.org/f/1.pdf"]
+
+
+def test_rebuild_event_data_without_documents():
+    assert rebuild_event_data(StandInClient(), 1, SCRAPER) == {}
+
+
+def test_merge_deltas_of_two_runs():
+    base = {
+        "doc1": {"last_seen": "2024-05-01T10:00:00"},
+        "doc2": {"last_seen": "2024-05-01T10:00:00"},
+        "_dead_letters": {"doc9": {"last_attempt": "2024-05-01T10:00:00"}},
+    }
+
+    # Uploads doc3 & removes doc2 (its processing failed)
+    first = {
+        "doc1": base["doc1"],
+        "doc3": {"last_seen": "2024-05-02T10:00:00"},
+        "_dead_letters": base["_dead_letters"],
+    }
+
+    # Uploads doc9 again & doc4
+    second = {
+        "doc1": base["doc1"],
+        "doc2": base["doc2"],
+        "doc4": {"last_seen": "2024-05-02T10:00:00"},
+        "doc9": {"last_seen": "2024-05-02T10:00:00"},
+        "_dead_letters": {},
+    }
+
+    merged = merge_event_data(
+        base, event_data_delta(base, first), event_data_delta(base, second)
+    )
+
+    assert sorted(merged) == ["_dead_letters", "doc1", "doc3", "doc4", "doc9"]
+    assert merged["_dead_letters"] == {}
+    assert "doc2" in base
@@ -0,0 +1,317 @@
+"""Versioned writes of event data by overlapping runs, on a stand-in store."""
+
+import json
+import logging
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+from twisted.internet import defer
+
+from scraper.event_data import copy_entries, event_data_delta
+from scraper.event_store import EventDataStore
+from scraper.leases import DepartmentLeases
+
+from .local_site import FILES_PER_PROJECT
+from .stand_ins import StandInStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Stats:
+    def __init__(self):
+        self.values = {}
+
+    def inc_value(self, key, count=1):
+        self.values[key] = self.values.get(key, 0) + count
+
+
+def run(store, run_id, **kwargs):
+    """Spider of a run, as used by EventDataStore."""
+
+    event_data = store.load() or {}
+
+    spider = SimpleNamespace(
+        run_id=run_id,
+        event_data=event_data,
+        load_event_data=store.load,
+        store_event_data=store.store(run_id),
+        leases=DepartmentLeases(event_data, run_id, 2024, ttl_minutes=60),
+        crawler=SimpleNamespace(stats=Stats()),
+        logger=logging.getLogger(run_id),
+    )
+    spider.event_store = EventDataStore(spider, **kwargs)
+    return spider
+
+
+def entry(day):
+    return {"last_modified": "2024-04-30T08:00:00", "last_seen": f"2024-05-{day}T10:00:00"}
+
+
+def test_overlapping_runs_merge_their_writes():
+    store = StandInStore({"doc0": entry("01"), "_dead_letters": {"doc9": {"attempts": 1}}})
+
+    a = run(store, "A")
+    b = run(store, "B")
+
+    a.event_data["doc1"] = entry("02")
+    a.event_store.save()
+
+    b.event_data["doc2"] = entry("02")
+    del b.event_data["_dead_letters"]["doc9"]
+    b.event_store.save()
+
+    # Changed in place after the previous write
+    a.event_data["doc1"]["last_seen"] = "2024-05-03T10:00:00"
+    a.event_data["doc3"] = entry("03")
+    a.event_store.save()
+
+    stored = store.load()
+
+    assert sorted(key for key in stored if not key.startswith("_")) == [
+        "doc0",
+        "doc1",
+        "doc2",
+        "doc3",
+    ]
+    assert stored["doc1"]["last_seen"] == "2024-05-03T10:00:00"
+    assert stored["_dead_letters"] == {}
+    assert stored["_version"] == 3
+    assert a.event_store.event_data() == stored
+
+    assert a.crawler.stats.values == {"event_data/merged_writes": 1}
+    assert b.crawler.stats.values == {"event_data/merged_writes": 1}
+
+
+def test_single_run_does_not_merge():
+    store = StandInStore({})
+    a = run(store, "A")
+
+    for i in range(3):
+        a.event_data[f"doc{i}"] = entry("01")
+        a.event_store.save()
+
+    assert store.load()["_version"] == 3
+    assert a.crawler.stats.values == {}
+
+
+def project(day):
+    return {"year": 2024, "title": "Parc", "last_seen": f"2024-05-{day}T10:00:00"}
+
+
+def test_snapshot_stored_by_the_last_write():
+    store = StandInStore({"doc0": entry("01"), "_snapshot": {"p0": project("01")}})
+    a = run(store, "A")
+
+    a.event_data["doc1"] = entry("02")
+    a.event_store.save()
+
+    # Stored as loaded until the last write
+    assert store.load()["_snapshot"] == {"p0": project("01")}
+
+    a.event_store.deferred["_snapshot"]["pA"] = project("02")
+    a.event_data["doc2"] = entry("02")
+    a.event_store.save()
+
+    assert store.load()["_snapshot"] == {"p0": project("01")}
+
+    a.event_store.save(final=True)
+
+    assert sorted(store.load()["_snapshot"]) == ["p0", "pA"]
+    assert "_snapshot" not in a.event_data
+
+
+def test_snapshot_of_another_run():
+    store = StandInStore({"_snapshot": {"p0": project("01")}})
+    a = run(store, "A")
+    b = run(store, "B")
+
+    b.event_store.deferred["_snapshot"]["pB"] = project("02")
+    b.event_store.save(final=True)
+
+    # Taken by the next write of the other run, then stored by its last write
+    a.event_data["doc1"] = entry("02")
+    a.event_store.save()
+    assert sorted(store.load()["_snapshot"]) == ["p0", "pB"]
+
+    a.event_store.deferred["_snapshot"]["pA"] = project("03")
+    a.event_store.save(final=True)
+
+    assert sorted(store.load()["_snapshot"]) == ["p0", "pA", "pB"]
+
+
+def test_snapshot_of_the_run_kept_by_a_merge():
+    store = StandInStore({"_snapshot": {"p0": project("01")}})
+    a = run(store, "A")
+    b = run(store, "B")
+
+    # Recorded by A before a write merging the last write of B
+    a.event_store.deferred["_snapshot"]["pA"] = project("03")
+
+    b.event_store.deferred["_snapshot"]["pB"] = project("02")
+    b.event_store.save(final=True)
+
+    a.event_store.save()
+    assert sorted(store.load()["_snapshot"]) == ["p0", "pB"]
+
+    a.event_store.save(final=True)
+    assert sorted(store.load()["_snapshot"]) == ["p0", "pA", "pB"]
+
+
+def test_history_of_overlapping_runs():
+    store = StandInStore({"_history": {"run0": {"scraper": "PACA"}}})
+    a = run(store, "A")
+    b = run(store, "B")
+
+    a.event_data["doc1"] = entry("02")
+    a.event_store.save()
+    assert store.load()["_history"] == {"run0": {"scraper": "PACA"}}
+
+    b.event_store.deferred["_history"]["runB"] = {"scraper": "PACA"}
+    b.event_store.save(final=True)
+
+    a.event_store.deferred["_history"]["runA"] = {"scraper": "PACA"}
+    a.event_store.save(final=True)
+
+    assert sorted(store.load()["_history"]) == ["run0", "runA", "runB"]
+
+
+def test_killed_run_keeps_the_history_and_snapshot():
+    store = StandInStore(
+        {
+            "_history": {"run0": {"scraper": "PACA"}},
+            "_snapshot": {"p0": project("01")},
+        }
+    )
+    a = run(store, "A")
+
+    # Killed after its uploads, before its last write
+    for i in range(3):
+        a.event_data[f"doc{i}"] = entry("02")
+        a.event_store.save()
+
+    stored = store.load()
+
+    assert stored["_history"] == {"run0": {"scraper": "PACA"}}
+    assert stored["_snapshot"] == {"p0": project("01")}
+
+    # And the next run still finds them
+    b = run(store, "B")
+    assert b.event_store.deferred["_history"] == {"run0": {"scraper": "PACA"}}
+
+
+def test_uploads_stored_by_batches():
+    a = run(StandInStore(), "A", save_uploads=3, save_interval=3600)
+
+    writes = []
+    a.event_store.write = lambda final: defer.succeed(writes.append(final))
+
+    for i in range(7):
+        a.event_store.changed()
+
+    assert writes == [False, False]
+    assert a.event_store.changes == 1
+
+
+def test_batch_stored_after_the_interval():
+    a = run(StandInStore(), "A", save_uploads=3, save_interval=60)
+
+    writes = []
+    a.event_store.write = lambda final: defer.succeed(writes.append(final))
+
+    a.event_store.changed()
+    assert writes == []
+
+    a.event_store.last_save -= 60
+    a.event_store.changed()
+    assert writes == [False]
+
+
+def test_failed_write_stored_by_the_next():
+    store = StandInStore({"doc0": entry("01")})
+    a = run(store, "A")
+    b = run(store, "B")
+
+    b.event_data["doc2"] = entry("02")
+    b.event_store.save()
+
+    store_event_data = a.store_event_data
+
+    def failing_store(event_data):
+        raise ConnectionError("Stand-in store error")
+
+    a.store_event_data = failing_store
+    a.event_data["doc1"] = entry("02")
+    with pytest.raises(ConnectionError):
+        a.event_store.save()
+
+    # Still merged with the write of B, as not stored
+    a.store_event_data = store_event_data
+    a.event_store.save()
+
+    assert sorted(key for key in store.load() if not key.startswith("_")) == [
+        "doc0",
+        "doc1",
+        "doc2",
+    ]
+
+
+def test_copy_entries_keeps_changes_in_place():
+    event_data = {
+        "doc1": entry("01"),
+        "_leases": {"2024/13": {"renewed": "2024-05-01T10:00:00"}},
+        "_version": 1,
+    }
+    base = copy_entries(event_data)
+
+    event_data["doc1"]["last_seen"] = "2024-05-02T10:00:00"
+    event_data["_leases"]["2024/13"]["renewed"] = "2024-05-02T10:00:00"
+
+    delta = event_data_delta(base, event_data)
+
+    assert delta["doc1"]["last_seen"] == "2024-05-02T10:00:00"
+    assert delta["_leases"] == {"2024/13": {"renewed": "2024-05-02T10:00:00"}}
+
+
+@pytest.mark.parametrize("sharded", [False, True], ids=["leases", "shards"])
+def test_concurrent_spiders(tmp_path, sharded):
+    command = [sys.executable, "-m", "tests.concurrent_runs", str(tmp_path)]
+    if sharded:
+        command.append("--sharded")
+
+    result = subprocess.run(
+        command, cwd=ROOT, capture_output=True, text=True, timeout=300
+    )
+    assert result.returncode == 0, result.stderr
+
+    output = json.loads(result.stdout.splitlines()[-1])
+    event_data = output["event_data"]
+    uploads = output["uploads"]
+
+    # Every file uploaded once, and recorded in event data
+    assert sorted(uploads["A"] + uploads["B"]) == sorted(output["files"])
+    assert sorted(key for key in event_data if not key.startswith("_")) == sorted(
+        output["files"]
+    )
+
+    # No write lost: each one stored the next version
+    versions = [version for run_id, version in output["writes"]]
+    assert versions == list(range(1, len(versions) + 1))
+
+    # Stored by batches of uploads, not after each one
+    assert len(versions) < len(output["files"])
+
+    # Both runs wrote event data, merging the writes of the other one
+    assert {run_id for run_id, version in output["writes"]} == {"A", "B"}
+    assert all(
+        output["stats"][run_id].get("event_data/merged_writes") for run_id in ["A", "B"]
+    )
+
+    if sharded:
+        assert uploads["A"] and uploads["B"]
+
+    # Stored by the last write of each run
+    assert len(event_data["_history"]) == 2
+    assert len(event_data["_snapshot"]) == len(output["files"]) // FILES_PER_PROJECT
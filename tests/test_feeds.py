@@ -0,0 +1,79 @@
+"""File names of the feed exports & of local event data, by website."""
+
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+from scraper.feeds import uri_params
+from scraper.profiles import PROFILES, SiteProfile
+from scraper.settings import FEEDS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PACA = PROFILES["PACA"]
+
+OTHER = SiteProfile(
+    name="OTHER",
+    region=PACA.region,
+    start_url="https://www.other.developpement-durable.gouv.fr/decisions.html",
+    authority="Préfecture",
+)
+
+
+def spider(profile, run_id="42"):
+    return SimpleNamespace(
+        profile=profile,
+        run_id=run_id,
+        target_year=2024,
+        start_time=datetime(2024, 4, 30, 8, 0, 0),
+    )
+
+
+def feed_uri(spider):
+    [uri] = FEEDS
+    return uri % uri_params({"batch_id": 1}, spider)
+
+
+def test_feed_uri():
+    assert feed_uri(spider(PACA)) == (
+        "exports/2024/20240430_080000_42-PACA-0001.jsonl.gz"
+    )
+    assert feed_uri(spider(PACA, run_id=None)) == (
+        "exports/2024/20240430_080000-PACA-0001.jsonl.gz"
+    )
+
+
+def test_websites_of_a_run_export_to_different_files():
+    assert feed_uri(spider(PACA)) != feed_uri(spider(OTHER))
+
+
+def test_event_data_filename():
+    assert PACA.event_data_filename == "event_data_PACA.json"
+    assert OTHER.event_data_filename != PACA.event_data_filename
+
+
+def test_crawls_of_two_websites(tmp_path):
+    result = subprocess.run(
+        [sys.executable, "-m", "tests.regions_run", str(tmp_path)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    assert result.returncode == 0, result.stderr
+
+    output = json.loads(result.stdout.splitlines()[-1])
+    files = output["files"]
+
+    # Each website in its own exports & local event data, with all its files
+    for name in ["PACA", "OTHER"]:
+        [exports] = [urls for path, urls in output["exports"].items() if name in path]
+        assert sorted(exports) == sorted(files[name])
+
+        event_data = output["event_data"][f"event_data_{name}.json"]
+        assert sorted(event_data) == sorted(files[name])
+
+    assert len(output["exports"]) == 2
@@ -0,0 +1,123 @@
+"""Downloaded files: checks, upload & release of the files that are not uploaded."""
+
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+from scrapy import signals
+from scrapy.exceptions import DropItem
+from scrapy.http import Request, Response
+from scrapy.utils.test import get_crawler
+from twisted.internet.defer import CancelledError
+from twisted.python.failure import Failure
+
+from scraper.files import FileIntegrityError, downloaded_file, upload_downloaded_file
+from scraper.spiders.dreal import DREALSpider
+
+URL = "https://www.paca.developpement-durable.gouv.fr/IMG/pdf/f09324p0012_ap.pdf"
+
+BODY = b"%PDF-1.4 " + b"0" * 1000
+
+
+def response(body=BODY, content_length=None):
+    headers = {"Content-Length": str(content_length)} if content_length else {}
+    return Response(URL, body=body, headers=headers, request=Request(URL))
+
+
+def spider():
+    crawler = get_crawler(DREALSpider, {"FILE_MAX_SIZE": 100000})
+    return DREALSpider.from_crawler(
+        crawler, profile="PACA", target_project=1, access_level="private"
+    )
+
+
+def test_downloaded_file():
+    file = downloaded_file(response(content_length=len(BODY)))
+
+    assert file.name == "f09324p0012_ap.pdf"
+    assert file.size == len(BODY)
+    assert file.sha256 == hashlib.sha256(BODY).hexdigest()
+    assert file.read() == BODY
+
+
+def test_incomplete_download():
+    with pytest.raises(FileIntegrityError):
+        downloaded_file(response(content_length=len(BODY) + 1))
+
+
+def test_upload_to_each_target():
+    uploads = []
+
+    def upload(file, **kwargs):
+        uploads.append((file.read(), kwargs))
+
+    client = SimpleNamespace(documents=SimpleNamespace(upload=upload))
+    file = downloaded_file(response())
+
+    upload_downloaded_file(client, file, project=1, title="Ap")
+    upload_downloaded_file(client, file, project=2, title="Ap")
+
+    # The whole content each time
+    assert uploads == [
+        (BODY, {"original_extension": "pdf", "project": 1, "title": "Ap"}),
+        (BODY, {"original_extension": "pdf", "project": 2, "title": "Ap"}),
+    ]
+
+
+def test_file_requests_have_a_max_size():
+    assert spider().file_request_meta("GET") == {
+        "file_request": True,
+        "download_maxsize": 100000,
+    }
+    assert spider().file_request_meta("HEAD") == {"file_request": True}
+
+
+def test_too_large_file_is_uploaded_by_url():
+    dreal = spider()
+    dreal.reserved_uploads = 1
+
+    request = Request(
+        URL,
+        method="GET",
+        headers={"Accept-Encoding": "identity"},
+        meta=dreal.file_request_meta("GET"),
+    )
+    failure = Failure(CancelledError("Cancelling download: larger than max size"))
+    failure.request = request
+
+    head_request = dreal.file_request_failed(failure)
+
+    assert head_request.method == "HEAD"
+    assert head_request.meta == {"file_request": True}
+    assert dreal.reserved_uploads == 1
+
+
+def test_failed_download_releases_its_slot():
+    dreal = spider()
+    dreal.reserved_uploads = 1
+
+    failure = Failure(ConnectionRefusedError())
+    failure.request = Request(URL, meta=dreal.file_request_meta("GET"))
+
+    assert dreal.file_request_failed(failure) is None
+    assert dreal.reserved_uploads == 0
+
+
+@pytest.mark.parametrize("signal", [signals.item_dropped, signals.item_error])
+def test_file_of_dropped_item_is_closed(signal):
+    dreal = spider()
+
+    file = downloaded_file(response())
+    dreal.file_buffers[URL] = file
+
+    dreal.crawler.signals.send_catch_log(
+        signal,
+        item={"source_file_url": URL},
+        response=None,
+        exception=DropItem("Unsupported filetype"),
+        failure=None,
+        spider=dreal,
+    )
+
+    assert file.closed
+    assert dreal.file_buffers == {}
@@ -0,0 +1,60 @@
+"""Performance history of the runs & regressions."""
+
+from scraper.history import RunHistory, regressions
+
+
+def record(started, run_id="run", pages_per_minute=60, upload_p95=2.0):
+    return {
+        "run_id": run_id,
+        "scraper": "PACA",
+        "shard": "0/1",
+        "started": started,
+        "pages_per_minute": pages_per_minute,
+        "upload_p50": 1.0,
+        "upload_p95": upload_p95,
+        "download_latency": 0.5,
+        "time_limit_hit": False,
+    }
+
+
+def test_runs_started_in_the_same_second():
+    history = RunHistory({}, max_runs=10)
+
+    first = history.append(record("2024-05-01T10:00:00", "A"))
+    second = history.append(record("2024-05-01T10:00:00", "B"))
+
+    assert first != second
+    assert len(history.records) == 2
+
+
+def test_oldest_runs_are_removed():
+    history = RunHistory({}, max_runs=3)
+
+    for day in range(1, 6):
+        history.append(record(f"2024-05-0{day}T10:00:00", f"run{day}"))
+
+    assert [r["run_id"] for r in history.records.values()] == ["run3", "run4", "run5"]
+
+
+def test_regressions_from_the_median_of_previous_runs():
+    history = RunHistory({}, max_runs=10)
+
+    for day in range(1, 5):
+        history.append(record(f"2024-05-0{day}T10:00:00", f"run{day}"))
+    key = history.append(
+        record("2024-05-05T10:00:00", "run5", pages_per_minute=30, upload_p95=2.2)
+    )
+
+    flags = history.regressions(key, window=10, threshold=0.25)
+
+    assert len(flags) == 1
+    assert flags[0].startswith("pages_per_minute: 30 (-50% vs. 60")
+
+
+def test_no_regression_without_enough_runs():
+    history = RunHistory({}, max_runs=10)
+
+    history.append(record("2024-05-01T10:00:00", "run1"))
+    key = history.append(record("2024-05-02T10:00:00", "run2", pages_per_minute=1))
+
+    assert regressions(history.records, key, window=10, threshold=0.25) == []
@@ -0,0 +1,38 @@
+"""Slotted DocumentItem: fields & memory, against the previous Scrapy Item."""
+
+from itemadapter import ItemAdapter
+
+from scraper.items import DocumentItem
+
+from . import previous
+from .benchmarks.items import bytes_per_item, document_item
+
+ITEMS = 2000
+
+# Highest share of the memory of the previous items
+MAX_MEMORY_RATIO = 0.7
+
+
+def test_same_fields_as_the_previous_item():
+    before = ItemAdapter(document_item(previous.DocumentItem, 12)).asdict()
+    after = ItemAdapter(document_item(DocumentItem, 12)).asdict()
+
+    # The date strings are derived from publication_dt
+    assert sorted(after) == sorted([*before, "publication_dt"])
+
+    for field in [
+        "publication_date",
+        "publication_time",
+        "publication_datetime",
+        "publication_datetime_dcformat",
+        "title",
+        "source_file_url",
+    ]:
+        assert after[field] == before[field]
+
+
+def test_memory_per_item():
+    before = bytes_per_item(previous.DocumentItem, ITEMS)
+    after = bytes_per_item(DocumentItem, ITEMS)
+
+    assert after < before * MAX_MEMORY_RATIO
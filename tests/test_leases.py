@@ -0,0 +1,48 @@
+"""Leases of departments between overlapping runs & shards."""
+
+from scraper.leases import DepartmentLeases
+
+DEPT = "13 - Bouches-du-Rhône"
+
+
+def leases(event_data, run_id, shard_index=0, shard_count=1):
+    return DepartmentLeases(
+        event_data,
+        run_id,
+        "2024",
+        ttl_minutes=30,
+        shard_index=shard_index,
+        shard_count=shard_count,
+    )
+
+
+def test_overlapping_run_skips_leased_department():
+    event_data = {}
+
+    assert leases(event_data, "run-1").acquire(DEPT)
+
+    other = leases(event_data, "run-2")
+    assert not other.acquire(DEPT)
+    assert other.skipped == {DEPT}
+
+
+def test_shards_lease_the_same_department():
+    event_data = {}
+
+    assert leases(event_data, "run-1", 0, 2).acquire(DEPT)
+    assert leases(event_data, "run-2", 1, 2).acquire(DEPT)
+
+    # Overlapping run of the same shard
+    assert not leases(event_data, "run-3", 1, 2).acquire(DEPT)
+
+    assert sorted(event_data["_leases"]) == ["2024/13/0of2", "2024/13/1of2"]
+
+
+def test_released_lease_can_be_taken():
+    event_data = {}
+
+    first = leases(event_data, "run-1")
+    first.acquire(DEPT)
+    first.release()
+
+    assert leases(event_data, "run-2").acquire(DEPT)
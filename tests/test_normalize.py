@@ -0,0 +1,121 @@
+"""Normalization of project names, titles & departments: results, time budgets
+on adversarial inputs (catastrophic backtracking) & throughput baselines."""
+
+import json
+import os
+import time
+
+import pytest
+
+from scraper.departments import departments_from_project_name
+from scraper.normalize import beautify_full_info, beautify_project, beautify_title
+
+from .benchmark import check_baseline, throughput
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+with open(os.path.join(FIXTURES_DIR, "normalize_corpus.json")) as file:
+    CORPUS = json.load(file)
+
+# Seconds allowed for one call on an adversarial input
+TIME_BUDGET = 0.05
+
+ADVERSARIAL_COMMUNES = [
+    # 4 minutes with the previous municipality template regex
+    " " * 2000 + "\n",
+    "05" + " " * 2000 + "\n",
+    "05" + " " * 2000 + "-" + " " * 2000 + "\n",
+    "05 - " + "x" * 10000 + " (05)",
+    "05 " + "(05)" * 3000,
+    "Gap" + " (05)" * 3000,
+    "(" * 5000,
+    "Gap" + " ;" * 5000,
+]
+
+ADVERSARIAL_NAMES = [
+    "Bouches-du-Rhône " * 2000,
+    "-" * 10000,
+    "(" + "1" * 10000,
+    "(" + "13 " * 5000,
+    "(" + "13 et" * 3000,
+    "(Côte-d'Or" + "'" * 10000,
+    "(13)" * 3000,
+    "région " * 5000 + "Provence",
+    "(" + "a" * 10000 + ")",
+]
+
+ADVERSARIAL_TITLES = [
+    "F09" + " " * 10000 + "Ap",
+    "Ap " * 5000,
+    "F0932400001" + "-1 " * 3000 + "Ap",
+    "f09" + "x" * 10000,
+    "F0" + "1" * 10000 + " Ap",
+]
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+@pytest.mark.parametrize("case", CORPUS["projects"])
+def test_beautify_project(case):
+    assert (
+        beautify_project(case["project"], case["communes"], case["department"])
+        == case["expected"]
+    )
+
+
+@pytest.mark.parametrize("case", CORPUS["titles"])
+def test_beautify_title(case):
+    assert beautify_title(case["title"]) == case["expected"]
+
+
+@pytest.mark.parametrize("case", CORPUS["departments"])
+def test_departments_from_project_name(case):
+    assert departments_from_project_name(case["project"]) == case["expected"]
+
+
+@pytest.mark.parametrize("communes", ADVERSARIAL_COMMUNES)
+def test_beautify_project_time_budget(communes):
+    assert timed(beautify_project, "F09324P0001 : Parking", communes, "05") < TIME_BUDGET
+
+
+@pytest.mark.parametrize("name", ADVERSARIAL_NAMES)
+def test_departments_from_project_name_time_budget(name):
+    assert timed(departments_from_project_name, name) < TIME_BUDGET
+
+
+@pytest.mark.parametrize("title", ADVERSARIAL_TITLES)
+def test_beautify_title_time_budget(title):
+    assert timed(beautify_title, title) < TIME_BUDGET
+
+
+def test_beautify_project_throughput():
+    calls = [
+        (case["project"], case["communes"], case["department"])
+        for case in CORPUS["projects"]
+    ]
+    check_baseline("normalize.json", "beautify_project", throughput(beautify_project, calls))
+
+
+def test_beautify_title_throughput():
+    calls = [(case["title"],) for case in CORPUS["titles"]]
+    check_baseline("normalize.json", "beautify_title", throughput(beautify_title, calls))
+
+
+def test_beautify_full_info_throughput():
+    calls = [(case["communes"],) for case in CORPUS["projects"]]
+    check_baseline(
+        "normalize.json", "beautify_full_info", throughput(beautify_full_info, calls)
+    )
+
+
+def test_departments_from_project_name_throughput():
+    calls = [(case["project"],) for case in CORPUS["departments"]]
+    check_baseline(
+        "normalize.json",
+        "departments_from_project_name",
+        throughput(departments_from_project_name, calls),
+    )
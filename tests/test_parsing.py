@@ -0,0 +1,130 @@
+"""Parsing of project pages: results on a corpus of pages, compared with the
+previous implementation, in a process pool, and throughput baseline."""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from scraper.parsing import extract_project_page, parse_full_info
+from scraper.profiles import PROFILES
+
+from . import previous
+from .benchmark import check_baseline, throughput
+from .pages import EXPECTED, load_large_page, load_pages
+
+PROFILE = PROFILES["PACA"]
+
+PAGES = load_pages()
+
+
+@pytest.mark.parametrize("name", sorted(PAGES))
+def test_extract_project_page(name):
+    project, full_info, fields, files = extract_project_page(PAGES[name], PROFILE)
+
+    assert project == EXPECTED[name]["project"]
+    assert full_info == EXPECTED[name]["full_info"]
+    assert fields == EXPECTED[name]["fields"]
+    assert [list(file) for file in files] == EXPECTED[name]["files"]
+
+
+@pytest.mark.parametrize("name", sorted(PAGES))
+def test_same_as_previous(name):
+    result = extract_project_page(PAGES[name], PROFILE)
+    previous_result = previous.extract_project_page(PAGES[name], PROFILE)
+
+    # Pages without files were skipped, they are now kept for the snapshot
+    if previous_result is None:
+        assert result[3] == []
+        return
+
+    project, full_info, fields, files = result
+    previous_project, previous_full_info, previous_communes, previous_files = (
+        previous_result
+    )
+
+    assert (project, full_info, files) == (
+        previous_project,
+        previous_full_info,
+        previous_files,
+    )
+
+    # Municipalities are also found when the previous regex missed them
+    if previous_communes is not None:
+        assert fields["communes"] == previous_communes.strip()
+
+
+@pytest.mark.parametrize(
+    "info, communes",
+    [
+        # Free text after the municipalities, on the next line
+        (
+            "Commune(s) du projet : Gap (05)\nLe projet consiste en un parc.\n"
+            "Décision : soumis",
+            "Gap (05)",
+        ),
+        ("Pétitionnaire : X\nCommune(s) du projet : Gap (05)\nDécision : soumis", "Gap (05)"),
+        # Last field, not found by the previous regex
+        ("Décision : soumis Commune(s) du projet : Gap (05)", "Gap (05)"),
+        ("Commune(s) du projet : Gap (05)", "Gap (05)"),
+        ("Commune(s) du projet :\xa0Gap (05)", "Gap (05)"),
+        # Empty value
+        ("Commune(s) du projet :\nGap (05)", None),
+        ("Commune(s) du projet : Décision : soumis", None),
+    ],
+)
+def test_parse_full_info_communes(info, communes):
+    full_info, fields = parse_full_info(info)
+
+    assert fields.get("communes") == communes
+    assert full_info == previous.full_info(info)
+
+
+def test_parse_full_info_first_value():
+    full_info, fields = parse_full_info(
+        "Décision : soumis\nDécision : non soumis\nPétitionnaire : \nPétitionnaire : X"
+    )
+
+    assert fields == {"decision": "soumis", "petitionnaire": "X"}
+
+
+def test_extract_project_page_throughput():
+    calls = [(html, PROFILE) for html in PAGES.values()]
+
+    check_baseline(
+        "parsing.json",
+        "extract_project_page",
+        throughput(extract_project_page, calls),
+    )
+
+
+def test_large_page_same_as_previous():
+    html = load_large_page()
+
+    project, full_info, fields, files = extract_project_page(html, PROFILE)
+    previous_project, previous_full_info, _, previous_files = (
+        previous.extract_project_page(html, PROFILE)
+    )
+
+    assert (project, full_info, files) == (
+        previous_project,
+        previous_full_info,
+        previous_files,
+    )
+    assert len(files) == 60
+    assert fields["communes"] == (
+        "Vitrolles (13) ; Marignane (13) ; Les Pennes-Mirabeau (13)"
+    )
+
+
+def test_extract_project_page_in_process_pool():
+    """Pages & results go through pickling, as with PROJECT_PAGE_PROCESSES."""
+
+    pages = [*PAGES.values(), load_large_page()]
+
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        results = list(pool.map(extract_project_page, pages, [PROFILE] * len(pages)))
+
+    assert results == [extract_project_page(html, PROFILE) for html in pages]
@@ -0,0 +1,131 @@
+"""Polling of the processing status of uploaded documents, with a stand-in client."""
+
+import logging
+from types import SimpleNamespace
+
+import pytest
+from scrapy.settings import Settings
+from twisted.internet import defer
+
+from scraper import pipelines
+from scraper.pipelines import ProcessingStatusPipeline
+from scraper.targets import UploadTarget
+
+from .stand_ins import StandInClient
+
+URL = "https://www.paca.developpement-durable.gouv.fr/IMG/pdf/f{}.pdf"
+
+
+class Stats:
+    def __init__(self):
+        self.values = {}
+
+    def inc_value(self, key, count=1):
+        self.values[key] = self.values.get(key, 0) + count
+
+
+def entry(document_id):
+    return {
+        "last_modified": "2024-04-30T08:00:00",
+        "last_seen": "2024-05-01T10:00:00",
+        "target_year": 2024,
+        "document_id": document_id,
+    }
+
+
+def spider(document_ids, statuses=None):
+    return SimpleNamespace(
+        settings=Settings(
+            {"PROCESSING_POLL_DELAY": 60, "PROCESSING_POLL_MAX_DELAY": 900}
+        ),
+        targets=[UploadTarget(1, "private", primary=True)],
+        event_data={URL.format(id): entry(id) for id in document_ids},
+        dry_run=False,
+        client=StandInClient(statuses=statuses),
+        crawler=SimpleNamespace(stats=Stats()),
+        logger=logging.getLogger("processing"),
+    )
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    # Statuses fetched right away, instead of in a thread of the running reactor
+    monkeypatch.setattr(
+        pipelines.threads,
+        "deferToThread",
+        lambda function, *args: defer.maybeDeferred(function, *args),
+    )
+
+    pipeline = ProcessingStatusPipeline()
+    yield pipeline
+
+    if pipeline.next_poll and pipeline.next_poll.active():
+        pipeline.next_poll.cancel()
+
+
+def test_statuses_fetched_by_batches(pipeline):
+    dreal = spider(range(1, 251))
+    pipeline.open_spider(dreal)
+
+    pipeline.poll(dreal)
+
+    assert [len(ids) for ids in dreal.client.status_requests] == [100, 100, 50]
+    assert pipeline.pending == {}
+
+
+def test_mixed_statuses_over_several_polls(pipeline):
+    dreal = spider(
+        [1, 2, 3, 4],
+        {
+            2: ["error"],
+            3: ["pending", "pending", "success"],
+            4: ["pending"],
+        },
+    )
+    pipeline.open_spider(dreal)
+    delays = []
+
+    for _ in range(8):
+        pipeline.poll(dreal)
+        delays.append(pipeline.delay)
+
+    # Processed
+    assert "document_id" not in dreal.event_data[URL.format(1)]
+    assert "document_id" not in dreal.event_data[URL.format(3)]
+
+    # Failed, uploaded again by the next run
+    assert URL.format(2) not in dreal.event_data
+    assert dreal.processing_failures == [
+        {"document_id": 2, "status": "error", "url": URL.format(2)}
+    ]
+
+    # Still processing, checked again by the next run
+    assert list(pipeline.pending) == [4]
+    assert dreal.event_data[URL.format(4)]["document_id"] == 4
+
+    # Backoff while nothing changes, reset by a change, up to the maximum delay
+    assert delays == [60, 120, 60, 120, 240, 480, 900, 900]
+    next_poll = pipeline.next_poll
+    assert next_poll.getTime() - next_poll.seconds() == pytest.approx(900, abs=1)
+
+    assert dreal.crawler.stats.values == {
+        "processing/success": 2,
+        "processing/error": 1,
+    }
+
+
+def test_no_poll_after_close(pipeline):
+    dreal = spider([1], {1: ["pending", "success"]})
+    pipeline.open_spider(dreal)
+
+    pipeline.poll(dreal)
+    assert pipeline.next_poll.active()
+
+    # Checked one last time
+    pipeline.close_spider(dreal)
+
+    assert pipeline.pending == {}
+    assert not pipeline.next_poll.active()
+
+    pipeline.poll(dreal)
+    assert len(dreal.client.status_requests) == 2
@@ -0,0 +1,47 @@
+"""Overhead settings of the profiling of a run."""
+
+import tracemalloc
+
+import pytest
+from scrapy.settings import Settings
+from scrapy.utils.test import get_crawler
+
+from scraper import settings as scraper_settings
+from scraper.profiling import RunProfiler, sampling_interval
+
+
+def settings(**values):
+    settings = Settings()
+    settings.setmodule(scraper_settings)
+    settings.update(values)
+    return settings
+
+
+def test_sampling_interval_of_short_runs():
+    assert sampling_interval(settings()) == 0.01
+    assert sampling_interval(settings(), time_limit=10) == 0.01
+
+
+def test_sampling_interval_scaled_with_time_limit():
+    # 5h45: 20,700 s in at most 100,000 samples
+    assert sampling_interval(settings(), time_limit=345) == 0.207
+    assert sampling_interval(settings(PROFILE_MAX_SAMPLES=20700), time_limit=345) == 1
+
+
+def test_memory_frames():
+    assert RunProfiler(settings()).memory_frames == 1
+    assert RunProfiler(settings(PROFILE_MEMORY_FRAMES=10)).memory_frames == 10
+
+
+@pytest.mark.parametrize("memory", [False, True])
+def test_memory_traced_on_request(memory):
+    profiler = RunProfiler(settings(), memory=memory)
+
+    profiler.start(get_crawler())
+    try:
+        assert tracemalloc.is_tracing() == memory
+    finally:
+        profiler.stop()
+
+    assert not tracemalloc.is_tracing()
+    assert ("MEMORY" in profiler.report()) == memory
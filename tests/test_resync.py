@@ -0,0 +1,169 @@
+"""Re-sync of the metadata of uploaded documents, & of the projects of dry runs."""
+
+import logging
+from types import SimpleNamespace
+
+import pytest
+from documentcloud.constants import BULK_LIMIT
+from documentcloud.exceptions import DoesNotExistError
+from scrapy.settings import Settings
+
+from main import DiscloseDREALPACAScraper
+from scraper.pipelines import ResyncPipeline
+
+from .stand_ins import StandInClient
+
+URL = "https://www.paca.developpement-durable.gouv.fr/IMG/pdf/f09324p0012_ap.pdf"
+
+
+def expected(**data):
+    return {"title": "Ap", "description": "Projet", "data": {"year": 2024, **data}}
+
+
+def document(id=1, **data):
+    return {
+        "id": id,
+        "title": "Ap",
+        "description": "Projet",
+        "data": {"event_data_key": [URL], "year": ["2024"], **data},
+    }
+
+
+def spider(client, dry_run=False):
+    return SimpleNamespace(
+        client=client,
+        dry_run=dry_run,
+        source_scraper="DREAL PACA Scraper",
+        settings=Settings(
+            {
+                "RESYNC_CONCURRENCY": 2,
+                "EVENT_DATA_REBUILD_PAGE_SIZE": 25,
+                "EVENT_DATA_REBUILD_WORKERS": 1,
+            }
+        ),
+        logger=logging.getLogger("resync"),
+    )
+
+
+def test_unchanged_document():
+    assert ResyncPipeline().changes(document(), expected()) == {}
+
+
+def test_stale_keys_are_removed():
+    changes = ResyncPipeline().changes(
+        document(decision=["Autorisation"], tags=["ICPE"]), expected()
+    )
+
+    # Only the keys set by the scraper
+    assert changes == {
+        "data": {"event_data_key": [URL], "year": ["2024"], "tags": ["ICPE"]}
+    }
+
+
+def test_removed_keys_are_reported():
+    pipeline = ResyncPipeline()
+    current = document(decision=["Autorisation"])
+
+    lines = pipeline.diff_lines(URL, current, pipeline.changes(current, expected()))
+
+    assert lines == [
+        f"{URL} (document 1)",
+        "  data.decision: ['Autorisation'] -> None",
+    ]
+
+
+def test_updates_are_sent_by_batches():
+    client = StandInClient()
+    updates = [{"id": i, "title": "Ap"} for i in range(2 * BULK_LIMIT + 3)]
+
+    assert ResyncPipeline().update(spider(client), updates) == len(updates)
+
+    assert sorted(len(batch) for path, batch in client.patches) == [
+        3,
+        BULK_LIMIT,
+        BULK_LIMIT,
+    ]
+    assert sorted(
+        update["id"] for path, batch in client.patches for update in batch
+    ) == list(range(len(updates)))
+
+
+@pytest.mark.parametrize("dry_run", [False, True])
+def test_resync_target(dry_run):
+    client = StandInClient([document(decision=["Autorisation"])])
+    pipeline = ResyncPipeline()
+    pipeline.expected = {URL: expected()}
+
+    report = pipeline.resync_target(
+        spider(client, dry_run), SimpleNamespace(name="1-private", project=1)
+    )
+
+    if dry_run:
+        assert client.patches == []
+        assert report[0] == "1 of 1 documents would be updated (dry run)"
+    else:
+        assert client.patches == [
+            (
+                "documents/",
+                [{"id": 1, "data": {"event_data_key": [URL], "year": ["2024"]}}],
+            )
+        ]
+        assert report[0] == "1 of 1 documents updated"
+
+
+class Projects:
+    """Projects of a stand-in DocumentCloud client, only found."""
+
+    def __init__(self, projects):
+        self.projects = projects
+
+    def get_by_title(self, title):
+        for project in self.projects:
+            if project.title == title:
+                return project
+        raise DoesNotExistError()
+
+    def get_by_id(self, id):
+        for project in self.projects:
+            if project.id == id:
+                return project
+        raise DoesNotExistError()
+
+    def get_or_create_by_title(self, title):
+        raise AssertionError("Projects created by a dry run")
+
+
+def add_on(data, targets=()):
+    add_on = DiscloseDREALPACAScraper.__new__(DiscloseDREALPACAScraper)
+    add_on.client = SimpleNamespace(
+        projects=Projects(
+            [
+                SimpleNamespace(id=1, title="DREAL PACA"),
+                SimpleNamespace(id=2, title="ICPE"),
+            ]
+        )
+    )
+    add_on.data = data
+    add_on.targets = [dict(target) for target in targets]
+    add_on.messages = []
+    add_on.set_message = add_on.messages.append
+    return add_on
+
+
+def test_dry_run_finds_the_projects():
+    dry_run = add_on({"project": "DREAL PACA"}, [{"project": 2}])
+
+    dry_run.find_projects()
+
+    assert dry_run.project == 1
+    assert dry_run.targets == [{"project": 2}]
+
+
+@pytest.mark.parametrize("project", ["Missing", 3])
+def test_dry_run_of_a_missing_project(project):
+    dry_run = add_on({"project": "DREAL PACA"}, [{"project": project}])
+
+    with pytest.raises(SystemExit):
+        dry_run.find_projects()
+
+    assert dry_run.messages[0].startswith("Project not found")
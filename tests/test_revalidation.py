@@ -0,0 +1,125 @@
+"""Revalidation of uploaded files with conditional requests."""
+
+from datetime import datetime
+
+import pytest
+from scrapy.http import Request, Response
+from scrapy.utils.test import get_crawler
+
+from scraper.revalidation import Revalidation
+from scraper.spiders.dreal import DREALSpider
+
+URL = "https://www.paca.developpement-durable.gouv.fr/IMG/pdf/f09324p0012_ap.pdf"
+
+LAST_MODIFIED = "2024-04-30T08:00:00"
+
+
+def entry(**values):
+    return {
+        "last_modified": LAST_MODIFIED,
+        "last_seen": "2024-05-01T10:00:00",
+        "target_year": 2024,
+        **values,
+    }
+
+
+def spider(event_data):
+    crawler = get_crawler(DREALSpider, {"REVALIDATION_BUDGET": 5})
+    dreal = DREALSpider.from_crawler(
+        crawler,
+        profile="PACA",
+        target_year=2024,
+        target_project=1,
+        access_level="private",
+    )
+    dreal.event_data = event_data
+    return dreal
+
+
+def revalidation_requests(dreal):
+    return [
+        request
+        for request in dreal.start_requests()
+        if request.callback == dreal.parse_revalidation
+    ]
+
+
+def response(request, status, last_modified=None):
+    headers = {"Last-Modified": last_modified} if last_modified else {}
+    return Response(URL, status=status, headers=headers, request=request)
+
+
+def test_conditional_request():
+    dreal = spider({URL: entry()})
+
+    [request] = revalidation_requests(dreal)
+
+    assert request.method == "HEAD"
+    assert request.headers["If-Modified-Since"] == b"Tue, 30 Apr 2024 08:00:00 GMT"
+    assert request.meta["handle_httpstatus_list"] == [304]
+
+
+def test_not_modified_is_skipped():
+    dreal = spider({URL: entry()})
+    [request] = revalidation_requests(dreal)
+
+    dreal.parse_revalidation(response(request, 304))
+
+    # Kept, so the crawl does not upload it again
+    assert dreal.event_data[URL]["last_checked"]
+    assert dreal.revalidation.not_modified == [URL]
+
+
+@pytest.mark.parametrize(
+    "last_modified, fetched",
+    [
+        ("Wed, 01 May 2024 08:00:00 GMT", True),
+        ("Tue, 30 Apr 2024 08:00:00 GMT", False),
+        (None, True),
+    ],
+    ids=["newer", "same", "missing"],
+)
+def test_full_response(last_modified, fetched):
+    dreal = spider({URL: entry()})
+    [request] = revalidation_requests(dreal)
+
+    dreal.parse_revalidation(response(request, 200, last_modified))
+
+    # Removed from event data, so the crawl fetches & uploads it again
+    assert (URL not in dreal.event_data) == fetched
+
+
+def test_entry_without_last_modified():
+    dreal = spider({URL: entry(last_modified=None)})
+
+    [request] = revalidation_requests(dreal)
+    assert "If-Modified-Since" not in request.headers
+
+    dreal.parse_revalidation(response(request, 200, "Tue, 30 Apr 2024 08:00:00 GMT"))
+
+    assert URL not in dreal.event_data
+
+
+def test_sample_checked_the_longest_ago_first():
+    event_data = {
+        f"{URL}?{i}": entry(last_checked=f"2024-05-0{9 - i}T10:00:00") for i in range(5)
+    }
+    event_data["_leases"] = {}
+    event_data[f"{URL}?2023"] = entry(target_year=2023)
+
+    sample = Revalidation(event_data, 2024, budget=2).sample()
+
+    assert sample == [
+        (f"{URL}?4", datetime(2024, 4, 30, 8)),
+        (f"{URL}?3", datetime(2024, 4, 30, 8)),
+    ]
+
+
+def test_failed_check_is_retried_after_the_others():
+    event_data = {URL: entry()}
+    revalidation = Revalidation(event_data, 2024, budget=1)
+
+    revalidation.error(URL, "Connection refused")
+
+    assert event_data[URL]["last_checked"]
+    assert revalidation.errors == [(URL, "Connection refused")]
@@ -0,0 +1,71 @@
+"""Snapshots of the website: changes between runs & projects kept."""
+
+from scraper.snapshots import SNAPSHOT_KEY, SiteSnapshot
+
+FILES = [("https://example.org/f/1.pdf", "F09 Ap décision")]
+
+
+def snapshot(event_data, year=2024):
+    return SiteSnapshot(event_data, year, max_years=2)
+
+
+def crawl(event_data, year, projects, dept="13 - Bouches-du-Rhône"):
+    run = snapshot(event_data, year)
+
+    for url, title, files in projects:
+        run.list_project(url)
+        run.record(url, dept, title, "Décision : soumis", files)
+    run.department_complete(dept)
+
+    return run
+
+
+def test_changes_since_previous_snapshot():
+    event_data = {}
+    crawl(event_data, 2024, [("p1", "Parc", FILES), ("p2", "Route", FILES)]).store()
+
+    run = crawl(
+        event_data,
+        2024,
+        [("p1", "Parc solaire", FILES), ("p3", "Forage", [])],
+    )
+    diff = run.diff()
+
+    assert diff["added_projects"] == [("p3", "Forage", 0)]
+    assert diff["removed_projects"] == [("p2", "Route")]
+    assert diff["renamed_projects"] == [("p1", "Parc", "Parc solaire")]
+
+    run.store()
+    assert sorted(event_data[SNAPSHOT_KEY]) == ["p1", "p3"]
+
+
+def test_old_years_are_removed():
+    event_data = {}
+    crawl(event_data, 2022, [("p2022", "Parc", FILES)]).store()
+    crawl(event_data, 2023, [("p2023", "Parc", FILES)]).store()
+    crawl(event_data, 2024, [("p2024", "Parc", FILES)]).store()
+
+    assert sorted(event_data[SNAPSHOT_KEY]) == ["p2023", "p2024"]
+
+
+def test_other_years_are_not_compared():
+    event_data = {}
+    crawl(event_data, 2023, [("p2023", "Parc", FILES)]).store()
+
+    run = crawl(event_data, 2024, [("p2024", "Parc", FILES)])
+
+    assert run.diff()["removed_projects"] == []
+    assert run.summary() == ["First snapshot of the website: 1 projects"]
+
+
+def test_all_files_removed_from_a_page():
+    event_data = {}
+    crawl(event_data, 2024, [("p1", "Parc", FILES)]).store()
+
+    # Pages without files are recorded too (see extract_project_page)
+    run = crawl(event_data, 2024, [("p1", "Parc", [])])
+
+    assert run.diff()["removed_files"] == [("p1", *FILES[0])]
+
+    run.store()
+    assert event_data[SNAPSHOT_KEY]["p1"]["files"] == []
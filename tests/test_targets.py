@@ -0,0 +1,36 @@
+"""Filters of the upload targets."""
+
+from scraper.targets import UploadTarget
+
+
+def test_accepts_all_without_filters():
+    target = UploadTarget("project", "private")
+
+    assert target.may_accept("05")
+    assert target.accepts("05", None)
+    assert target.accepts("05", "Cas par cas")
+
+
+def test_departments():
+    target = UploadTarget("project", "private", departments=["05", "06"])
+
+    assert target.may_accept("05")
+    assert not target.may_accept("13")
+    assert target.accepts("06", "Cas par cas")
+    assert not target.accepts("13", "Cas par cas")
+
+
+def test_categories():
+    target = UploadTarget("project", "private", categories=["Cas par cas"])
+
+    # Requested before the category is known
+    assert target.may_accept("05")
+
+    assert target.accepts("05", "Cas par cas")
+    assert not target.accepts("05", "Autorisation environnementale")
+
+
+def test_categories_reject_documents_without_category():
+    target = UploadTarget("project", "private", categories=["Cas par cas"])
+
+    assert not target.accepts("05", None)
@@ -0,0 +1,50 @@
+"""Upload limit: failed uploads release their slot & are replaced by other files."""
+
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(directory, upload_limit, failing_uploads):
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "tests.upload_limit_run",
+            str(directory),
+            str(upload_limit),
+            str(failing_uploads),
+        ],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_failed_uploads_are_replaced(tmp_path):
+    output = run(tmp_path, upload_limit=3, failing_uploads=2)
+
+    assert len(output["failed_uploads"]) == 2
+    assert len(output["uploads"]) == 3
+    assert not set(output["uploads"]) & set(output["failed_uploads"])
+
+    # One file request per upload attempt, none dropped by the limit
+    assert output["file_requests"] == 5
+    assert output["upload_limit_attained"]
+
+
+def test_every_upload_failing(tmp_path):
+    output = run(tmp_path, upload_limit=3, failing_uploads=1000)
+
+    # Every file is tried, the limit is never attained
+    assert output["uploads"] == []
+    assert sorted(output["failed_uploads"]) == sorted(output["files"])
+    assert output["file_requests"] == len(output["files"])
+    assert not output["upload_limit_attained"]
+    assert output["reason"] == "finished"
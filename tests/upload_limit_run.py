@@ -0,0 +1,72 @@
+"""A run of the spider with an upload limit, whose first uploads fail.
+
+Run in its own process by test_upload_limit.py, as the Twisted reactor can only
+be started once:
+
+    python -m tests.upload_limit_run DIRECTORY UPLOAD_LIMIT FAILING_UPLOADS
+
+Prints the files of the website, the uploads, the failed uploads, the file
+requests & the reason the spider closed as JSON.
+"""
+
+import json
+import os
+import sys
+
+from .local_site import crawl_settings, local_profile, serve, spider_kwargs
+from .stand_ins import StandInClient, StandInStore
+
+
+def main():
+    directory, upload_limit, failing_uploads = sys.argv[1:4]
+    server, base_url, files = serve(directory)
+
+    os.chdir(directory)
+    settings = crawl_settings()
+
+    from scrapy import signals
+    from scrapy.crawler import CrawlerProcess
+
+    from scraper.spiders.dreal import DREALSpider
+
+    client = StandInClient(failing_uploads=int(failing_uploads))
+    output = {}
+
+    def spider_closed(spider, reason):
+        stats = spider.crawler.stats
+        output["reason"] = reason
+        output["file_requests"] = stats.get_value(
+            "downloader/request_method_count/HEAD", 0
+        )
+        output["upload_limit_attained"] = spider.upload_limit_attained
+
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(DREALSpider)
+    crawler.signals.connect(spider_closed, signal=signals.spider_closed)
+    process.crawl(
+        crawler,
+        **spider_kwargs(
+            local_profile(base_url),
+            StandInStore(),
+            "A",
+            client,
+            upload_limit=int(upload_limit),
+        ),
+    )
+    process.start()
+    server.shutdown()
+
+    print(
+        json.dumps(
+            {
+                "files": [f"{base_url}/{path}" for path in files],
+                "uploads": client.uploads,
+                "failed_uploads": client.failed_uploads,
+                **output,
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()